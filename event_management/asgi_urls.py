@@ -0,0 +1,13 @@
+"""
+URL configuration for requests served through ASGI, selected per request by
+events.middleware.ASGIURLConfMiddleware: the routes in urls.py, with the events
+app's read-only public views served by their async versions (events/async_urls.py).
+"""
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [
+    path('events/', include('events.async_urls')) if getattr(pattern, 'namespace', None) == 'events' else pattern
+    for pattern in urls.urlpatterns
+]
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,12 +46,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'events.middleware.ASGIURLConfMiddleware',
+    'events.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'events.routing.ReplicaReadMiddleware',
 ]
 
 ROOT_URLCONF = 'event_management.urls'
@@ -76,11 +82,97 @@ WSGI_APPLICATION = 'event_management.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Chosen with EVENTS_DB_PROFILE:
+#   sqlite    (default) a file database tuned for concurrent writers. Persistent
+#             connections; the pragmas below are applied to every new connection.
+#   postgres  PostgreSQL through a psycopg 3 connection pool
+#             (pip install -r requirements-postgres.txt)
+DB_PROFILE = os.environ.get('EVENTS_DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'event_management'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Connections come from the pool, so they must not also be persistent
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 20)),
+                    'timeout': 10,
+                },
+            },
+            # Exports and index warm-ups stream through server-side cursors; turn them
+            # off behind a transaction-mode pooler such as PgBouncer
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        }
+    }
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock at BEGIN: writers then wait out busy_timeout
+                # instead of failing to upgrade a read lock with "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+            },
+            'TEST': {
+                # In memory unless set; WAL needs a file
+                'NAME': os.environ.get('SQLITE_TEST_PATH'),
+            },
+        }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown EVENTS_DB_PROFILE {DB_PROFILE!r}; use 'sqlite' or 'postgres'.")
+
+# Read replicas, as comma-separated SQLite file paths or PostgreSQL hosts. They are
+# mirrored onto the test database; run the test suite without EVENTS_REPLICAS
+# (events.tests.ReplicaReadTests sets up its own replica file).
+_replicas = [value for value in os.environ.get('EVENTS_REPLICAS', '').split(',') if value]
+for _n, _replica in enumerate(_replicas, start=1):
+    DATABASES[f'replica_{_n}'] = {
+        **DATABASES['default'],
+        ('HOST' if DB_PROFILE == 'postgres' else 'NAME'): _replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['events.routing.ReplicaRouter']
+# Public read-only views may read from a replica; a client that wrote is pinned to
+# the primary for EVENTS_REPLICA_PIN_SECONDS
+EVENTS_READ_REPLICAS = [f'replica_{n}' for n in range(1, len(_replicas) + 1)]
+EVENTS_REPLICA_PIN_SECONDS = 10
+
+# Applied to every new SQLite connection by events.signals.tune_sqlite
+EVENTS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The check-in index keeps one small entry per confirmation code, so it gets its own
+# cache sized for the largest event. Point both at a shared backend (Redis, Memcached)
+# when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'checkin': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'checkin-index',
+        'TIMEOUT': 60 * 60 * 48,
+        'OPTIONS': {'MAX_ENTRIES': 500000},
+    },
 }
 
 
@@ -130,4 +222,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/events/'
-LOGOUT_REDIRECT_URL = '/events/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/events/'
+
+# Attendee tables (manage_attendees, attendance_report) are keyset-paginated;
+# clients may ask for ?page_size= up to the maximum.
+EVENTS_PAGE_SIZE = 50
+EVENTS_MAX_PAGE_SIZE = 200
+
+# Unfiltered admin changelists of tables at least this large show the row count from
+# the database statistics instead of running a full-table COUNT
+EVENTS_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Seconds to cache each event's attendance summary for the staff dashboards (0 disables)
+EVENTS_STATS_CACHE_TIMEOUT = 5
+
+# Per-request query/latency instrumentation: Server-Timing headers and /metrics
+EVENTS_METRICS = False
+# Addresses allowed to scrape /metrics without a staff login (e.g. a Prometheus sidecar)
+EVENTS_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Whole-page cache for anonymous visitors of the public catalog (seconds). Use a
+# shared backend for EVENTS_PAGE_CACHE when running several worker processes.
+EVENTS_PAGE_CACHE = 'default'
+EVENTS_PAGE_CACHE_TIMEOUT = 300
+# Lifetime of the cache version stamps; an expired stamp restarts from a fresh timestamp
+EVENTS_VERSION_TIMEOUT = 7 * 24 * 3600
+
+# max-age for the public registration status/capacity JSON polled by registration pages
+EVENTS_STATUS_MAX_AGE = 5
+
+# Seconds between keep-alive comments on idle live event streams
+EVENTS_LIVE_HEARTBEAT = 15
+
+# URLconf for requests served through ASGI: the read-only public views run as their
+# async versions (events/async_views.py). WSGI requests use ROOT_URLCONF.
+EVENTS_ASGI_URLCONF = 'event_management.asgi_urls'
+
+# Registration admission control: token buckets as (burst, tokens per second),
+# per client and per event, held in EVENTS_ADMISSION_CACHE
+EVENTS_ADMISSION_CACHE = 'default'
+EVENTS_REGISTRATION_CLIENT_RATE = (5, 0.2)
+# Clients are told apart by address. Behind a reverse proxy or load balancer every
+# request comes from the proxy, so list it here (addresses or networks) and the
+# client's address is taken from EVENTS_CLIENT_IP_HEADER instead. Without this all
+# users share a single client bucket.
+EVENTS_TRUSTED_PROXIES = [p for p in os.environ.get('EVENTS_TRUSTED_PROXIES', '').split(',') if p]
+EVENTS_CLIENT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+EVENTS_REGISTRATION_EVENT_RATE = (100, 50)
+# Seconds a "sold out" marker answers registrations before the database is asked again
+EVENTS_SOLD_OUT_TIMEOUT = 300
+
+# Background tasks (events/tasks.py): 'database' queues Task rows for the run_tasks
+# worker; 'local' runs them on threads in the web process and stores nothing
+EVENTS_TASK_BACKEND = os.environ.get('EVENTS_TASK_BACKEND', 'database')
+EVENTS_TASK_LOCAL_WORKERS = 2
+# First retry delay in seconds, doubling per attempt
+EVENTS_TASK_RETRY_DELAY = 5
+# A running task whose lease has not been renewed for this many seconds is assumed lost
+EVENTS_TASK_LEASE = 300
+# Window in seconds for the task latency metrics
+EVENTS_TASK_METRICS_WINDOW = 300
+
+# Processes rendering badges (exports.stream_badges); None means one per CPU
+EVENTS_BADGE_WORKERS = None
@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
 
+from events.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('events/', include('events.urls')),  # Include app URLs
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape endpoint (EVENTS_METRICS)
     path('', RedirectView.as_view(pattern_name='events:event_list')),  # Redirect root to events
 ]
@@ -0,0 +1,78 @@
+"""
+Linking registrations to user accounts.
+
+A registration made while logged out only carries the email it was made with.
+Instead of matching emails on every page view, registrations are linked to the
+account with the same normalized (trimmed, lower-case) email when they are made,
+when that account signs up or logs in, and in bulk by the ``link_registrations``
+command. Views can
+then filter on the indexed ``Attendee.user`` foreign key alone.
+
+Emails are compared through ``Lower('email')``, the expression behind
+``attendee_email_lower_idx`` and, for accounts, ``events_user_email_lower_idx``
+(migration 0012), so the lookup in the registration transaction is an index seek. An email shared by several accounts is ambiguous:
+it is never linked automatically.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Case, Value, When
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact, In
+
+from .models import Attendee
+
+LINK_CHUNK = 500
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def _unlinked():
+    return Attendee.objects.filter(user__isnull=True)
+
+
+def account_for_email(email):
+    """The id of the one account using ``email``, or None if there is none or several."""
+    email = normalize_email(email)
+    if not email:
+        return None
+    owners = list(User.objects.filter(Exact(Lower('email'), email)).values_list('pk', flat=True)[:2])
+    return owners[0] if len(owners) == 1 else None
+
+
+def link_registrations(user):
+    """Link ``user``'s unlinked registrations by email; returns how many were linked."""
+    email = normalize_email(user.email)
+    if not email:
+        return 0
+    if User.objects.filter(Exact(Lower('email'), email)).exclude(pk=user.pk).exists():
+        return 0
+    return _unlinked().filter(Exact(Lower('email'), email)).update(user=user)
+
+
+def account_owners():
+    """Map each normalized email held by exactly one account to that account's id."""
+    owners, ambiguous = {}, set()
+    for pk, email in User.objects.exclude(email='').order_by().values_list('pk', 'email').iterator():
+        email = normalize_email(email)
+        if email in owners:
+            ambiguous.add(email)
+        owners[email] = pk
+    for email in ambiguous:
+        del owners[email]
+    return owners
+
+
+def backfill(chunk_size=LINK_CHUNK):
+    """
+    Link every unlinked registration whose email belongs to exactly one account, with
+    one UPDATE per ``chunk_size`` accounts. Returns how many registrations were linked.
+    """
+    owners = list(account_owners().items())
+    linked = 0
+    for start in range(0, len(owners), chunk_size):
+        chunk = owners[start:start + chunk_size]
+        linked += _unlinked().filter(In(Lower('email'), [email for email, _ in chunk])).update(
+            user_id=Case(*[When(Exact(Lower('email'), email), then=Value(pk)) for email, pk in chunk]),
+        )
+    return linked
@@ -1,26 +1,147 @@
-from django.contrib import admin
-from .models import Event, Attendee
+from django.contrib import admin, messages
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .checkin import bulk_update_status
+from .models import Announcement, Event, Attendee, Task, WaitlistEntry
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ['title', 'start_date', 'end_date', 'location', 'max_attendees', 'registered_attendees_count', 'is_active', 'registration_open']
+    list_display = ['title', 'start_date', 'end_date', 'location', 'max_attendees', 'registered_attendees_count', 'checked_in_count', 'attendee_links', 'is_active', 'registration_open']
     list_filter = ['is_active', 'registration_open', 'start_date']
     search_fields = ['title', 'description', 'location']
     date_hierarchy = 'start_date'
     readonly_fields = ['created_at']
+    ordering = ['-start_date']
+
+    def get_queryset(self, request):
+        # One correlated subquery per listed event, served by attendee_event_status_idx
+        checked_in = Attendee.objects.filter(
+            event=OuterRef('pk'), attendance_status='checked_in'
+        ).order_by().values('event').annotate(total=Count('pk')).values('total')
+        return super().get_queryset(request).annotate(checked_in_total=Coalesce(Subquery(checked_in), 0))
 
+    @admin.display(description='Registered', ordering='registered_count')
     def registered_attendees_count(self, obj):
         return obj.registered_attendees_count()
-    registered_attendees_count.short_description = 'Registered'
+
+    @admin.display(description='Checked in', ordering='checked_in_total')
+    def checked_in_count(self, obj):
+        return obj.checked_in_total
+
+    @admin.display(description='Attendees')
+    def attendee_links(self, obj):
+        url = reverse('admin:events_attendee_changelist')
+        return format_html('<a href="{}?event={}">View</a>', url, obj.pk)
+
+
+class EventListFilter(admin.SimpleListFilter):
+    """
+    Filter attendees by event without loading every event into the sidebar: it offers
+    the next upcoming events plus the selected one. Any other event is reached from
+    the "Attendees" link on the event list.
+    """
+    title = 'event'
+    parameter_name = 'event'
+    limit = 20
+
+    def event_id(self):
+        # Hand-edited query strings must not reach the pk lookups
+        value = self.value()
+        return int(value) if value and value.isdigit() else None
+
+    def lookups(self, request, model_admin):
+        upcoming = Event.objects.filter(is_active=True, start_date__gte=timezone.now()).order_by('start_date')
+        choices = list(upcoming.values_list('pk', 'title')[:self.limit])
+        event_id = self.event_id()
+        if event_id is not None and event_id not in {pk for pk, _ in choices}:
+            choices[:0] = Event.objects.filter(pk=event_id).values_list('pk', 'title')
+        return choices
+
+    def queryset(self, request, queryset):
+        event_id = self.event_id()
+        if event_id is not None:
+            return queryset.filter(event_id=event_id)
+        return queryset
+
 
 @admin.register(Attendee)
 class AttendeeAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'email', 'event', 'category', 'attendance_status', 'registration_date', 'is_approved']
-    list_filter = ['category', 'attendance_status', 'is_approved', 'event', 'registration_date']
+    list_filter = [EventListFilter, 'category', 'attendance_status', 'is_approved', 'registration_date']
+    list_select_related = ['event']
     search_fields = ['first_name', 'last_name', 'email', 'company', 'confirmation_code']
     readonly_fields = ['registration_date', 'confirmation_code']
     list_editable = ['attendance_status', 'is_approved']
-    
+    autocomplete_fields = ['event', 'user']
+    # Newest first by primary key, so an unfiltered page is an index scan rather than a sort
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['check_in', 'mark_no_show']
+
     def full_name(self, obj):
         return obj.full_name
-    full_name.short_description = 'Name'
\ No newline at end of file
+    full_name.short_description = 'Name'
+
+    def get_readonly_fields(self, request, obj=None):
+        # Attendee.save() refuses to move a registration to another event
+        if obj is not None:
+            return [*self.readonly_fields, 'event']
+        return self.readonly_fields
+
+    def _bulk_update(self, request, queryset, status, label):
+        updated = bulk_update_status(queryset, status)
+        self.message_user(
+            request,
+            f"Marked {updated} attendee(s) as {label}. Cancelled and ineligible attendees were left unchanged.",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description='Check in selected attendees')
+    def check_in(self, request, queryset):
+        self._bulk_update(request, queryset, 'checked_in', 'checked in')
+
+    @admin.action(description='Mark selected attendees as no-show')
+    def mark_no_show(self, request, queryset):
+        self._bulk_update(request, queryset, 'no_show', 'no-show')
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['full_name', 'email', 'event', 'status', 'joined_at', 'promoted_at']
+    list_filter = ['status', 'joined_at']
+    list_select_related = ['event']
+    search_fields = ['first_name', 'last_name', 'email']
+    readonly_fields = ['joined_at', 'promoted_at', 'attendee']
+    autocomplete_fields = ['event', 'user']
+
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'event', 'status', 'sent_count', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['event']
+    search_fields = ['subject']
+    autocomplete_fields = ['event', 'created_by']
+    readonly_fields = ['created_at', 'status', 'sent_count', 'last_attendee_id', 'claimed_by', 'lease_expires_at', 'finished_at']
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['idempotency_key']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'last_error']
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['retry']
+
+    @admin.action(description='Retry selected failed tasks')
+    def retry(self, request, queryset):
+        retried = queryset.filter(status=Task.FAILED).update(
+            status=Task.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f"Queued {retried} task(s) again.", messages.SUCCESS)
@@ -0,0 +1,151 @@
+"""
+Admission control for registration POSTs.
+
+Requests are checked before the view touches the database, in order of cost:
+
+1. A sold-out marker for the event answers "full" at once. It is stored under the
+   event's cache version (see ``caching``), so a cancellation or capacity change
+   retires it automatically; ``EVENTS_SOLD_OUT_TIMEOUT`` bounds how long it lives.
+2. A token bucket per client address stops one client from hammering the form.
+   Behind a reverse proxy, list the proxy in ``EVENTS_TRUSTED_PROXIES`` so the
+   client's address is read from the forwarding header instead.
+3. A token bucket per event caps how fast registrations reach the database when a
+   popular event opens.
+
+Buckets live in the ``EVENTS_ADMISSION_CACHE`` cache. Updates are read-modify-write,
+so under heavy concurrency a bucket can admit slightly more than its rate; the seat
+claim in ``Attendee.save()`` still decides who gets a seat.
+"""
+import hashlib
+import ipaddress
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .caching import event_version
+
+ADMITTED = 'admitted'
+SOLD_OUT = 'sold_out'
+CLIENT_LIMITED = 'client_rate_limited'
+EVENT_LIMITED = 'event_rate_limited'
+
+_lock = threading.Lock()
+_decisions = Counter()
+
+
+def admission_cache():
+    return caches[getattr(settings, 'EVENTS_ADMISSION_CACHE', 'default')]
+
+
+def record(decision):
+    with _lock:
+        _decisions[decision] += 1
+
+
+def decisions():
+    with _lock:
+        return dict(_decisions)
+
+
+def reset():
+    with _lock:
+        _decisions.clear()
+
+
+@metrics.register
+def _collect_decisions():
+    samples = [({'decision': decision}, count) for decision, count in sorted(decisions().items())]
+    yield 'events_registration_admission_total', 'counter', 'Registration POSTs by admission decision.', samples
+
+
+def _sold_out_key(event_id):
+    return f'events:sold-out:{event_id}:{event_version(event_id)}'
+
+
+def mark_sold_out(event_id):
+    admission_cache().set(_sold_out_key(event_id), True, getattr(settings, 'EVENTS_SOLD_OUT_TIMEOUT', 300))
+
+
+def is_sold_out(event_id):
+    return admission_cache().get(_sold_out_key(event_id), False)
+
+
+def take_token(key, burst, rate):
+    """
+    Take one token from the bucket at ``key`` holding up to ``burst`` tokens and
+    refilling at ``rate`` per second. Returns (taken, seconds until one is available).
+    """
+    cache = admission_cache()
+    now = time.time()
+    tokens, stamp = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    # Idle buckets expire once they would have refilled anyway
+    timeout = math.ceil(burst / rate) + 1
+    if tokens < 1:
+        cache.set(key, (tokens, now), timeout)
+        return False, (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), timeout)
+    return True, 0
+
+
+def _networks(entries):
+    return [ipaddress.ip_network(entry, strict=False) for entry in entries]
+
+
+def _is_trusted(address, networks):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(request):
+    """
+    The address of the client behind ``request``. When the peer is one of
+    ``EVENTS_TRUSTED_PROXIES`` (addresses or networks), the forwarding header
+    ``EVENTS_CLIENT_IP_HEADER`` is read from the right, skipping trusted proxies; the
+    first other address is the client. Entries left of it were written by the client
+    and are ignored.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    networks = _networks(getattr(settings, 'EVENTS_TRUSTED_PROXIES', []))
+    if not networks or not _is_trusted(address, networks):
+        return address
+    forwarded = request.META.get(getattr(settings, 'EVENTS_CLIENT_IP_HEADER', 'HTTP_X_FORWARDED_FOR'), '')
+    for hop in reversed([hop.strip() for hop in forwarded.split(',') if hop.strip()]):
+        address = hop
+        if not _is_trusted(hop, networks):
+            break
+    return address
+
+
+def client_key(request):
+    """
+    Identify the client without a database lookup, by its address. Cookies are not
+    used: a client picks their value, so a fresh one per request would get it a fresh
+    bucket each time.
+    """
+    return hashlib.sha1(f"ip:{client_address(request)}".encode()).hexdigest()
+
+
+def admit(request, event_id):
+    """Return (decision, retry_after_seconds) for a registration POST to ``event_id``."""
+    if is_sold_out(event_id):
+        decision, retry_after = SOLD_OUT, 0
+    else:
+        burst, rate = getattr(settings, 'EVENTS_REGISTRATION_CLIENT_RATE', (5, 0.2))
+        taken, retry_after = take_token(f'events:bucket:client:{client_key(request)}', burst, rate)
+        if not taken:
+            decision = CLIENT_LIMITED
+        else:
+            burst, rate = getattr(settings, 'EVENTS_REGISTRATION_EVENT_RATE', (100, 50))
+            taken, retry_after = take_token(f'events:bucket:event:{event_id}', burst, rate)
+            decision = ADMITTED if taken else EVENT_LIMITED
+    record(decision)
+    return decision, retry_after
@@ -0,0 +1,165 @@
+"""
+Announcement emails to every registered (not cancelled) attendee of an event.
+
+Recipients are streamed with ``.iterator()`` in attendee id order, starting after
+the announcement's checkpoint, as a handful of values rather than model instances.
+The email template is rendered once per announcement, with a marker in place of
+each per-recipient value; each message is that text with the recipient's values
+spliced in. Messages go out in batches over a single SMTP connection. After each
+batch the checkpoint is moved to the last attendee sent to, so a send that crashes
+resumes at the next batch. At worst, the batch in flight at the crash is sent twice.
+
+A send first claims the announcement with a conditional UPDATE, and every
+checkpoint renews the claim (and the task's lease, see tasks.py). Another worker,
+or ``send_announcement --resume``, cannot send the same batches while the claim is
+held. A sender that dies mid-send stops renewing; once its claim expires
+(``EVENTS_TASK_LEASE``) the next sender picks the announcement up at its checkpoint.
+"""
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from . import tasks
+from .models import Announcement, Attendee
+
+DEFAULT_BATCH_SIZE = 500
+RECIPIENT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'confirmation_code')
+
+
+class AnnouncementClaimed(Exception):
+    """Raised when another sender holds the announcement."""
+
+
+def recipients(announcement):
+    """The attendees still to be sent ``announcement``, as dicts, in id order."""
+    return (
+        Attendee.objects.filter(event_id=announcement.event_id, pk__gt=announcement.last_attendee_id)
+        .exclude(attendance_status='cancelled')
+        .order_by('id')
+        .values(*RECIPIENT_FIELDS)
+    )
+
+
+MARKER = '\x00'
+
+
+def compile_body(announcement):
+    """
+    Render the announcement template once and return a function building the body
+    for one recipient row. Per-recipient values are inserted as they are, so the
+    template must not apply filters to ``attendee`` fields.
+    """
+    placeholders = {name: f'{MARKER}{name}{MARKER}' for name in RECIPIENT_FIELDS}
+    text = get_template('events/email/announcement.txt').render({
+        'attendee': placeholders,
+        'event': announcement.event,
+        'message': announcement.message.replace(MARKER, ''),
+    })
+    # Even positions are literal text, odd positions field names
+    parts = text.split(MARKER)
+    fields = [(index, parts[index]) for index in range(1, len(parts), 2)]
+
+    def render(row):
+        body = parts[:]
+        for index, name in fields:
+            body[index] = str(row[name])
+        return ''.join(body)
+    return render
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def claim(announcement, owner):
+    """
+    Take the send for ``owner`` with one conditional UPDATE. Returns False if it has
+    been sent or another sender's claim has not expired yet.
+    """
+    now = timezone.now()
+    return Announcement.objects.filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+        pk=announcement.pk, status__in=[Announcement.PENDING, Announcement.SENDING],
+    ).update(
+        status=Announcement.SENDING, claimed_by=owner, lease_expires_at=now + tasks.lease_duration(),
+    ) == 1
+
+
+def _held(announcement, owner):
+    return Announcement.objects.filter(pk=announcement.pk, claimed_by=owner)
+
+
+def send_announcement(announcement, batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    """
+    Send ``announcement`` to every recipient after its checkpoint and return how many
+    messages this call sent. Raises AnnouncementClaimed if another sender is at it.
+    """
+    if announcement.status == Announcement.SENT:
+        return 0
+    owner = uuid.uuid4().hex
+    if not claim(announcement, owner):
+        announcement.refresh_from_db(fields=['status', 'last_attendee_id', 'sent_count'])
+        if announcement.status == Announcement.SENT:
+            return 0
+        raise AnnouncementClaimed(f"Announcement {announcement.pk} is being sent by another worker.")
+    # Another sender may have moved the checkpoint before its claim expired
+    announcement.refresh_from_db(fields=['last_attendee_id'])
+
+    render = compile_body(announcement)
+    connection = connection or get_connection()
+    sent = 0
+    try:
+        with connection:
+            for batch in _batches(recipients(announcement).iterator(chunk_size=batch_size), batch_size):
+                connection.send_messages([
+                    EmailMessage(
+                        announcement.subject,
+                        render(row),
+                        settings.DEFAULT_FROM_EMAIL,
+                        [row['email']],
+                        connection=connection,
+                    )
+                    for row in batch
+                ])
+                sent += len(batch)
+                announcement.last_attendee_id = batch[-1]['id']
+                # The checkpoint renews the claim; losing it means our lease ran out
+                # and someone else is sending now
+                if not _held(announcement, owner).update(
+                    last_attendee_id=announcement.last_attendee_id,
+                    sent_count=F('sent_count') + len(batch),
+                    lease_expires_at=timezone.now() + tasks.lease_duration(),
+                ):
+                    raise AnnouncementClaimed(f"Announcement {announcement.pk} was claimed by another worker.")
+                tasks.renew_lease()
+    except BaseException:
+        # Let a retry or --resume continue at once instead of waiting for the lease
+        _held(announcement, owner).update(claimed_by='', lease_expires_at=None)
+        raise
+
+    announcement.status = Announcement.SENT
+    announcement.finished_at = timezone.now()
+    _held(announcement, owner).update(
+        status=announcement.status, finished_at=announcement.finished_at, claimed_by='', lease_expires_at=None,
+    )
+    announcement.refresh_from_db(fields=['sent_count'])
+    return sent
+
+
+@tasks.task(max_attempts=10)
+def send_announcement_task(announcement_id):
+    announcement = Announcement.objects.select_related('event').filter(pk=announcement_id).first()
+    if announcement is not None:
+        # AnnouncementClaimed retries the task with backoff until the other sender is done
+        send_announcement(announcement)
+
+
+def queue_announcement(announcement):
+    tasks.enqueue(send_announcement_task, key=f'announcement:{announcement.pk}', announcement_id=announcement.pk)
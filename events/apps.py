@@ -5,3 +5,7 @@ class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
     verbose_name = 'Event Management'
+
+    def ready(self):
+        # Imported for their side effects: signal receivers and task registration
+        from . import announcements, signals  # noqa: F401
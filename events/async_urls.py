@@ -0,0 +1,24 @@
+"""
+The app's routes for requests served through ASGI (see ``ASGIURLConfMiddleware``):
+the routes in urls.py, with the read-only public views served by their async
+versions from async_views.py.
+"""
+from django.urls import path
+
+from . import async_views, urls
+
+app_name = urls.app_name
+
+ASYNC_VIEWS = {
+    'event_list': async_views.event_list,
+    'event_detail': async_views.event_detail,
+    'registration_confirmation': async_views.registration_confirmation,
+    'check_registration': async_views.check_registration_status,
+    'check_registration_status': async_views.check_registration_api,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
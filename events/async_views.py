@@ -0,0 +1,73 @@
+"""
+Async versions of the read-only public views, routed instead of their counterparts
+in ``views.py`` for requests served through ASGI (see async_urls.py). Queries run
+through the async ORM and templates render in a worker thread, so a slow query or
+client never holds the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.shortcuts import aget_object_or_404, render
+
+from .caching import cache_public_page, catalog_version, event_version, event_versions, page_timeout
+from .models import Attendee, Event
+from .views import _capacity_payload, _not_modified, _status_cache_headers, _tagged_json
+
+arender = sync_to_async(render)
+
+
+@cache_public_page('event_list', catalog_version)
+async def event_list(request):
+    events = [
+        event async for event in
+        Event.objects.filter(is_active=True, registration_open=True).order_by('start_date')
+    ]
+    versions = await sync_to_async(event_versions)([event.pk for event in events])
+    for event in events:
+        event.cache_version = versions[event.pk]
+    return await arender(request, 'events/event_list.html', {
+        'events': events,
+        'card_timeout': page_timeout(),
+    })
+
+
+@cache_public_page('event_detail', event_version)
+async def event_detail(request, event_id):
+    event = await aget_object_or_404(Event, id=event_id, is_active=True)
+    return await arender(request, 'events/event_detail.html', {'event': event})
+
+
+async def registration_confirmation(request, confirmation_code):
+    attendee = await aget_object_or_404(
+        Attendee.objects.select_related('event'), confirmation_code=confirmation_code,
+    )
+    return await arender(request, 'events/registration_confirmation.html', {'attendee': attendee})
+
+
+async def check_registration_status(request):
+    if request.method == 'POST':
+        email = request.POST.get('email')
+        confirmation_code = request.POST.get('confirmation_code')
+
+        try:
+            attendee = await Attendee.objects.select_related('event').aget(
+                email=email, confirmation_code=confirmation_code,
+            )
+            return await arender(request, 'events/registration_status.html', {'attendee': attendee})
+        except Attendee.DoesNotExist:
+            messages.error(request, "No registration found with the provided details.")
+
+    return await arender(request, 'events/check_registration.html')
+
+
+async def check_registration_api(request, event_id):
+    user = await request.auser()
+    viewer = f'user-{user.pk}' if user.is_authenticated else 'anonymous'
+    etag = f'status-{await sync_to_async(event_version)(event_id)}-{viewer}'
+    response = _not_modified(request, etag)
+    if response is None:
+        event = await aget_object_or_404(Event, id=event_id)
+        is_registered = False
+        if user.is_authenticated:
+            is_registered = await Attendee.objects.filter(event=event, user=user).aexists()
+        response = _tagged_json({'is_registered': is_registered, **_capacity_payload(event)}, etag)
+    return _status_cache_headers(response, user)
@@ -0,0 +1,111 @@
+"""
+Printable attendee badges as SVG, with the confirmation code as a Code 128 barcode.
+
+This module imports nothing from Django, so process-pool workers can import it under
+any start method without configuring Django. The parent process reads the rows
+(see ``exports.stream_badges``) and the workers only turn them into SVG.
+"""
+from xml.sax.saxutils import escape
+
+BADGE_FIELDS = ('id', 'first_name', 'last_name', 'company', 'job_title', 'category', 'confirmation_code')
+
+# Bar/space widths of every Code 128 symbol, by value; 103-105 start codes A/B/C, 106 stop
+CODE128_PATTERNS = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+)
+START_B = 104
+STOP = 106
+QUIET_ZONE = 10
+
+CATEGORY_COLORS = {
+    'general': '#6c757d',
+    'vip': '#d4a017',
+    'speaker': '#0d6efd',
+    'sponsor': '#198754',
+}
+CATEGORY_LABELS = {
+    'general': 'GENERAL ADMISSION',
+    'vip': 'VIP',
+    'speaker': 'SPEAKER',
+    'sponsor': 'SPONSOR',
+}
+
+
+def code128_values(text):
+    """Symbol values for ``text`` in code set B, with start code, checksum and stop code."""
+    values = []
+    for char in text:
+        code = ord(char)
+        if not 32 <= code <= 126:
+            raise ValueError(f"Cannot encode {char!r} in Code 128 set B")
+        values.append(code - 32)
+    checksum = (START_B + sum(position * value for position, value in enumerate(values, 1))) % 103
+    return [START_B, *values, checksum, STOP]
+
+
+def code128_modules(text):
+    """Alternating bar/space widths in modules, starting with a bar."""
+    return [int(width) for value in code128_values(text) for width in CODE128_PATTERNS[value]]
+
+
+def barcode_path(text, x, y, width, height):
+    """An SVG path drawing ``text`` as Code 128 centred in a ``width`` wide box at (x, y)."""
+    widths = code128_modules(text)
+    module = width / (sum(widths) + 2 * QUIET_ZONE)
+    cursor = x + QUIET_ZONE * module
+    commands = []
+    for index, modules in enumerate(widths):
+        bar = modules * module
+        if index % 2 == 0:
+            commands.append(f'M{cursor:.2f} {y:.2f}h{bar:.2f}v{height:.2f}h{-bar:.2f}z')
+        cursor += bar
+    return f'<path d="{"".join(commands)}" fill="#000"/>'
+
+
+def _text(value, x, y, size, weight='normal', fill='#212529', fit=None):
+    attrs = f'x="{x}" y="{y}" font-size="{size}" font-weight="{weight}" fill="{fill}" text-anchor="middle"'
+    if fit and len(value) * size * 0.55 > fit:
+        # Squeeze long names into the badge instead of clipping them
+        attrs += f' textLength="{fit}" lengthAdjust="spacingAndGlyphs"'
+    return f'<text {attrs}>{escape(value)}</text>'
+
+
+def render_badge(row):
+    """Render one 4x3 inch badge from a ``BADGE_FIELDS`` dict."""
+    category = row.get('category') or 'general'
+    full_name = f"{row['first_name']} {row['last_name']}".strip()
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" width="4in" height="3in" viewBox="0 0 400 300" '
+        'font-family="Helvetica, Arial, sans-serif">',
+        '<rect width="400" height="300" fill="#fff" stroke="#dee2e6"/>',
+        f'<rect width="400" height="44" fill="{CATEGORY_COLORS.get(category, CATEGORY_COLORS["general"])}"/>',
+        _text(CATEGORY_LABELS.get(category, category.upper()), 200, 30, 20, 'bold', '#fff'),
+        _text(full_name, 200, 100, 32, 'bold', fit=360),
+    ]
+    if row.get('job_title'):
+        parts.append(_text(row['job_title'], 200, 132, 18, fit=360))
+    if row.get('company'):
+        parts.append(_text(row['company'], 200, 158, 18, '#495057', fit=360))
+    parts.append(barcode_path(row['confirmation_code'], 70, 196, 260, 64))
+    parts.append(_text(row['confirmation_code'], 200, 286, 16, fill='#495057'))
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def badge_filename(row):
+    return f"badge-{row['id']:08d}-{row['confirmation_code']}.svg"
+
+
+def render_chunk(rows):
+    """Render a chunk of rows to ``[(filename, svg bytes), ...]``; runs in pool workers."""
+    return [(badge_filename(row), render_badge(row).encode()) for row in rows]
@@ -0,0 +1,456 @@
+"""
+Load and stress helpers shared by the benchmark management commands and the test suite.
+"""
+import itertools
+import math
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Attendee, Event, EventFullError
+
+
+def _with_retries(operation, retries=50):
+    """
+    Run ``operation`` and return (result, lock retries). SQLite serialises writers and
+    may report the database as locked under contention; back off and retry so that
+    every attempt ends with a result. Gives up with (None, retries).
+    """
+    for attempt in range(retries):
+        try:
+            return operation(), attempt
+        except OperationalError:
+            time.sleep(0.001 * (attempt + 1))
+    return None, retries
+
+
+def _register_once(event_id, n):
+    def register():
+        try:
+            Attendee.objects.create(
+                event_id=event_id,
+                first_name='Stress',
+                last_name=f'Tester {n}',
+                email=f'stress-{n}@example.com',
+            )
+            return 'admitted'
+        except EventFullError:
+            return 'rejected'
+
+    outcome, retries = _with_retries(register)
+    return outcome or 'error', retries
+
+
+def stress_registrations(event, attempts=200, workers=16):
+    """
+    Fire ``attempts`` concurrent registrations for ``event`` from ``workers`` threads
+    and return the outcome counts together with the measured registrations/sec.
+    """
+    outcomes = {'admitted': 0, 'rejected': 0, 'error': 0, 'lock_retries': 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(workers)
+
+    def worker(offset):
+        start_gate.wait()
+        try:
+            for n in range(offset, attempts, workers):
+                outcome, retries = _register_once(event.pk, n)
+                with lock:
+                    outcomes[outcome] += 1
+                    outcomes['lock_retries'] += retries
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+
+    event.refresh_from_db(fields=['registered_count'])
+    return {
+        **outcomes,
+        'attempts': attempts,
+        'workers': workers,
+        'max_attendees': event.max_attendees,
+        'registered_count': event.registered_count,
+        'attendee_rows': Attendee.objects.filter(event=event).count(),
+        'elapsed_seconds': round(elapsed, 4),
+        'registrations_per_second': round(attempts / elapsed, 1) if elapsed else None,
+    }
+
+
+def stress_checkins(event, workers=16):
+    """
+    Check in every registered attendee of ``event`` one scan at a time from ``workers``
+    threads, the way a row of door scanners does, and return the outcome counts and
+    check-ins/sec.
+    """
+    from .checkin import OK, apply_scans
+
+    codes = list(event.attendees.filter(attendance_status='registered').values_list('confirmation_code', flat=True))
+    outcomes = {'checked_in': 0, 'other': 0, 'error': 0, 'lock_retries': 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(workers)
+
+    def worker(offset):
+        start_gate.wait()
+        try:
+            for code in codes[offset::workers]:
+                results, retries = _with_retries(lambda: apply_scans(event, [(code, timezone.now())]))
+                outcome = 'error' if results is None else 'checked_in' if results[code] == OK else 'other'
+                with lock:
+                    outcomes[outcome] += 1
+                    outcomes['lock_retries'] += retries
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+    return {
+        **outcomes,
+        'scans': len(codes),
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 4),
+        'checkins_per_second': round(len(codes) / elapsed, 1) if elapsed else None,
+    }
+
+
+FIRST_NAMES = ['Ada', 'Grace', 'Linus', 'Tendai', 'Chipo', 'Farai', 'Guido', 'Barbara', 'Ken', 'Nyasha', 'Alan', 'Rudo']
+LAST_NAMES = ['Lovelace', 'Hopper', 'Torvalds', 'Moyo', 'Ncube', 'Dube', 'van Rossum', 'Liskov', 'Thompson', 'Sibanda', 'Turing']
+COMPANIES = ['', 'Initech', 'Globex', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises', 'Acme']
+# Rough production mix on event day
+STATUS_WEIGHTS = {'registered': 60, 'checked_in': 25, 'cancelled': 8, 'no_show': 7}
+CATEGORY_WEIGHTS = {'general': 75, 'vip': 10, 'speaker': 7, 'sponsor': 8}
+
+
+def generate_synthetic_data(events=10, attendees=1000, seed=None, batch_size=5000):
+    """
+    Create ``events`` events sharing ``attendees`` attendees between them with
+    bulk_create, then set every event's registration counter in one UPDATE.
+    Confirmation codes start with 'S', which never occurs in generated (hex) codes.
+    Returns the created events.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created_events = []
+    for n in range(events):
+        start = now + timedelta(days=rng.randint(1, 120), hours=rng.randint(8, 18))
+        created_events.append(Event(
+            title=f'Synthetic Event {n + 1}',
+            description='Generated for benchmarking.',
+            start_date=start,
+            end_date=start + timedelta(hours=rng.choice([2, 4, 8])),
+            location=rng.choice(['Harare', 'Bulawayo', 'Mutare', 'Gweru']),
+            max_attendees=1,  # raised below once the attendees are assigned
+        ))
+    created_events = Event.objects.bulk_create(created_events)
+
+    sizes = [0] * events
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    categories, category_weights = zip(*CATEGORY_WEIGHTS.items())
+    run = uuid.uuid4().hex[:3].upper()
+    batch = []
+    for n in range(attendees):
+        index = rng.randrange(events)
+        sizes[index] += 1
+        status = rng.choices(statuses, status_weights)[0]
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        batch.append(Attendee(
+            event=created_events[index],
+            first_name=first,
+            last_name=last,
+            email=f'{first.lower()}.{n}.{run.lower()}@example.com',
+            company=rng.choice(COMPANIES),
+            category=rng.choices(categories, category_weights)[0],
+            attendance_status=status,
+            check_in_time=now if status == 'checked_in' else None,
+            confirmation_code=f'S{run}{n:x}'.upper(),
+        ))
+        if len(batch) >= batch_size:
+            Attendee.objects.bulk_create(batch)
+            batch = []
+    Attendee.objects.bulk_create(batch)
+
+    for event, size in zip(created_events, sizes):
+        # Leave some headroom so registrations can still succeed
+        event.max_attendees = max(10, int(size * 1.2) + 10)
+    Event.objects.bulk_update(created_events, ['max_attendees'])
+    Event.reconcile_registered_counts()
+    return created_events
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, queries, elapsed):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def _view_scenarios(event, staff, codes):
+    """(name, method, url, data factory, client user) for each benchmarked view."""
+    counter = itertools.count()
+
+    def registration(_):
+        n = next(counter)
+        return {
+            'first_name': 'Bench', 'last_name': f'Mark {n}',
+            'email': f'bench-{n}-{uuid.uuid4().hex[:6]}@example.com', 'category': 'general',
+        }
+
+    code_iter = iter(codes)
+
+    def check_in(_):
+        return {'confirmation_code': next(code_iter, 'NOPE0000')}
+
+    return [
+        ('event_list', 'get', reverse('events:event_list'), None, None),
+        ('event_detail', 'get', reverse('events:event_detail', args=[event.pk]), None, None),
+        ('check_registration_api', 'get', reverse('events:check_registration_status', args=[event.pk]), None, None),
+        ('register_attendee', 'post', reverse('events:register_attendee', args=[event.pk]), registration, None),
+        ('manage_attendees', 'get', reverse('events:manage_attendees', args=[event.pk]), None, staff),
+        ('attendance_report', 'get', reverse('events:attendance_report', args=[event.pk]), None, staff),
+        ('check_in_attendee', 'post', reverse('events:check_in_attendee', args=[event.pk]), check_in, staff),
+    ]
+
+
+# One benchmark client posts every registration; lift the admission limits for it
+UNLIMITED_ADMISSION = {
+    'EVENTS_REGISTRATION_CLIENT_RATE': (10 ** 9, 10 ** 9),
+    'EVENTS_REGISTRATION_EVENT_RATE': (10 ** 9, 10 ** 9),
+}
+
+
+def benchmark_views(event, staff, iterations=50, warmup=3):
+    """
+    Drive each view through the test client and return
+    ``{view: {p50_ms, p99_ms, mean_ms, queries_per_request, throughput_rps, ...}}``.
+    """
+    from django.test import override_settings
+
+    with override_settings(**UNLIMITED_ADMISSION):
+        return _benchmark_views(event, staff, iterations, warmup)
+
+
+def _benchmark_views(event, staff, iterations, warmup):
+    codes = list(
+        event.attendees.filter(attendance_status='registered')
+        .values_list('confirmation_code', flat=True)[:iterations + warmup]
+    )
+    results = {}
+    for name, method, url, data_factory, user in _view_scenarios(event, staff, codes):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        for n in range(warmup):
+            getattr(client, method)(url, data_factory(n) if data_factory else None)
+
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for n in range(iterations):
+            data = data_factory(n) if data_factory else None
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(len(captured))
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        results[name] = summarize(latencies, queries, time.perf_counter() - started)
+    return results
+
+
+def run_benchmarks(scales, iterations=50):
+    """
+    Benchmark the views at each ``(events, attendees)`` scale. Every scale starts from
+    empty event tables, so run this against a throwaway database only.
+    """
+    from django.contrib.auth.models import User
+    from django.core.cache import caches
+
+    results = []
+    for events, attendees in scales:
+        Attendee.objects.all().delete()
+        Event.objects.all().delete()
+        for cache in caches.all():
+            cache.clear()
+        generate_synthetic_data(events, attendees, seed=events * 1_000_003 + attendees)
+        # Benchmark the largest event: that is where per-attendee work shows up
+        event = Event.objects.order_by('-registered_count', 'pk').first()
+        staff = User.objects.filter(username='benchmark-staff').first() or User.objects.create_user(
+            'benchmark-staff', 'staff@example.com', 'benchmark', is_staff=True,
+        )
+        results.append({
+            'events': events,
+            'attendees': attendees,
+            'event_attendees': event.registered_count,
+            'views': benchmark_views(event, staff, iterations=iterations),
+        })
+    return results
+
+
+def compare(baseline, current):
+    """Per scale and view, the ratio of current to baseline p50/p99 latency and query counts."""
+    previous = {(run['events'], run['attendees']): run['views'] for run in baseline.get('runs', [])}
+    changes = []
+    for run in current['runs']:
+        before = previous.get((run['events'], run['attendees']), {})
+        for view, stats in run['views'].items():
+            if view not in before:
+                continue
+            old = before[view]
+            changes.append({
+                'scale': f"{run['events']}x{run['attendees']}",
+                'view': view,
+                'p50_ratio': round(stats['p50_ms'] / old['p50_ms'], 2) if old['p50_ms'] else None,
+                'p99_ratio': round(stats['p99_ms'] / old['p99_ms'], 2) if old['p99_ms'] else None,
+                'queries_delta': round(stats['queries_per_request'] - old['queries_per_request'], 2),
+            })
+    return changes
+
+
+def _public_paths(event, attendee):
+    return [
+        reverse('events:event_list'),
+        reverse('events:event_detail', args=[event.pk]),
+        reverse('events:registration_confirmation', args=[attendee.confirmation_code]),
+        reverse('events:check_registration_status', args=[event.pk]),
+    ]
+
+
+def _drive_sync(paths, concurrency, total):
+    latencies, errors = [], []
+
+    def worker(n):
+        client = Client()
+        try:
+            for i in range(n, total, concurrency):
+                started = time.perf_counter()
+                response = client.get(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return latencies, len(errors), time.perf_counter() - started
+
+
+async def _drive_async(paths, concurrency, total):
+    import asyncio
+
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    latencies, errors = [], []
+
+    async def worker(n):
+        for i in range(n, total, concurrency):
+            started = time.perf_counter()
+            response = await client.get(paths[i % len(paths)])
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # The async ORM ran its queries on asgiref's shared thread; release its connection
+    await sync_to_async(connections.close_all)()
+    return latencies, len(errors), elapsed
+
+
+def compare_sync_async(event, concurrency=16, total=400):
+    """
+    Request the read-only public views ``total`` times with ``concurrency`` requests in
+    flight, once through the sync views on a thread pool of that size (a threaded WSGI
+    worker) and once through the async views on one event loop (an ASGI worker; the
+    async test client is served through ``EVENTS_ASGI_URLCONF`` like a real one).
+    The page cache is bypassed so both paths do their queries and rendering.
+    """
+    import asyncio
+
+    from django.test import override_settings
+
+    attendee = event.attendees.first()
+    paths = _public_paths(event, attendee)
+    results = {}
+    with override_settings(EVENTS_PAGE_CACHE_TIMEOUT=0):
+        for mode in ('wsgi', 'asgi'):
+            if mode == 'asgi':
+                latencies, errors, elapsed = asyncio.run(_drive_async(paths, concurrency, total))
+            else:
+                latencies, errors, elapsed = _drive_sync(paths, concurrency, total)
+            results[mode] = {
+                'requests': len(latencies),
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                'throughput_rps': round(len(latencies) / elapsed, 1),
+            }
+    results['concurrency'] = concurrency
+    return results
+
+
+def _throwaway_event(title, capacity):
+    start = timezone.now() + timedelta(days=1)
+    return Event.objects.create(
+        title=title, description='Created by a benchmark', start_date=start,
+        end_date=start + timedelta(hours=1), location='-', max_attendees=capacity,
+    )
+
+
+def database_benchmark(workers=16, registrations=1000, checkins=1000):
+    """
+    Concurrent registrations against an event with room for half of them, then
+    concurrent single-scan check-ins of ``checkins`` attendees. Returns both results
+    with the database settings in force.
+    """
+    event = _throwaway_event('Registration benchmark', registrations // 2)
+    registration_result = stress_registrations(event, attempts=registrations, workers=workers)
+
+    door = _throwaway_event('Check-in benchmark', checkins)
+    run = uuid.uuid4().hex[:4].upper()
+    Attendee.objects.bulk_create([
+        Attendee(event=door, first_name='Door', last_name=f'Scan {n}', email=f'door-{n}@example.com',
+                 confirmation_code=f'D{run}{n:07X}')
+        for n in range(checkins)
+    ], batch_size=5000)
+    Event.reconcile_registered_counts()
+    checkin_result = stress_checkins(door, workers=workers)
+
+    settings_dict = connection.settings_dict
+    database = {'vendor': connection.vendor, 'options': dict(settings_dict.get('OPTIONS', {}))}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                database[pragma] = cursor.fetchone()[0]
+    return {'database': database, 'registrations': registration_result, 'checkins': checkin_result}
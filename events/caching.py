@@ -0,0 +1,218 @@
+"""
+Versioned caching for the public event catalog.
+
+Cache keys embed version stamps instead of being deleted on change: the catalog
+(``event_list``) has one version and every event has its own. Saving or deleting an
+Event or Attendee bumps the versions it affects, so stale pages and card fragments are
+never looked up again and simply expire. Versions start from a nanosecond timestamp,
+so a version evicted from the cache can never come back with a value that matches
+old entries. That also lets versions expire (``EVENTS_VERSION_TIMEOUT``), so
+looking up versions for made-up event ids cannot fill the cache for good.
+
+Whole pages are cached only for anonymous GET requests with no pending flash
+messages. Logged-in users still get the per-event card fragments. A page that may
+store either reads from the primary database, never from a read replica (see
+routing.py).
+
+Versions live in the ``EVENTS_PAGE_CACHE`` cache (default ``'default'``). With several
+worker processes this has to be a shared backend (file-based, Redis, memcached);
+a local-memory cache only invalidates within its own process.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from . import metrics, routing
+
+CATALOG_KEY = 'events:catalog:version'
+EPOCH_KEY = 'events:cache:epoch'
+
+_lock = threading.Lock()
+_stats = Counter()
+
+
+def page_cache():
+    return caches[getattr(settings, 'EVENTS_PAGE_CACHE', 'default')]
+
+
+def page_timeout():
+    return getattr(settings, 'EVENTS_PAGE_CACHE_TIMEOUT', 300)
+
+
+def version_timeout():
+    # Must outlive the pages cached under a version, or they could be served after a change
+    return max(getattr(settings, 'EVENTS_VERSION_TIMEOUT', 7 * 24 * 3600), page_timeout())
+
+
+def _event_key(event_id):
+    return f'events:event:{event_id}:version'
+
+
+def _versions(keys):
+    cache = page_cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), version_timeout())
+            found[key] = cache.get(key)
+    return found
+
+
+def _bump(key):
+    cache = page_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), version_timeout())
+
+
+def catalog_version():
+    versions = _versions([EPOCH_KEY, CATALOG_KEY])
+    return f'{versions[EPOCH_KEY]}.{versions[CATALOG_KEY]}'
+
+
+def event_versions(event_ids):
+    """Map each event id to its current version stamp."""
+    keys = {_event_key(event_id): event_id for event_id in event_ids}
+    versions = _versions([EPOCH_KEY, *keys])
+    epoch = versions[EPOCH_KEY]
+    return {event_id: f'{epoch}.{versions[key]}' for key, event_id in keys.items()}
+
+
+def event_version(event_id):
+    return event_versions([event_id])[event_id]
+
+
+def bump_event(event_id):
+    _bump(_event_key(event_id))
+    _bump(CATALOG_KEY)
+
+
+def invalidate_event(event_id):
+    """
+    Bump an event's version now and again once the transaction commits. The first
+    bump hides the change from this process at once; the second stops a concurrent
+    request that read the old rows from caching them under the new version.
+    """
+    bump_event(event_id)
+    transaction.on_commit(partial(bump_event, event_id))
+
+
+def invalidate_all():
+    """Retire every cached page and fragment, e.g. after counters were rewritten in bulk."""
+    _bump(EPOCH_KEY)
+
+
+def record(page, result):
+    with _lock:
+        _stats[(page, result)] += 1
+
+
+def stats():
+    """``{page: {'hit': n, 'miss': n, 'bypass': n}}`` since start-up."""
+    with _lock:
+        summary = {}
+        for (page, result), count in _stats.items():
+            summary.setdefault(page, {'hit': 0, 'miss': 0, 'bypass': 0})[result] = count
+        return summary
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+@metrics.register
+def _collect_page_cache():
+    samples = [
+        ({'page': page, 'result': result}, count)
+        for page, results in sorted(stats().items())
+        for result, count in results.items()
+    ]
+    yield 'events_page_cache_requests_total', 'counter', 'Public page cache lookups, by page and result.', samples
+
+
+def _is_cacheable(request, user):
+    if request.method not in ('GET', 'HEAD') or user.is_authenticated or not page_timeout():
+        return False
+    # A pending flash message is rendered into the page and must not be shared
+    return len(get_messages(request)) == 0
+
+
+def _page_key(name, version, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'events:page:{name}:{version}:{path}'
+
+
+def _should_store(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def cache_public_page(name, version):
+    """
+    Cache the rendered page for anonymous visitors under ``version(**view_kwargs)``,
+    which must change whenever anything shown on the page does. Works on sync and
+    async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # auser() loads the session, so the message check below stays off the DB
+                if not _is_cacheable(request, await request.auser()):
+                    record(name, 'bypass')
+                    if page_timeout():
+                        # Card fragments are still cached under event versions
+                        routing.read_from_primary()
+                    return await view(request, *args, **kwargs)
+
+                key = _page_key(name, await sync_to_async(version)(**kwargs), request)
+                cache = page_cache()
+                cached = await cache.aget(key)
+                if cached is not None:
+                    record(name, 'hit')
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                record(name, 'miss')
+                routing.read_from_primary()
+                response = await view(request, *args, **kwargs)
+                if _should_store(response):
+                    await cache.aset(key, (response.content, response['Content-Type']), page_timeout())
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request, request.user):
+                record(name, 'bypass')
+                if page_timeout():
+                    # Card fragments are still cached under event versions
+                    routing.read_from_primary()
+                return view(request, *args, **kwargs)
+
+            key = _page_key(name, version(**kwargs), request)
+            cache = page_cache()
+            cached = cache.get(key)
+            if cached is not None:
+                record(name, 'hit')
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            record(name, 'miss')
+            routing.read_from_primary()
+            response = view(request, *args, **kwargs)
+            if _should_store(response):
+                cache.set(key, (response.content, response['Content-Type']), page_timeout())
+            return response
+        return wrapper
+    return decorator
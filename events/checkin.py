@@ -0,0 +1,247 @@
+"""
+Check-in processing shared by the check-in station and the door-scanner sync API.
+
+Confirmation codes are resolved through a per-event index held in the ``checkin``
+cache: one ``code -> (attendee id, status, full name)`` entry per attendee. It is
+preloaded before doors open and kept current by model signals. A miss falls back to
+the database and fills the entry. The check-in UPDATE itself still filters on the
+stored status, so an entry left stale by another process can never check in a
+cancelled or already checked-in attendee.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, live
+from .models import Attendee
+
+OK = 'ok'
+ALREADY_CHECKED_IN = 'already_checked_in'
+CANCELLED = 'cancelled'
+UNKNOWN = 'unknown'
+
+CHECKABLE_STATUSES = ('registered', 'no_show')
+# Statuses a bulk update may move a row from, per target status; cancelled rows never move
+BULK_SOURCE_STATUSES = {
+    'checked_in': CHECKABLE_STATUSES,
+    'no_show': ('registered',),
+}
+MAX_BATCH = 1000
+LOOKUP_CHUNK = 500
+
+
+class ScanError(ValueError):
+    """Raised for a malformed scan batch."""
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def parse_scans(payload):
+    """
+    Turn a ``{"scans": [{"confirmation_code": ..., "scanned_at": ...}, ...]}`` payload
+    into a list of (code, scanned_at) pairs. ``scanned_at`` is optional ISO 8601 and
+    defaults to now; naive timestamps are taken as the current time zone.
+    """
+    scans = payload.get('scans') if isinstance(payload, dict) else payload
+    if not isinstance(scans, list):
+        raise ScanError("Expected a list of scans.")
+    if len(scans) > MAX_BATCH:
+        raise ScanError(f"At most {MAX_BATCH} scans per request.")
+
+    now = timezone.now()
+    parsed = []
+    for scan in scans:
+        if not isinstance(scan, dict) or not scan.get('confirmation_code'):
+            raise ScanError("Every scan needs a confirmation_code.")
+        scanned_at = now
+        if scan.get('scanned_at'):
+            try:
+                scanned_at = parse_datetime(str(scan['scanned_at']))
+            except ValueError:
+                scanned_at = None
+            if scanned_at is None:
+                raise ScanError(f"Invalid scanned_at: {scan['scanned_at']!r}")
+            if timezone.is_naive(scanned_at):
+                scanned_at = timezone.make_aware(scanned_at)
+        parsed.append((normalize_code(str(scan['confirmation_code'])), scanned_at))
+    return parsed
+
+
+INDEX_FIELDS = ('confirmation_code', 'id', 'attendance_status', 'first_name', 'last_name')
+WARM_CHUNK = 5000
+
+
+def index_cache():
+    return caches[getattr(settings, 'EVENTS_CHECKIN_CACHE', 'checkin')]
+
+
+def _generation(event_id):
+    return index_cache().get(f'checkin:{event_id}:gen', 0)
+
+
+def _key(event_id, generation, code):
+    return f'checkin:{event_id}:{generation}:{code}'
+
+
+def _entry(attendee_id, status, first_name, last_name):
+    return (attendee_id, status, f"{first_name} {last_name}")
+
+
+def _store(event_id, entries):
+    generation = _generation(event_id)
+    index_cache().set_many({_key(event_id, generation, code): entry for code, entry in entries.items()})
+
+
+def _index_rows(event_id, rows):
+    entries = {
+        code: _entry(attendee_id, status, first, last)
+        for code, attendee_id, status, first, last in rows
+    }
+    _store(event_id, entries)
+    return entries
+
+
+def warm_index(event_id):
+    """Load every confirmation code of an event into the index; returns the number indexed."""
+    rows = Attendee.objects.filter(event_id=event_id).order_by().values_list(*INDEX_FIELDS)
+    total, chunk = 0, []
+    for row in rows.iterator(chunk_size=WARM_CHUNK):
+        chunk.append(row)
+        if len(chunk) >= WARM_CHUNK:
+            total += len(_index_rows(event_id, chunk))
+            chunk = []
+    total += len(_index_rows(event_id, chunk))
+    index_cache().set(f'checkin:{event_id}:{_generation(event_id)}:warm', total)
+    return total
+
+
+def is_warm(event_id):
+    return index_cache().get(f'checkin:{event_id}:{_generation(event_id)}:warm') is not None
+
+
+def invalidate_index(event_id):
+    """Drop every entry of an event at once by moving it to a new key generation."""
+    index_cache().set(f'checkin:{event_id}:gen', _generation(event_id) + 1, None)
+
+
+def index_attendee(attendee):
+    _index_rows(attendee.event_id, [(
+        attendee.confirmation_code, attendee.pk, attendee.attendance_status,
+        attendee.first_name, attendee.last_name,
+    )])
+
+
+def unindex_attendee(attendee):
+    index_cache().delete(_key(attendee.event_id, _generation(attendee.event_id), attendee.confirmation_code))
+
+
+def resolve_codes(event, codes):
+    """Map codes to (attendee id, status, full name) from the index, reading misses from the DB."""
+    generation = _generation(event.pk)
+    codes = list(codes)
+    hits = index_cache().get_many([_key(event.pk, generation, code) for code in codes])
+    found = {}
+    missing = []
+    for code in codes:
+        entry = hits.get(_key(event.pk, generation, code))
+        if entry is None:
+            missing.append(code)
+        else:
+            found[code] = entry
+    for start in range(0, len(missing), LOOKUP_CHUNK):
+        rows = event.attendees.filter(
+            confirmation_code__in=missing[start:start + LOOKUP_CHUNK]
+        ).values_list(*INDEX_FIELDS)
+        found.update(_index_rows(event.pk, rows))
+    return found
+
+
+def resolve_code(event, code):
+    return resolve_codes(event, [code]).get(code)
+
+
+def apply_scans(event, scans):
+    """
+    Check in a batch of (code, scanned_at) scans for ``event``. Idempotent: replaying
+    a batch changes nothing and returns the same results, so a scanner can resend a
+    batch whose response it never received; a later scan of the same code reports
+    ``already_checked_in``. Eligible
+    attendees are updated with one UPDATE that touches only the status and
+    check-in time. Returns ``{code: result}``.
+    """
+    # The earliest scan of a code wins if a scanner queued it more than once
+    earliest = {}
+    for code, scanned_at in scans:
+        if code not in earliest or scanned_at < earliest[code]:
+            earliest[code] = scanned_at
+
+    found = resolve_codes(event, earliest)
+    results = {code: UNKNOWN for code in earliest if code not in found}
+    by_id = {found[code][0]: code for code in earliest if code in found}
+    if not by_id:
+        return results
+
+    # The index only maps codes to rows; the status filter in the UPDATE decides
+    updated = Attendee.objects.filter(
+        pk__in=list(by_id), attendance_status__in=CHECKABLE_STATUSES
+    ).update(
+        attendance_status='checked_in',
+        check_in_time=Case(
+            *[When(pk=attendee_id, then=Value(earliest[code])) for attendee_id, code in by_id.items()],
+            output_field=DateTimeField(),
+        ),
+    )
+    live.publish_delta(event.pk, checked_in=updated)
+
+    if updated == len(by_id):
+        current_status = {code: 'checked_in' for code in by_id.values()}
+        results.update((code, OK) for code in by_id.values())
+    else:
+        # Some rows were not eligible: read them back. A row carrying exactly our scan
+        # time was checked in by this scan, now or by an earlier delivery of it.
+        current_status = {}
+        results.update((code, UNKNOWN) for code in by_id.values())
+        current = Attendee.objects.filter(pk__in=list(by_id)).values_list('id', 'attendance_status', 'check_in_time')
+        for attendee_id, status, check_in_time in current:
+            code = by_id[attendee_id]
+            current_status[code] = status
+            if status == 'cancelled':
+                results[code] = CANCELLED
+            elif status == 'checked_in' and check_in_time == earliest[code]:
+                results[code] = OK
+            elif status == 'checked_in':
+                results[code] = ALREADY_CHECKED_IN
+
+    # Queryset updates send no signals, so refresh the index entries ourselves
+    _store(event.pk, {
+        code: (found[code][0], status, found[code][2]) for code, status in current_status.items()
+    })
+    return results
+
+
+def bulk_update_status(attendees, status):
+    """
+    Move the eligible rows of the ``attendees`` queryset to ``status`` ('checked_in'
+    or 'no_show') with one UPDATE and return how many changed. Queryset updates send
+    no signals, so the affected events' caches, check-in indexes and live streams are
+    refreshed here.
+    """
+    eligible = attendees.filter(attendance_status__in=BULK_SOURCE_STATUSES[status])
+    event_ids = list(eligible.order_by().values_list('event_id', flat=True).distinct())
+    changes = {'attendance_status': status}
+    if status == 'checked_in':
+        changes['check_in_time'] = timezone.now()
+    updated = eligible.update(**changes)
+    if updated:
+        for event_id in event_ids:
+            caching.invalidate_event(event_id)
+            live.publish_resync(event_id)
+            transaction.on_commit(partial(invalidate_index, event_id))
+    return updated
@@ -0,0 +1,146 @@
+"""
+Streaming attendee exports.
+
+Rows are pulled with ``values_list(...).iterator()`` so only the exported columns are
+fetched, in fixed-size chunks (a server-side cursor on PostgreSQL), and each line
+is written to the response as soon as it is produced.
+
+Badges are exported the same way, as a zip of SVG files. Rows are cut into chunks
+of consecutive attendee ids and rendered on a process pool. Each chunk is written
+to the archive as soon as it and every chunk before it are done, so the archive
+keeps id order.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .badges import BADGE_FIELDS, render_chunk
+
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('event_id', 'event_id'),
+    ('event', 'event__title'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('email', 'email'),
+    ('phone_number', 'phone_number'),
+    ('company', 'company'),
+    ('job_title', 'job_title'),
+    ('category', 'category'),
+    ('attendance_status', 'attendance_status'),
+    ('confirmation_code', 'confirmation_code'),
+    ('registration_date', 'registration_date'),
+    ('check_in_time', 'check_in_time'),
+]
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """A file-like object whose write() hands the line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    return queryset.order_by('id').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in export_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def stream_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in export_rows(queryset, chunk_size):
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(queryset, export_format):
+    if export_format == 'ndjson':
+        return stream_ndjson(queryset)
+    return stream_csv(queryset)
+
+
+BADGE_CHUNK_SIZE = 500
+
+
+def badge_workers():
+    return getattr(settings, 'EVENTS_BADGE_WORKERS', None) or os.cpu_count() or 1
+
+
+def badge_chunks(queryset, chunk_size=BADGE_CHUNK_SIZE):
+    """Lists of badge rows covering consecutive ranges of attendee ids."""
+    rows = queryset.order_by('id').values(*BADGE_FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def render_badges(chunks, workers):
+    """Yield ``(filename, svg)`` for every row of ``chunks``, in order, rendered on ``workers`` processes."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield from render_chunk(chunk)
+        return
+    # Spawned workers only import events.badges; forking a threaded server could deadlock
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(render_chunk, chunk))
+            # Keep every worker busy without reading the whole event into memory
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class ZipStream:
+    """A write-only file for ZipFile that hands back whatever has been written since the last read."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_badges(queryset, workers=None, chunk_size=BADGE_CHUNK_SIZE):
+    """Yield a zip archive of one SVG badge per attendee in ``queryset``, piece by piece."""
+    stream = ZipStream()
+    # ZipFile cannot seek back in a stream, so it writes sizes after each member instead
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, svg in render_badges(badge_chunks(queryset, chunk_size), workers or badge_workers()):
+            archive.writestr(filename, svg)
+            data = stream.read()
+            if data:
+                yield data
+    yield stream.read()
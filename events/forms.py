@@ -1,5 +1,5 @@
 from django import forms
-from .models import Attendee, Event
+from .models import Announcement, Attendee, Event, WaitlistEntry
 from django.contrib.auth.models import User
 
 class AttendeeRegistrationForm(forms.ModelForm):
@@ -80,4 +80,33 @@ class CheckInForm(forms.Form):
             'autofocus': True
         })
     )
-   
\ No newline at end of file
+   
+
+class AttendeeImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label='Attendee CSV',
+        help_text="Columns: first_name, last_name, email (required); phone_number, company, job_title, category, dietary_restrictions, notes (optional)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
+
+
+class AnnouncementForm(forms.ModelForm):
+    class Meta:
+        model = Announcement
+        fields = ['subject', 'message']
+        widgets = {
+            'subject': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. Venue change for Saturday'}),
+            'message': forms.Textarea(attrs={'class': 'form-control', 'rows': 8}),
+        }
+
+
+class WaitlistForm(forms.ModelForm):
+    class Meta:
+        model = WaitlistEntry
+        fields = ['first_name', 'last_name', 'email', 'category']
+        widgets = {
+            'first_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter your first name'}),
+            'last_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter your last name'}),
+            'email': forms.EmailInput(attrs={'class': 'form-control', 'placeholder': 'Enter your email address'}),
+            'category': forms.Select(attrs={'class': 'form-control'}),
+        }
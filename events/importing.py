@@ -0,0 +1,170 @@
+"""
+Bulk attendee import for partner lists (sponsors, speakers, ...).
+
+Rows are read lazily from a CSV, validated with the Attendee field validators,
+de-duplicated by normalized email against the file and the event, and written in
+batches with ``bulk_create``. Each batch claims its seats with one conditional UPDATE
+instead of one capacity check per row.
+"""
+import codecs
+import csv
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.db.models.lookups import In
+
+from . import caching, live, waitlist
+from .accounts import normalize_email
+from .models import Attendee, Event, EventFullError
+
+IMPORT_FIELDS = [
+    'first_name', 'last_name', 'email', 'phone_number', 'company',
+    'job_title', 'category', 'dietary_restrictions', 'notes',
+]
+REQUIRED_COLUMNS = {'first_name', 'last_name', 'email'}
+DEFAULT_BATCH_SIZE = 1000
+# Raised while reading a file that is not UTF-8 text or not CSV
+READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    # (line number, email, message) for every rejected row
+    errors: list = field(default_factory=list)
+    # Why reading stopped early, if the file turned out to be unreadable part way
+    file_error: str = None
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+    def add_error(self, line, email, message):
+        self.errors.append((line, email, message))
+
+
+def read_csv(file):
+    """Iterate the rows of an uploaded or opened binary CSV file as dicts."""
+    return csv.DictReader(codecs.iterdecode(file, 'utf-8-sig'))
+
+
+def read_error_message(error):
+    """A message for the uploader describing one of ``READ_ERRORS``."""
+    if isinstance(error, UnicodeDecodeError):
+        return "The file is not UTF-8 text. Save it as \"CSV UTF-8\" and try again."
+    return f"The file is not valid CSV: {error}"
+
+
+def clean_row(row):
+    """Validate one CSV row with the model field validators; return (values, errors)."""
+    values, errors = {}, []
+    for name in IMPORT_FIELDS:
+        raw = (row.get(name) or '').strip()
+        model_field = Attendee._meta.get_field(name)
+        if not raw:
+            if name == 'category':
+                values[name] = model_field.default
+                continue
+            if model_field.blank:
+                values[name] = ''
+                continue
+        try:
+            values[name] = model_field.clean(raw, None)
+        except ValidationError as e:
+            errors.extend(f"{name}: {message}" for message in e.messages)
+    return values, errors
+
+
+def _insert_batch(event, batch, report, batch_size=DEFAULT_BATCH_SIZE):
+    """Claim seats for and insert a batch of (line, values) pairs."""
+    emails = [normalize_email(values['email']) for _, values in batch]
+    existing = {
+        normalize_email(email)
+        for email in event.attendees.filter(In(Lower('email'), emails)).values_list('email', flat=True)
+    }
+    fresh = []
+    for line, values in batch:
+        if normalize_email(values['email']) in existing:
+            report.add_error(line, values['email'], "Already registered for this event.")
+        else:
+            fresh.append((line, values))
+    if not fresh:
+        return
+
+    try:
+        with transaction.atomic():
+            claimed = Event.reserve_available_seats(event.pk, len(fresh))
+            accepted = fresh[:claimed]
+            # bulk_create() skips Attendee.save(), so the seats claimed above are not claimed again
+            Attendee.objects.bulk_create(
+                [
+                    Attendee(event=event, confirmation_code=Attendee.generate_confirmation_code(), **values)
+                    for _, values in accepted
+                ],
+                batch_size=batch_size,
+            )
+            waitlist.withdraw(event.pk, [values['email'] for _, values in accepted])
+    except IntegrityError:
+        # A confirmation code collided or a concurrent registration took an email;
+        # fall back to row-by-row saves so only the offending rows are rejected.
+        _insert_rows(event, fresh, report)
+        return
+
+    report.created += len(accepted)
+    for line, values in fresh[claimed:]:
+        report.add_error(line, values['email'], "Event is full.")
+
+
+def _insert_rows(event, rows, report):
+    for line, values in rows:
+        try:
+            with transaction.atomic():
+                Attendee(event=event, **values).save()
+                waitlist.withdraw(event.pk, [values['email']])
+            report.created += 1
+        except EventFullError:
+            report.add_error(line, values['email'], "Event is full.")
+        except IntegrityError:
+            report.add_error(line, values['email'], "Already registered for this event.")
+
+
+def import_attendees(event, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import ``rows`` (an iterable of dicts keyed by Attendee field name) into ``event``
+    and return an ImportReport. Line numbers in the report count the CSV header as line 1.
+    """
+    report = ImportReport()
+    seen = set()
+    batch = []
+    line = 1
+    try:
+        for line, row in enumerate(rows, start=2):
+            values, errors = clean_row(row)
+            if errors:
+                report.add_error(line, row.get('email', ''), '; '.join(errors))
+                continue
+            email = normalize_email(values['email'])
+            if email in seen:
+                report.add_error(line, values['email'], "Duplicate email in this file.")
+                continue
+            seen.add(email)
+            batch.append((line, values))
+            if len(batch) >= batch_size:
+                _insert_batch(event, batch, report, batch_size)
+                batch = []
+    except READ_ERRORS as e:
+        # Keep the rows read so far; the report says where reading stopped
+        report.file_error = f"Line {line + 1}: {read_error_message(e)}"
+    if batch:
+        _insert_batch(event, batch, report, batch_size)
+    if report.created:
+        # bulk_create() sends no signals
+        caching.invalidate_event(event.pk)
+        live.publish_delta(event.pk, registered=report.created)
+    return report
+
+
+def missing_columns(fieldnames):
+    return sorted(REQUIRED_COLUMNS - set(fieldnames or []))
@@ -0,0 +1,171 @@
+"""
+Live capacity and check-in counts pushed to browsers as Server-Sent Events.
+
+Attendee changes publish small deltas (``{"registered": 1, "checked_in": 0}``) to an
+in-process broker once their transaction commits. Every open stream holds one
+bounded asyncio queue on the ASGI event loop; an idle stream is just a coroutine
+waiting on that queue, so a worker can hold thousands of them. A stream starts from
+a snapshot read from the database and applies deltas to it. It re-reads the snapshot
+if its queue overflowed or the event itself changed.
+
+The broker is per process: run the stream under ASGI, with a single worker process
+or with sticky routing per event, to see every change.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .models import Attendee, Event
+
+QUEUE_SIZE = 256
+RESYNC = {'resync': True}
+
+
+class Subscription:
+    def __init__(self, loop, maxsize=QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, message):
+        """Queue ``message`` from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's loop has closed; it is about to unsubscribe
+            pass
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drain(self):
+        """Return the messages already queued without waiting."""
+        messages = []
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, event_id):
+        """Subscribe the running event loop to ``event_id``'s updates."""
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, event_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(event_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[event_id]
+
+    def publish(self, event_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = Broker()
+
+
+@metrics.register
+def _collect_subscribers():
+    yield 'events_live_subscribers', 'gauge', 'Open live event streams in this process.', [({}, broker.subscriber_count())]
+
+
+def publish_delta(event_id, registered=0, checked_in=0):
+    """Publish a counter delta for ``event_id`` once the current transaction commits."""
+    if registered or checked_in:
+        message = {'registered': registered, 'checked_in': checked_in}
+        transaction.on_commit(lambda: broker.publish(event_id, message))
+
+
+def publish_resync(event_id):
+    transaction.on_commit(lambda: broker.publish(event_id, RESYNC))
+
+
+def attendee_delta(previous_status, current_status):
+    """(registered, checked_in) change between two statuses; None means no row."""
+    def counts(status):
+        if status is None:
+            return 0, 0
+        return int(status != 'cancelled'), int(status == 'checked_in')
+
+    (seat_before, in_before), (seat_after, in_after) = counts(previous_status), counts(current_status)
+    return seat_after - seat_before, in_after - in_before
+
+
+async def capacity_state(event_id):
+    event = await Event.objects.filter(pk=event_id).values('registered_count', 'max_attendees').aget()
+    checked_in = await Attendee.objects.filter(event_id=event_id, attendance_status='checked_in').acount()
+    return {
+        'total_registered': event['registered_count'],
+        'max_attendees': event['max_attendees'],
+        'spots_remaining': max(event['max_attendees'] - event['registered_count'], 0),
+        'checked_in': checked_in,
+    }
+
+
+def format_event(data, event='capacity'):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def capacity_stream(event_id, load_state=capacity_state, heartbeat=None):
+    """
+    Yield an SSE ``capacity`` message with the current counts, then one per batch of
+    changes, and a comment line every ``heartbeat`` seconds to keep proxies from
+    closing an idle connection.
+    """
+    if heartbeat is None:
+        heartbeat = getattr(settings, 'EVENTS_LIVE_HEARTBEAT', 15)
+    # Subscribe before the snapshot so no change can fall between the two; a change
+    # delivered while it was read may already be in it, so read it again instead
+    subscription = broker.subscribe(event_id)
+    try:
+        state = await load_state(event_id)
+        if subscription.drain():
+            state = await load_state(event_id)
+        yield format_event(state)
+        while True:
+            try:
+                first = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            # Fold a burst of changes into one message
+            messages = [first, *subscription.drain()]
+            if subscription.overflowed or RESYNC in messages:
+                subscription.overflowed = False
+                subscription.drain()
+                state = await load_state(event_id)
+            else:
+                registered = sum(message['registered'] for message in messages)
+                state['total_registered'] += registered
+                state['spots_remaining'] = max(state['max_attendees'] - state['total_registered'], 0)
+                state['checked_in'] += sum(message['checked_in'] for message in messages)
+            yield format_event(state)
+    finally:
+        broker.unsubscribe(event_id, subscription)
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from events.benchmarks import compare_sync_async, generate_synthetic_data
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent throughput of the sync (WSGI) and async (ASGI) read-only "
+        "public views in a throwaway test database and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help="Requests in flight: WSGI threads, or concurrent ASGI tasks.")
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--events', type=int, default=20)
+        parser.add_argument('--attendees', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            generate_synthetic_data(options['events'], options['attendees'], seed=1)
+            event = Event.objects.order_by('-registered_count', 'pk').first()
+            result = compare_sync_async(event, concurrency=options['concurrency'], total=options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from events.benchmarks import database_benchmark
+
+# SQLite as Django configures it out of the box
+STOCK_SQLITE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+@contextmanager
+def stock_sqlite():
+    options = connection.settings_dict['OPTIONS']
+    saved = dict(options)
+    options.pop('transaction_mode', None)
+    connections.close_all()
+    try:
+        with override_settings(EVENTS_SQLITE_PRAGMAS=STOCK_SQLITE_PRAGMAS):
+            yield
+    finally:
+        connections.close_all()
+        options.clear()
+        options.update(saved)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent registrations and door check-ins against a throwaway copy of the "
+        "configured database profile and print throughput and lock retries as JSON. "
+        "For SQLite the run is repeated with stock settings for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--registrations', type=int, default=1000)
+        parser.add_argument('--checkins', type=int, default=1000)
+        parser.add_argument('--skip-stock', action='store_true', help="Only run the configured profile.")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('workers', 'registrations', 'checkins')}
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # WAL and file locking only show up with a file database
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            setup_test_environment(debug=False)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                report = {'configured': database_benchmark(**params)}
+                if connection.vendor == 'sqlite' and not options['skip_stock']:
+                    with stock_sqlite():
+                        report['stock'] = database_benchmark(**params)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+        self.stdout.write(json.dumps(report, indent=2, default=str))
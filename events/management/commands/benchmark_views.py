@@ -0,0 +1,77 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from events.benchmarks import compare, run_benchmarks
+
+
+def parse_scales(value):
+    scales = []
+    for item in value.split(','):
+        try:
+            events, attendees = item.lower().split('x')
+            scales.append((int(events), int(attendees)))
+        except ValueError:
+            raise CommandError(f"Invalid scale {item!r}; expected EVENTSxATTENDEES, e.g. 10x10000.")
+    return scales
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main views through the test client at several data scales in a "
+        "throwaway test database and print p50/p99 latency, queries per request and throughput as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=parse_scales, default=parse_scales('5x500,20x10000'),
+                            help="Comma-separated EVENTSxATTENDEES pairs (default: 5x500,20x10000).")
+        parser.add_argument('--iterations', type=int, default=50, help="Requests per view and scale.")
+        parser.add_argument('--output', help="Also write the JSON report to this file.")
+        parser.add_argument('--compare', help="Earlier JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            runs = run_benchmarks(options['scales'], iterations=options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'revision': git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'runs': runs,
+        }
+        if baseline is not None:
+            report['comparison'] = compare(baseline, report)
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from events.benchmarks import generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = "Generate events and attendees with realistic status and category mixes for local load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10)
+        parser.add_argument('--attendees', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible data.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['events'] < 1:
+            raise CommandError("--events must be at least 1.")
+        if options['attendees'] < 0:
+            raise CommandError("--attendees cannot be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        with transaction.atomic():
+            events = generate_synthetic_data(
+                options['events'], options['attendees'],
+                seed=options['seed'], batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(events)} event(s) and {options['attendees']} attendee(s)."
+        ))
@@ -0,0 +1,48 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importing import (
+    DEFAULT_BATCH_SIZE, READ_ERRORS, import_attendees, missing_columns, read_csv, read_error_message,
+)
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Bulk-import attendees for an event from a CSV file with first_name, last_name and email columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('csv_path')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--errors', help="Write rejected rows (line, email, error) to this CSV file.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        with open(options['csv_path'], 'rb') as f:
+            rows = read_csv(f)
+            try:
+                missing = missing_columns(rows.fieldnames)
+            except READ_ERRORS as e:
+                raise CommandError(read_error_message(e))
+            if missing:
+                raise CommandError(f"Missing required column(s): {', '.join(missing)}")
+            report = import_attendees(event, rows, batch_size=options['batch_size'])
+
+        if options['errors'] and report.errors:
+            with open(options['errors'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['line', 'email', 'error'])
+                writer.writerows(report.errors)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created} attendee(s) into '{event.title}'; {report.rejected} row(s) rejected."
+        ))
+        for line, email, message in report.errors[:20]:
+            self.stdout.write(f"  line {line} ({email}): {message}")
+        if report.file_error:
+            raise CommandError(f"Stopped reading the file. {report.file_error}")
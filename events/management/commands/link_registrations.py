@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from events import accounts, caching
+
+
+class Command(BaseCommand):
+    help = "Link registrations made without an account to the account with the same (normalized) email."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=accounts.LINK_CHUNK,
+            help="Accounts matched per UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        linked = accounts.backfill(chunk_size=options['chunk_size'])
+        if linked:
+            # Cached registration status responses may predate the new links
+            caching.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} registration(s) to accounts."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from events import search
+
+
+class Command(BaseCommand):
+    help = "Create the attendee full-text index if it is missing and backfill it from the attendee table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        search.rebuild(connection)
+        if not search.is_available(connection):
+            self.stderr.write(self.style.WARNING(
+                f"No full-text index support on '{connection.vendor}'; searches will use icontains."
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS("Attendee search index rebuilt."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Recompute Event.registered_count from the attendee table for every event whose counter has drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report how many counters have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            drifted = Event.drifted_counters().count()
+            self.stdout.write(f"{drifted} event counter(s) out of sync.")
+            return
+
+        fixed = Event.reconcile_registered_counts()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} event counter(s)."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.exports import BADGE_CHUNK_SIZE, badge_workers, stream_badges
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a printable SVG badge for every registered attendee of an event into one zip "
+        "archive, in parallel across CPU cores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('--output', help="Archive path (default: badges-event-<id>.zip).")
+        parser.add_argument('--workers', type=int, help="Rendering processes (default: EVENTS_BADGE_WORKERS or one per CPU).")
+        parser.add_argument('--chunk-size', type=int, default=BADGE_CHUNK_SIZE, help="Badges per worker job.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        attendees = event.attendees.exclude(attendance_status='cancelled')
+        output = options['output'] or f"badges-event-{event.pk}.zip"
+        workers = options['workers'] or badge_workers()
+        started = time.perf_counter()
+        with open(output, 'wb') as archive:
+            for data in stream_badges(attendees, workers=workers, chunk_size=options['chunk_size']):
+                archive.write(data)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} for {attendees.count()} attendee(s) in {elapsed:.1f}s with {workers} worker(s)."
+        ))
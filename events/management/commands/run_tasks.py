@@ -0,0 +1,44 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from events import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks (confirmation emails and other registration side effects). "
+        "Several workers may run at once; each claims its own tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Threads running tasks.")
+        parser.add_argument('--batch', type=int, default=50, help="Tasks claimed at a time.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Run the ready tasks, then exit.")
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help="Delete tasks that finished successfully more than this many days ago.",
+        )
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        if not options['once']:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: stopping.set())
+
+        purged = tasks.purge_finished(options['keep_days'])
+        if purged:
+            self.stdout.write(f"Purged {purged} finished task(s).")
+
+        total = 0
+        while not stopping.is_set():
+            ran = tasks.run_pending(workers=options['workers'], limit=options['batch'])
+            total += ran
+            if ran:
+                continue
+            if options['once']:
+                break
+            stopping.wait(options['poll'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} task(s)."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.announcements import DEFAULT_BATCH_SIZE, AnnouncementClaimed, send_announcement
+from events.models import Announcement, Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Email an announcement to every registered attendee of an event, in batches over one mail "
+        "connection. An interrupted send can be resumed from its checkpoint with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', nargs='?', type=int)
+        parser.add_argument('--subject')
+        parser.add_argument('--message', help="Message text.")
+        parser.add_argument('--message-file', help="Read the message text from this file.")
+        parser.add_argument('--resume', type=int, metavar='ANNOUNCEMENT_ID', help="Continue an interrupted announcement.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                announcement = Announcement.objects.select_related('event').get(pk=options['resume'])
+            except Announcement.DoesNotExist:
+                raise CommandError(f"Announcement {options['resume']} does not exist.")
+        else:
+            announcement = self.create(options)
+
+        try:
+            sent = send_announcement(announcement, batch_size=options['batch_size'])
+        except AnnouncementClaimed as e:
+            raise CommandError(f"{e} Try again once it has finished or its lease has expired.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sent} message(s) for announcement {announcement.pk} ({announcement.sent_count} in total)."
+        ))
+
+    def create(self, options):
+        if options['event_id'] is None or not options['subject']:
+            raise CommandError("Give an event id and --subject, or --resume.")
+        if options['message_file']:
+            with open(options['message_file'], encoding='utf-8') as f:
+                message = f.read()
+        elif options['message']:
+            message = options['message']
+        else:
+            raise CommandError("Give the message with --message or --message-file.")
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+        return Announcement.objects.create(event=event, subject=options['subject'], message=message)
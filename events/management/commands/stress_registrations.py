@@ -0,0 +1,41 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.benchmarks import stress_registrations
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Hammer a throwaway event with concurrent registrations and report oversell and throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, default=100)
+        parser.add_argument('--attempts', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args, **options):
+        start = timezone.now() + timedelta(days=1)
+        event = Event.objects.create(
+            title='Stress test (temporary)',
+            description='Created by stress_registrations',
+            start_date=start,
+            end_date=start + timedelta(hours=1),
+            location='-',
+            max_attendees=options['capacity'],
+        )
+        try:
+            result = stress_registrations(event, attempts=options['attempts'], workers=options['workers'])
+        finally:
+            event.delete()
+
+        self.stdout.write(json.dumps(result, indent=2))
+        oversold = result['attendee_rows'] - result['max_attendees']
+        if oversold > 0:
+            self.stderr.write(self.style.ERROR(f"Oversold by {oversold} seat(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"No oversell; {result['registrations_per_second']} registrations/sec."
+            ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.checkin import warm_index
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload the confirmation codes of an event into the check-in index. Run it before doors "
+        "open when the 'checkin' cache is shared (Redis, Memcached); a local-memory cache is "
+        "warmed by each worker the first time its check-in station is opened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        for event_id in options['event_ids']:
+            if not Event.objects.filter(pk=event_id).exists():
+                raise CommandError(f"Event {event_id} does not exist.")
+            total = warm_index(event_id)
+            self.stdout.write(self.style.SUCCESS(f"Indexed {total} confirmation code(s) for event {event_id}."))
@@ -0,0 +1,100 @@
+"""
+In-process metrics, exposed in Prometheus text format at ``/metrics``.
+
+Per-view request statistics are recorded by ``RequestMetricsMiddleware``. Other
+subsystems add their own series by registering a collector: a callable returning
+``(name, type, help, samples)`` tuples, where ``samples`` is a list of
+``(labels_dict, value)`` pairs.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_collectors = []
+
+REQUEST_FIELDS = {
+    'requests': ('events_requests_total', 'counter', 'Requests served, per view.'),
+    'duration': ('events_request_duration_seconds_total', 'counter', 'Wall-clock time spent in views and middleware.'),
+    'queries': ('events_request_queries_total', 'counter', 'SQL queries executed.'),
+    'duplicate_queries': ('events_request_duplicate_queries_total', 'counter', 'Queries repeating the SQL of an earlier query of the same request, whatever their parameters.'),
+    'sql_seconds': ('events_request_sql_seconds_total', 'counter', 'Time spent executing SQL.'),
+    'template_seconds': ('events_request_template_seconds_total', 'counter', 'Time spent rendering templates.'),
+    'response_bytes': ('events_response_bytes_total', 'counter', 'Response body bytes (non-streaming responses).'),
+}
+_request_stats = defaultdict(lambda: dict.fromkeys(REQUEST_FIELDS, 0))
+_duplicate_fingerprints = defaultdict(dict)
+MAX_FINGERPRINTS_PER_VIEW = 20
+
+
+def record_request(view, **values):
+    with _lock:
+        stats = _request_stats[view]
+        stats['requests'] += 1
+        for field, value in values.items():
+            stats[field] += value
+
+
+def record_duplicates(view, fingerprints):
+    """Count repeated queries per view by SQL fingerprint (bounded to keep label cardinality low)."""
+    with _lock:
+        seen = _duplicate_fingerprints[view]
+        for sql, count in fingerprints.items():
+            if sql in seen or len(seen) < MAX_FINGERPRINTS_PER_VIEW:
+                seen[sql] = seen.get(sql, 0) + count
+
+
+def request_stats():
+    with _lock:
+        return {view: dict(stats) for view, stats in _request_stats.items()}
+
+
+def reset():
+    with _lock:
+        _request_stats.clear()
+        _duplicate_fingerprints.clear()
+
+
+def register(collector):
+    """Add a collector to /metrics; returns it so it can be used as a decorator."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+@register
+def _collect_requests():
+    stats = request_stats()
+    for field, (name, kind, help_text) in REQUEST_FIELDS.items():
+        yield name, kind, help_text, [({'view': view}, values[field]) for view, values in sorted(stats.items())]
+    with _lock:
+        duplicates = [
+            ({'view': view, 'fingerprint': sql[:200]}, count)
+            for view, fingerprints in sorted(_duplicate_fingerprints.items())
+            for sql, count in fingerprints.items()
+        ]
+    yield (
+        'events_duplicate_query_fingerprint_total', 'counter',
+        'Repeated queries per view, by normalised SQL.', duplicates,
+    )
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_prometheus():
+    lines = []
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if label_text else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
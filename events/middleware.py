@@ -0,0 +1,200 @@
+"""
+Per-request performance instrumentation, enabled with ``EVENTS_METRICS = True``.
+
+For every request it records the number of SQL queries, total SQL time, queries
+repeating the SQL of an earlier query (whatever the parameters, so an N+1 loop
+shows up), template render time and response size. The figures go out on the
+response as a ``Server-Timing`` header and are aggregated per view for the
+``/metrics`` endpoint.
+
+Template time is measured by wrapping the template backend's ``render`` while at
+least one instrumented request is in flight; it is put back once none are.
+
+``ASGIURLConfMiddleware`` serves requests that arrive through ASGI from
+``EVENTS_ASGI_URLCONF``, which routes the read-only public views to their async
+versions. Requests through WSGI keep ``ROOT_URLCONF``.
+"""
+import contextvars
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+_current = contextvars.ContextVar('events_request_metrics', default=None)
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    """Normalise SQL so that queries differing only in the length of IN lists compare equal."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = Counter()
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def duplicate_fingerprints(self):
+        return Counter({sql: count - 1 for sql, count in self.statements.items() if count > 1})
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.statements[fingerprint(sql)] += 1
+
+
+_original_render = django_backend.Template.render
+_patch_lock = threading.Lock()
+_active_requests = 0
+
+
+def _timed_render(self, context=None, request=None):
+    timings = _current.get()
+    if timings is None:
+        return _original_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        timings.template_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timing_templates():
+    """Time top-level template renders for as long as any instrumented request runs."""
+    global _active_requests
+    with _patch_lock:
+        if not _active_requests:
+            # {% include %} goes through the engine, not the backend, so only top-level renders are timed
+            django_backend.Template.render = _timed_render
+        _active_requests += 1
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            _active_requests -= 1
+            if not _active_requests:
+                django_backend.Template.render = _original_render
+
+
+def server_timing(timings, total_seconds):
+    return ', '.join([
+        f'db;dur={timings.sql_seconds * 1000:.2f};desc="{timings.queries} queries, {timings.duplicate_queries} duplicate"',
+        f'tpl;dur={timings.template_seconds * 1000:.2f};desc="templates"',
+        f'total;dur={total_seconds * 1000:.2f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EVENTS_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.instrument(stack, timings)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            # The ORM runs on the request's sync thread, which has its own connection
+            # objects, so the query wrappers are installed (and removed) there
+            stack = ExitStack()
+            await sync_to_async(self.instrument)(stack, timings)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - started)
+
+    def instrument(self, stack, timings):
+        stack.enter_context(timing_templates())
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+
+    def record(self, request, response, timings, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        response['Server-Timing'] = server_timing(timings, total)
+        metrics.record_request(
+            view,
+            duration=total,
+            queries=timings.queries,
+            duplicate_queries=timings.duplicate_queries,
+            sql_seconds=timings.sql_seconds,
+            template_seconds=timings.template_seconds,
+            response_bytes=size,
+        )
+        if timings.duplicate_queries:
+            metrics.record_duplicates(view, timings.duplicate_fingerprints())
+        return response
+
+
+class ASGIURLConfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.urlconf = getattr(settings, 'EVENTS_ASGI_URLCONF', None)
+        if not self.urlconf:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def route(self, request):
+        # Decided per request: a sync-only middleware further down makes Django run
+        # ASGI requests through the sync chain too
+        if isinstance(request, ASGIRequest):
+            request.urlconf = self.urlconf
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.route(request)
+        return await self.get_response(request)
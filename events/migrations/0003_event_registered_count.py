@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_registered_count(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Attendee = apps.get_model('events', 'Attendee')
+    live = Attendee.objects.filter(event=OuterRef('pk')).exclude(
+        attendance_status='cancelled'
+    ).order_by().values('event').annotate(total=Count('pk')).values('total')
+    Event.objects.update(registered_count=Coalesce(Subquery(live), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_customuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='registered_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_registered_count, migrations.RunPython.noop),
+    ]
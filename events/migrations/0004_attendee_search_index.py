@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from events import search
+
+    search.rebuild(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from events import search
+
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            for trigger in search.SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {search.FTS_TABLE}")
+        elif schema_editor.connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {search.PG_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_registered_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
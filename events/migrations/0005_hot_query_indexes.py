@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_attendee_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['email'], name='attendee_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['event', 'attendance_status', 'check_in_time'], name='attendee_event_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['event', '-registration_date', '-id'], name='attendee_event_regdate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True), ('registration_open', True)), fields=['start_date'], name='event_open_start_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:43
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_waitlist'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='attendee',
+            name='attendee_email_idx',
+        ),
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='attendee_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['user', '-registration_date', '-id'], name='attendee_user_regdate_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:29
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_leases(apps, schema_editor):
+    # Tasks running during the upgrade keep the lease they were claimed with
+    Task = apps.get_model('events', 'Task')
+    lease = timedelta(seconds=getattr(settings, 'EVENTS_TASK_LEASE', 300))
+    Task.objects.filter(status='running').update(lease_expires_at=F('started_at') + lease)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_announcements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_leases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# accounts.py matches accounts by Lower('email') on every logged-out registration and
+# every login. auth.User belongs to another app, so the index is created in SQL and
+# is not part of this app's model state.
+INDEX = 'events_user_email_lower_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_announcement_claim'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {INDEX} ON auth_user (LOWER(email))',
+            f'DROP INDEX IF EXISTS {INDEX}',
+        ),
+    ]
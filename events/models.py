@@ -1,9 +1,24 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, EmailValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import uuid
 
+from . import caching
+
+
+class EventFullError(ValidationError):
+    """Raised when a seat cannot be claimed because the event is at capacity."""
+
+    def __init__(self, message="Event is full. Cannot register more attendees."):
+        super().__init__(message)
+
+
 class Event(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -14,12 +29,94 @@ class Event(models.Model):
     is_active = models.BooleanField(default=True)
     registration_open = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized count of non-cancelled attendees, maintained by Attendee.save()/delete()
+    # and repaired by the reconcile_registration_counts management command.
+    registered_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            # The public catalog: open events by start date
+            models.Index(
+                fields=['start_date'],
+                condition=models.Q(is_active=True, registration_open=True),
+                name='event_open_start_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def reserve_seats(cls, event_id, count=1):
+        """
+        Claim ``count`` seats with one conditional UPDATE. The capacity check and the
+        increment happen in the same statement, so concurrent callers cannot oversell.
+        """
+        claimed = cls.objects.filter(
+            pk=event_id,
+            registered_count__lte=F('max_attendees') - count,
+        ).update(registered_count=F('registered_count') + count)
+        return claimed == 1
+    
+    @classmethod
+    def reserve_available_seats(cls, event_id, wanted):
+        """Claim up to ``wanted`` seats, as many as are left, and return how many were claimed."""
+        while wanted > 0:
+            if cls.reserve_seats(event_id, wanted):
+                return wanted
+            event = cls.objects.filter(pk=event_id).values('max_attendees', 'registered_count').first()
+            if event is None:
+                return 0
+            wanted = min(wanted, event['max_attendees'] - event['registered_count'])
+        return 0
+    
+    @classmethod
+    def adjust_registered_count(cls, event_id, delta):
+        """Apply a +/- delta to the stored counter with a single UPDATE (no read-modify-write)."""
+        events = cls.objects.filter(pk=event_id)
+        if delta < 0:
+            events = events.filter(registered_count__gte=-delta)
+        return events.update(registered_count=F('registered_count') + delta)
+    
+    @classmethod
+    def live_registered_count(cls):
+        """Correlated subquery counting the non-cancelled attendees of the outer event."""
+        live = Attendee.objects.filter(event=OuterRef('pk')).exclude(
+            attendance_status='cancelled'
+        ).order_by().values('event').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(live), 0)
+    
+    @classmethod
+    def drifted_counters(cls):
+        return cls.objects.exclude(registered_count=cls.live_registered_count())
+    
+    @classmethod
+    def reconcile_registered_counts(cls):
+        """Rewrite every drifted counter in one UPDATE and return how many were fixed."""
+        fixed = cls.drifted_counters().update(registered_count=cls.live_registered_count())
+        if fixed:
+            caching.invalidate_all()
+        return fixed
+    
     def registered_attendees_count(self):
-        return self.attendees.count()
+        return self.registered_count
+    
+    def attendance_summary(self, use_cache=True):
+        """
+        The attendee summary for this event. Dashboards poll it constantly on event day,
+        so it is cached for EVENTS_STATS_CACHE_TIMEOUT seconds (0 disables caching).
+        The key carries the event's cache version, so a change saved through an
+        Attendee shows at once; bulk scanner check-ins show within the timeout.
+        """
+        timeout = getattr(settings, 'EVENTS_STATS_CACHE_TIMEOUT', 5)
+        if not use_cache or not timeout:
+            return self.attendees.attendance_summary()
+        key = f'events:attendance-summary:{self.pk}:{caching.event_version(self.pk)}'
+        summary = cache.get(key)
+        if summary is None:
+            summary = self.attendees.attendance_summary()
+            cache.set(key, summary, timeout)
+        return summary
     
     def available_spots(self):
         return self.max_attendees - self.registered_attendees_count()
@@ -27,6 +124,23 @@ class Event(models.Model):
     def is_full(self):
         return self.registered_attendees_count() >= self.max_attendees
 
+class AttendeeQuerySet(models.QuerySet):
+    def attendance_summary(self):
+        """
+        Totals per attendance status and per category from a single GROUP BY query,
+        e.g. ``{'total': 12, 'checked_in': 4, ..., 'categories': {'vip': 2, ...}}``.
+        """
+        summary = {status: 0 for status, _ in self.model.ATTENDANCE_STATUS}
+        categories = {category: 0 for category, _ in self.model.EVENT_CATEGORIES}
+        rows = self.order_by().values('attendance_status', 'category').annotate(total=Count('pk'))
+        for row in rows:
+            summary[row['attendance_status']] = summary.get(row['attendance_status'], 0) + row['total']
+            categories[row['category']] = categories.get(row['category'], 0) + row['total']
+        summary['total'] = sum(categories.values())
+        summary['categories'] = categories
+        return summary
+
+
 class Attendee(models.Model):
     EVENT_CATEGORIES = [
         ('general', 'General Admission'),
@@ -71,9 +185,24 @@ class Attendee(models.Model):
     check_in_time = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     
+    objects = AttendeeQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['event', 'email']
         ordering = ['-registration_date']
+        indexes = [
+            # Linking registrations to accounts by normalized email (accounts.py)
+            models.Index(Lower('email'), name='attendee_email_lower_idx'),
+            # An account's registrations, newest first (my_registrations)
+            models.Index(fields=['user', '-registration_date', '-id'], name='attendee_user_regdate_idx'),
+            # Per-status counts and filters; the trailing check-in time also serves
+            # the newest-first recent check-ins list
+            models.Index(fields=['event', 'attendance_status', 'check_in_time'], name='attendee_event_status_idx'),
+            # Keyset pagination of an event's attendees (DEFAULT_ORDERING)
+            models.Index(fields=['event', '-registration_date', '-id'], name='attendee_event_regdate_idx'),
+            # Streaming an event's attendees in id order from a checkpoint (announcements)
+            models.Index(fields=['event', 'id'], name='attendee_event_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.event.title}"
@@ -82,15 +211,62 @@ class Attendee(models.Model):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
+    @staticmethod
+    def generate_confirmation_code():
+        return str(uuid.uuid4())[:8].upper()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the status as loaded so save() can tell whether a seat was freed or retaken
+        instance._loaded_status = instance.__dict__.get('attendance_status')
+        instance._loaded_event_id = instance.__dict__.get('event_id')
+        return instance
+    
+    @property
+    def holds_seat(self):
+        return self.attendance_status != 'cancelled'
+    
+    def _seat_delta(self, is_new, update_fields=None):
+        loaded_status = getattr(self, '_loaded_status', None)
+        if is_new:
+            return 1 if self.holds_seat else 0
+        if loaded_status is None:
+            return 0
+        if update_fields is not None and 'attendance_status' not in update_fields:
+            return 0
+        was_holding = loaded_status != 'cancelled'
+        return int(self.holds_seat) - int(was_holding)
+    
+    def _apply_seat_delta(self, delta):
+        if not delta:
+            return
+        if delta > 0:
+            if not Event.reserve_seats(self.event_id, delta):
+                raise EventFullError()
+        else:
+            Event.adjust_registered_count(self.event_id, delta)
+        if Attendee.event.is_cached(self):
+            self.event.registered_count = max(self.event.registered_count + delta, 0)
+    
     def save(self, *args, **kwargs):
-        # Check capacity before saving (database-level protection)
-        if not self.pk:  # Only for new registrations, not updates
-            if self.event.is_full():
-                raise ValidationError("Event is full. Cannot register more attendees.")
-        
+        is_new = self._state.adding
         if not self.confirmation_code:
-            self.confirmation_code = str(uuid.uuid4())[:8].upper()
-        super().save(*args, **kwargs)
+            self.confirmation_code = self.generate_confirmation_code()
+        
+        # A registration belongs to one event: its seat, confirmation code, check-in index
+        # and waitlist entry would all have to move with it. Cancel and register instead.
+        loaded_event_id = getattr(self, '_loaded_event_id', None)
+        if not is_new and loaded_event_id is not None and self.event_id != loaded_event_id:
+            raise ValidationError("A registration cannot be moved to another event.")
+        
+        # Claiming the seat is the capacity check: it runs first so the event row is
+        # locked before the attendee row is written, and both commit or roll back together.
+        with transaction.atomic():
+            self._apply_seat_delta(self._seat_delta(is_new, kwargs.get('update_fields')))
+            super().save(*args, **kwargs)
+        self._loaded_status = self.attendance_status
+        self._loaded_event_id = self.event_id
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
@@ -143,4 +319,124 @@ class CustomUser(AbstractUser):
     objects = CustomUserManager()
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+class WaitlistEntry(models.Model):
+    """
+    A place in an event's waitlist. Entries queue in id order, so joining is a plain
+    insert and the head of an event's queue is one seek on ``waitlist_queue_idx``.
+    """
+    WAITING = 'waiting'
+    PROMOTED = 'promoted'
+    WITHDRAWN = 'withdrawn'
+    STATUS = [
+        (WAITING, 'Waiting'),
+        (PROMOTED, 'Promoted'),
+        (WITHDRAWN, 'Withdrawn'),
+    ]
+    
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField()
+    category = models.CharField(max_length=20, choices=Attendee.EVENT_CATEGORIES, default='general')
+    status = models.CharField(max_length=20, choices=STATUS, default=WAITING)
+    joined_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    attendee = models.OneToOneField(
+        Attendee, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry',
+    )
+    
+    class Meta:
+        unique_together = ['event', 'email']
+        ordering = ['id']
+        verbose_name_plural = 'waitlist entries'
+        indexes = [
+            models.Index(fields=['event', 'status', 'id'], name='waitlist_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.full_name} - {self.event.title} ({self.status})"
+    
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+    
+    def position(self):
+        """1-based place in the queue while waiting, else None."""
+        if self.status != self.WAITING:
+            return None
+        return WaitlistEntry.objects.filter(event_id=self.event_id, status=self.WAITING, id__lte=self.id).count()
+
+
+class Task(models.Model):
+    """A unit of background work, run by the ``run_tasks`` worker (see tasks.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    # Enqueueing twice with the same key creates one task
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # While running: when the worker's claim lapses unless renewed (tasks.renew_lease)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            # Workers claim the oldest ready tasks; queue depth counts by status
+            models.Index(fields=['status', 'run_after', 'id'], name='task_ready_idx'),
+            # Latency metrics over recently finished tasks, and purging old ones
+            models.Index(fields=['finished_at'], name='task_finished_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class Announcement(models.Model):
+    """An email to every registered attendee of an event, sent by announcements.py."""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    STATUS = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+    ]
+    
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='announcements')
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS, default=PENDING)
+    sent_count = models.PositiveIntegerField(default=0)
+    # Checkpoint: recipients are sent to in attendee id order, up to and including this id
+    last_attendee_id = models.PositiveBigIntegerField(default=0)
+    # The sender currently holding the send, and when its claim lapses unless renewed
+    claimed_by = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.subject} - {self.event.title}"
@@ -0,0 +1,220 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by the ordering values of the last row shown instead of an
+OFFSET, so fetching any page costs one indexed range scan and rows inserted while a
+client is paging never shift the pages that follow. That only holds for orderings
+over values that do not change, such as ``('-registration_date', '-id')``; a cursor
+over a computed score (a search rank, say) can skip or repeat rows.
+
+``EstimatedCountPaginator`` is for the admin, which pages by number: it saves the
+full-table COUNT on unfiltered lists of large tables.
+"""
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ('-registration_date', '-id')
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    page_size: int
+    next_cursor: str = None
+    previous_cursor: str = None
+    ordering: tuple = field(default=DEFAULT_ORDERING)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_json_default, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """
+    Return the ordering values in ``cursor`` converted to the types of ``fields``, or
+    None if it is malformed. ``fields`` has one model field per ordering column, or
+    None for a column that is not a model field.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    converted = []
+    for field_, value in zip(fields, values):
+        if value is None or isinstance(value, (list, dict)):
+            return None
+        if field_ is not None:
+            try:
+                value = field_.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                return None
+        converted.append(value)
+    return converted
+
+
+def _ordering_fields(model, ordering):
+    fields = []
+    for name in ordering:
+        try:
+            fields.append(model._meta.get_field(name.lstrip('-')))
+        except FieldDoesNotExist:
+            fields.append(None)
+    return fields
+
+
+def _seek(ordering, values, forward):
+    # Lexicographic "comes after" over the ordering columns:
+    # (a > x) OR (a = x AND b > y) OR ...
+    condition = Q()
+    for depth, (name, value) in enumerate(zip(ordering, values)):
+        descending = name.startswith('-')
+        column = name.lstrip('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        clause = Q(**{f'{column}__{lookup}': value})
+        for prev_name, prev_value in zip(ordering[:depth], values[:depth]):
+            clause &= Q(**{prev_name.lstrip('-'): prev_value})
+        condition |= clause
+    return condition
+
+
+def _reverse(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+def _cursor_for(obj, ordering):
+    return encode_cursor([getattr(obj, name.lstrip('-')) for name in ordering])
+
+
+def get_page_size(request):
+    default = getattr(settings, 'EVENTS_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'EVENTS_MAX_PAGE_SIZE', 200)
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def paginate_keyset(queryset, ordering=DEFAULT_ORDERING, after=None, before=None, page_size=50):
+    """
+    Return the ``page_size`` rows of ``queryset`` that follow the ``after`` cursor (or
+    precede the ``before`` cursor) in ``ordering``. The last ordering column must be
+    unique so every row has a distinct position.
+    """
+    ordering = tuple(ordering)
+    fields = _ordering_fields(queryset.model, ordering)
+    after_values = decode_cursor(after, fields)
+    before_values = decode_cursor(before, fields)
+
+    if before_values is not None:
+        rows = list(
+            queryset.filter(_seek(ordering, before_values, forward=False))
+            .order_by(*_reverse(ordering))[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after_values is not None:
+            queryset = queryset.filter(_seek(ordering, after_values, forward=True))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after_values is not None
+
+    return KeysetPage(
+        object_list=rows,
+        page_size=page_size,
+        next_cursor=_cursor_for(rows[-1], ordering) if rows and has_next else None,
+        previous_cursor=_cursor_for(rows[0], ordering) if rows and has_previous else None,
+        ordering=ordering,
+    )
+
+
+def paginate_request(request, queryset, ordering=DEFAULT_ORDERING):
+    """Paginate ``queryset`` using the ``after``/``before``/``page_size`` query parameters."""
+    return paginate_keyset(
+        queryset,
+        ordering=ordering,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=get_page_size(request),
+    )
+
+
+def estimated_row_count(model, using='default'):
+    """The row count the database statistics hold for ``model``'s table, or None if there are none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has run; each row starts with the table size
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for a table that has never been analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts unfiltered querysets from the table statistics once they estimate at least
+    ``EVENTS_ESTIMATED_COUNT_THRESHOLD`` rows. Filtered querysets and smaller tables
+    are counted exactly. The estimate is only as fresh as the last ANALYZE, so the
+    last page number may be slightly off.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.has_filters():
+            threshold = getattr(settings, 'EVENTS_ESTIMATED_COUNT_THRESHOLD', 100000)
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,136 @@
+"""
+Read-replica routing.
+
+``ReplicaReadMiddleware`` lets GET requests to the views in ``EVENTS_REPLICA_VIEWS``
+read from one of the ``EVENTS_READ_REPLICAS`` databases; every other query, and
+every write, goes to ``default``. A request that writes sets a short-lived cookie
+that pins the client to the primary, so the next pages it loads (such as a new
+registrant's confirmation) never read from a replica that has not caught up yet.
+
+Anything cached or tagged under a version stamp from caching.py is read from the
+primary (``read_from_primary``): a write moves the stamp as soon as it commits, and
+rows read from a lagging replica would otherwise be stored under the new stamp and
+served until the next write.
+"""
+import contextvars
+import random
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'events_primary'
+
+# The capacity and status APIs are not listed: everything they read is tagged with
+# an event version, so it comes from the primary anyway
+DEFAULT_REPLICA_VIEWS = (
+    'events:event_list',
+    'events:event_detail',
+    'events:attendance_report',
+)
+
+
+@dataclass
+class RoutingState:
+    pinned: bool = False
+    use_replica: bool = False
+    wrote: bool = False
+
+
+_state = contextvars.ContextVar('events_db_routing', default=None)
+
+
+def read_replicas():
+    return list(getattr(settings, 'EVENTS_READ_REPLICAS', []))
+
+
+def replica_views():
+    return getattr(settings, 'EVENTS_REPLICA_VIEWS', DEFAULT_REPLICA_VIEWS)
+
+
+def read_from_primary():
+    """Send the rest of the current request's reads to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.use_replica = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = read_replicas()
+        if state is not None and state.use_replica and replicas:
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *read_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema from the primary
+        if db in read_replicas():
+            return False
+        return None
+
+
+class ReplicaReadMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not read_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=request.COOKIES.get(PIN_COOKIE) == '1')
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so ORM calls in threads share this state
+        state = RoutingState(pinned=request.COOKIES.get(PIN_COOKIE) == '1')
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'EVENTS_REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if (
+            state is not None
+            and not state.pinned
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in replica_views()
+        ):
+            state.use_replica = True
@@ -0,0 +1,132 @@
+"""
+Full-text search over attendees.
+
+On SQLite an external-content FTS5 table mirrors the searchable columns of
+``events_attendee`` and is kept in sync by triggers. On PostgreSQL a GIN index over
+a ``to_tsvector`` expression plays the same role and is maintained by the database
+itself. Any other backend falls back to the old ``icontains`` scan.
+"""
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Attendee
+
+SEARCH_FIELDS = ['first_name', 'last_name', 'email', 'company', 'confirmation_code']
+MAX_TERMS = 8
+
+ATTENDEE_TABLE = Attendee._meta.db_table
+FTS_TABLE = f'{ATTENDEE_TABLE}_fts'
+PG_INDEX = f'{ATTENDEE_TABLE}_search_words_idx'
+# Earlier index over the unsplit columns, where an email was a single token
+PG_OLD_INDEX = f'{ATTENDEE_TABLE}_search_idx'
+# Split on non-word characters first, like search_terms() and the FTS5 tokenizer
+PG_VECTOR = r"to_tsvector('simple', regexp_replace({}, '\W+', ' ', 'g'))".format(
+    " || ' ' || ".join(f"coalesce({ATTENDEE_TABLE}.{field}, '')" for field in SEARCH_FIELDS)
+)
+
+_columns = ', '.join(SEARCH_FIELDS)
+_new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+_old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+SQLITE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_columns}, content='{ATTENDEE_TABLE}', content_rowid='id', prefix='2 3 4')"
+)
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {ATTENDEE_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END"
+    ),
+    f'{FTS_TABLE}_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {ATTENDEE_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); END"
+    ),
+    f'{FTS_TABLE}_au': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON {ATTENDEE_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values}); END"
+    ),
+}
+
+# Aliases whose backend could not create the index (e.g. SQLite built without FTS5)
+_unavailable = set()
+
+
+def install(connection):
+    """
+    Create the search index and its triggers if they are missing. Returns True when
+    anything had to be (re)created, in which case the index should be rebuilt.
+    Safe to call repeatedly; it runs after every migrate because SQLite table
+    rebuilds drop the triggers along with the old table.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name IN (%s)" % ', '.join(['%s'] * 4),
+                [FTS_TABLE, *SQLITE_TRIGGERS],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing == {FTS_TABLE, *SQLITE_TRIGGERS}:
+                return False
+            try:
+                cursor.execute(SQLITE_TABLE_SQL)
+            except OperationalError:
+                _unavailable.add(connection.alias)
+                return False
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+            return True
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [PG_INDEX])
+            if cursor.fetchone():
+                return False
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {ATTENDEE_TABLE} USING gin ({PG_VECTOR})")
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_OLD_INDEX}")
+            return True
+    return False
+
+
+def rebuild(connection):
+    """Backfill the index from the attendee table."""
+    install(connection)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite' and connection.alias not in _unavailable:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f"REINDEX INDEX {PG_INDEX}")
+
+
+def is_available(connection):
+    return connection.vendor in ('sqlite', 'postgresql') and connection.alias not in _unavailable
+
+
+def search_terms(text):
+    """Split free text into lowercase word tokens, the same way the index tokenizes columns."""
+    return [term for term in re.split(r'\W+', (text or '').lower()) if term][:MAX_TERMS]
+
+
+def search_attendees(queryset, text):
+    """
+    Narrow ``queryset`` to attendees matching every word of ``text`` as a prefix. The
+    queryset keeps its own ordering, so results can be keyset-paginated like the
+    unfiltered list; a relevance order would change as attendees are added.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite' and is_available(connection):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(where=[f"{PG_VECTOR} @@ to_tsquery('simple', %s)"], params=[tsquery])
+
+    for term in terms:
+        queryset = queryset.filter(Q(*[Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS], _connector=Q.OR))
+    return queryset
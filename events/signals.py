@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import accounts, caching, checkin, live, search, waitlist
+from .models import Event, Attendee
+
+
+@receiver(post_delete, sender=Attendee)
+def release_seat_on_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the event itself cascades here; its counter is going away with it
+    if isinstance(origin, Event) or getattr(origin, 'model', None) is Event:
+        return
+    if getattr(instance, '_loaded_status', instance.attendance_status) != 'cancelled':
+        instance._apply_seat_delta(-1)
+        waitlist.promote_next(instance.event_id)
+
+
+@receiver(post_save, sender=Attendee)
+def promote_waitlist_on_cancel(sender, instance, created, update_fields=None, **kwargs):
+    # Runs inside Attendee.save()'s transaction, so however the seat was freed (staff
+    # view, admin, shell) it goes to the head of the waitlist before anyone else
+    if instance._seat_delta(created, update_fields) < 0:
+        instance.promoted = waitlist.promote_next(instance.event_id)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_pages(sender, instance, **kwargs):
+    caching.invalidate_event(instance.pk)
+
+
+@receiver(post_save, sender=Attendee)
+@receiver(post_delete, sender=Attendee)
+def invalidate_attendee_event_pages(sender, instance, **kwargs):
+    # Registrations and cancellations move the spots-left badges
+    caching.invalidate_event(instance.event_id)
+
+
+@receiver(post_save, sender=Attendee)
+def publish_attendee_change(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'attendance_status' not in update_fields:
+        return
+    if created:
+        previous = None
+    elif getattr(instance, '_loaded_status', None) is None:
+        # Saved without being loaded first; the stream has to re-read the counts
+        live.publish_resync(instance.event_id)
+        return
+    else:
+        previous = instance._loaded_status
+    live.publish_delta(instance.event_id, *live.attendee_delta(previous, instance.attendance_status))
+
+
+@receiver(post_delete, sender=Attendee)
+def publish_attendee_removal(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Event) or getattr(origin, 'model', None) is Event:
+        return
+    previous = getattr(instance, '_loaded_status', None) or instance.attendance_status
+    live.publish_delta(instance.event_id, *live.attendee_delta(previous, None))
+
+
+@receiver(post_save, sender=Event)
+def publish_event_change(sender, instance, created, **kwargs):
+    if not created:
+        live.publish_resync(instance.pk)
+
+
+@receiver(post_save, sender=Attendee)
+def index_confirmation_code(sender, instance, **kwargs):
+    transaction.on_commit(lambda: checkin.index_attendee(instance))
+
+
+@receiver(post_delete, sender=Attendee)
+def unindex_confirmation_code(sender, instance, **kwargs):
+    transaction.on_commit(lambda: checkin.unindex_attendee(instance))
+
+
+@receiver(post_delete, sender=Event)
+def drop_checkin_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: checkin.invalidate_index(instance.pk))
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    if sender.name != 'events':
+        return
+    connection = connections[using]
+    # A SQLite table rebuild during a later migration drops the FTS triggers
+    if search.install(connection):
+        search.rebuild(connection)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'EVENTS_SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_save, sender=User)
+def link_registrations_on_signup(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        accounts.link_registrations(instance)
+
+
+@receiver(user_logged_in)
+def link_registrations_on_login(sender, request, user, **kwargs):
+    # Picks up registrations made while logged out since the last login
+    if isinstance(user, User):
+        accounts.link_registrations(user)
@@ -0,0 +1,315 @@
+"""
+A small task queue for work that should not hold up a request: confirmation emails
+and other side effects of a registration.
+
+``enqueue()`` adds a task once the current transaction commits. A rolled-back
+registration therefore never sends anything, and a worker never looks for rows
+that are not visible yet. Where tasks go depends on ``EVENTS_TASK_BACKEND``:
+
+* ``'database'`` (the default) stores a ``Task`` row. The ``run_tasks`` command
+  claims ready rows and runs them on a thread pool. A failing task is retried with
+  exponential backoff until ``max_attempts``, then left as ``failed``. A task whose
+  worker died is reclaimed once its lease (``EVENTS_TASK_LEASE``) runs out, or
+  failed if that was its last attempt. A task that can run longer than the lease
+  calls ``renew_lease()`` as it makes progress; otherwise it would be reclaimed and
+  run a second time alongside the first.
+* ``'local'`` runs tasks on a thread pool in the current process. Nothing is
+  stored, so work still queued is lost if the process exits. It is meant for
+  development.
+
+Tasks run at least once. An idempotency key stops the same work being queued
+twice, and each task checks current state before acting, so a cancelled
+registration gets no confirmation. A worker that dies after sending an email but
+before recording the outcome leaves the task to be retried, so an email can
+occasionally arrive twice.
+
+Queue depth and latency are computed from the task table, so ``/metrics`` reports
+them from any process, including one that runs no worker.
+"""
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Avg, Count, F, Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import metrics
+from .models import Attendee, Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_local_pool = None
+_local_lock = threading.Lock()
+# The task being executed by this thread, for renew_lease()
+_current = threading.local()
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a task. It receives the task payload as keyword arguments."""
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+def backend():
+    return getattr(settings, 'EVENTS_TASK_BACKEND', 'database')
+
+
+def enqueue(func, key=None, delay=0, **payload):
+    """
+    Queue ``func(**payload)`` to run after the current transaction commits, or at
+    once outside a transaction. Only one task is ever created for a given ``key``.
+    """
+    # robust: a failure to queue is logged rather than breaking the callbacks after it
+    transaction.on_commit(partial(_submit, func.task_name, payload, key, delay), robust=True)
+
+
+def _submit(name, payload, key, delay):
+    if backend() == 'local':
+        _local_executor().submit(_run_local, name, payload)
+        return
+    fields = {
+        'name': name,
+        'payload': payload,
+        'max_attempts': _registry[name].max_attempts,
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        Task.objects.create(**fields)
+        return
+    try:
+        with transaction.atomic():
+            Task.objects.get_or_create(idempotency_key=key, defaults=fields)
+    except IntegrityError:
+        # Created concurrently under the same key
+        pass
+
+
+def _local_executor():
+    global _local_pool
+    with _local_lock:
+        if _local_pool is None:
+            _local_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EVENTS_TASK_LOCAL_WORKERS', 2),
+                thread_name_prefix='events-task',
+            )
+        return _local_pool
+
+
+def _run_local(name, payload):
+    func = _registry[name]
+    try:
+        for attempt in range(1, func.max_attempts + 1):
+            try:
+                func(**payload)
+                return
+            except Exception:
+                if attempt == func.max_attempts:
+                    logger.exception("Task %s failed after %d attempts", name, attempt)
+                    return
+                time.sleep(retry_delay(attempt))
+    finally:
+        close_old_connections()
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt: the base delay, doubling per attempt, at most an hour."""
+    base = getattr(settings, 'EVENTS_TASK_RETRY_DELAY', 5)
+    return min(base * 2 ** (attempts - 1), 3600)
+
+
+def lease_duration():
+    return timedelta(seconds=getattr(settings, 'EVENTS_TASK_LEASE', 300))
+
+
+def claim(limit):
+    """Mark up to ``limit`` ready tasks as running and return them, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Tasks whose worker died mid-run are queued again once their lease has expired.
+        # One that was on its last attempt is failed instead, so a task that kills its
+        # worker cannot loop forever.
+        expired = Task.objects.filter(status=Task.RUNNING, lease_expires_at__lt=now)
+        lost = expired.filter(attempts__gte=F('max_attempts')).update(
+            status=Task.FAILED, finished_at=now,
+            last_error="The worker running the last attempt was lost before the task finished.",
+        )
+        if lost:
+            logger.error("Failed %d task(s) whose worker was lost on their last attempt", lost)
+        expired.update(status=Task.QUEUED)
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.RUNNING, started_at=now, lease_expires_at=now + lease_duration(),
+            attempts=F('attempts') + 1,
+        )
+    return list(Task.objects.filter(pk__in=ids).order_by('run_after', 'id'))
+
+
+def _owned(task):
+    # Once reclaimed, the row has moved on to another attempt (or failed) and this run
+    # must not touch it
+    return Task.objects.filter(pk=task.pk, status=Task.RUNNING, attempts=task.attempts)
+
+
+def _renew(task):
+    return _owned(task).update(lease_expires_at=timezone.now() + lease_duration()) == 1
+
+
+def renew_lease():
+    """
+    Extend the lease of the task running in this thread by ``EVENTS_TASK_LEASE``.
+    Returns False if the task has been reclaimed meanwhile, in which case the caller
+    should stop. Outside a database task (e.g. the local backend) it does nothing.
+    """
+    task = getattr(_current, 'task', None)
+    return task is None or _renew(task)
+
+
+def execute(task):
+    """
+    Run one claimed task and record the outcome on its row; returns the new status,
+    or None if the task was reclaimed before it finished.
+    """
+    # Tasks claimed in a batch may have waited for a thread; restart the lease clock
+    if not _renew(task):
+        return None
+    func = _registry.get(task.name)
+    _current.task = task
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {task.name!r}")
+        func(**task.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts < task.max_attempts and func is not None:
+            status = Task.QUEUED
+            recorded = _owned(task).update(
+                status=status, last_error=error,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(task.attempts)),
+            )
+        else:
+            status = Task.FAILED
+            recorded = _owned(task).update(status=status, last_error=error, finished_at=timezone.now())
+            logger.error("Task %s #%s failed after %d attempts", task.name, task.pk, task.attempts)
+    else:
+        status = Task.DONE
+        recorded = _owned(task).update(status=status, finished_at=timezone.now())
+    finally:
+        _current.task = None
+    if not recorded:
+        logger.warning("Task %s #%s was reclaimed before it finished; outcome not recorded", task.name, task.pk)
+        return None
+    return status
+
+
+def _execute_in_thread(task):
+    try:
+        return execute(task)
+    finally:
+        close_old_connections()
+
+
+def run_pending(workers=1, limit=100):
+    """Claim up to ``limit`` ready tasks and run them on ``workers`` threads; returns how many ran."""
+    tasks = claim(limit)
+    if workers <= 1:
+        for claimed in tasks:
+            execute(claimed)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='events-task') as pool:
+            wait([pool.submit(_execute_in_thread, claimed) for claimed in tasks])
+    return len(tasks)
+
+
+def purge_finished(days):
+    """Delete tasks that finished successfully more than ``days`` days ago."""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(finished_at__lt=cutoff, status=Task.DONE).delete()
+    return deleted
+
+
+@metrics.register
+def _collect_tasks():
+    now = timezone.now()
+    depth = dict.fromkeys((Task.QUEUED, Task.RUNNING, Task.FAILED), 0)
+    depth.update(
+        Task.objects.filter(status__in=list(depth)).order_by().values_list('status').annotate(total=Count('pk'))
+    )
+    yield 'events_task_queue_depth', 'gauge', 'Background tasks by status.', [
+        ({'status': status}, total) for status, total in depth.items()
+    ]
+
+    oldest = Task.objects.filter(status=Task.QUEUED, run_after__lte=now).aggregate(oldest=Min('run_after'))['oldest']
+    yield 'events_task_oldest_ready_seconds', 'gauge', 'How long the oldest ready task has been waiting.', [
+        ({}, (now - oldest).total_seconds() if oldest else 0.0),
+    ]
+
+    window = getattr(settings, 'EVENTS_TASK_METRICS_WINDOW', 300)
+    finished = (
+        Task.objects.filter(finished_at__gte=now - timedelta(seconds=window))
+        .order_by().values('name', 'status')
+        .annotate(total=Count('pk'), latency=Avg(F('finished_at') - F('created_at')), run=Avg(F('finished_at') - F('started_at')))
+    )
+    totals = {}
+    for row in finished:
+        entry = totals.setdefault(row['name'], {Task.DONE: 0, Task.FAILED: 0, 'latency': 0.0, 'run': 0.0})
+        entry[row['status']] += row['total']
+        # Sums of the per-status means, weighted back into one mean per task below
+        entry['latency'] += row['latency'].total_seconds() * row['total']
+        entry['run'] += row['run'].total_seconds() * row['total']
+    yield 'events_tasks_finished', 'gauge', f'Tasks finished in the last {window} seconds, by task and status.', [
+        ({'task': name, 'status': status}, entry[status])
+        for name, entry in sorted(totals.items()) for status in (Task.DONE, Task.FAILED)
+    ]
+    yield 'events_task_latency_seconds_avg', 'gauge', f'Mean time from enqueue to finish over the last {window} seconds.', [
+        ({'task': name}, entry['latency'] / (entry[Task.DONE] + entry[Task.FAILED])) for name, entry in sorted(totals.items())
+    ]
+    yield 'events_task_run_seconds_avg', 'gauge', f'Mean duration of the final attempt over the last {window} seconds.', [
+        ({'task': name}, entry['run'] / (entry[Task.DONE] + entry[Task.FAILED])) for name, entry in sorted(totals.items())
+    ]
+
+
+# Registration side effects
+
+@task()
+def send_registration_confirmation(attendee_id):
+    attendee = Attendee.objects.select_related('event').filter(pk=attendee_id).first()
+    # Cancelled or deleted before the task ran: nothing to confirm
+    if attendee is None or not attendee.holds_seat:
+        return
+    send_mail(
+        f"Registration confirmed: {attendee.event.title}",
+        render_to_string('events/email/registration_confirmation.txt', {'attendee': attendee}),
+        settings.DEFAULT_FROM_EMAIL,
+        [attendee.email],
+    )
+
+
+@task()
+def send_waitlist_promotion(attendee_id):
+    attendee = Attendee.objects.select_related('event').filter(pk=attendee_id).first()
+    if attendee is None or not attendee.holds_seat:
+        return
+    send_mail(
+        f"A spot opened up: {attendee.event.title}",
+        render_to_string('events/email/waitlist_promotion.txt', {'attendee': attendee}),
+        settings.DEFAULT_FROM_EMAIL,
+        [attendee.email],
+    )
@@ -0,0 +1,97 @@
+"""
+Test helpers for keeping the views within their query budgets and on their indexes.
+"""
+import re
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .middleware import fingerprint
+
+
+class QueryBudgetMixin:
+    """
+    Mix into a TestCase to assert how many queries a URL from ``events/urls.py`` may run::
+
+        self.assertQueryBudget('event_list', 1)
+        self.assertQueryBudget('register_attendee', 6, args=[event.pk], method='post', data={...})
+    """
+
+    def assertQueryBudget(self, url_name, budget, args=None, kwargs=None, method='get', data=None, using=DEFAULT_DB_ALIAS, **extra):
+        url = reverse(f'events:{url_name}', args=args, kwargs=kwargs)
+        with CaptureQueriesContext(connections[using]) as captured:
+            response = getattr(self.client, method)(url, data, **extra)
+        executed = len(captured)
+        if executed > budget:
+            repeated = Counter(fingerprint(query['sql']) for query in captured.captured_queries)
+            details = '\n'.join(
+                f'  {i}. {query["sql"]}' for i, query in enumerate(captured.captured_queries, start=1)
+            )
+            hot = '\n'.join(f'  x{count} {sql}' for sql, count in repeated.most_common() if count > 1)
+            self.fail(
+                f"{url_name} ran {executed} queries, over its budget of {budget}:\n{details}"
+                + (f"\nRepeated query shapes:\n{hot}" if hot else '')
+            )
+        return response
+
+
+# "SCAN events_attendee" is a full table scan; "SCAN ... USING INDEX" walks an index
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def full_scans(connection, sql, params):
+    """Tables that ``sql`` reads with a full scan, according to the database's planner."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            pattern = SQLITE_FULL_SCAN
+        elif connection.vendor == 'postgresql':
+            # Tiny test tables make a sequential scan the cheapest plan; ask for the
+            # plan the query would get once the table is large
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                details = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+            pattern = POSTGRES_FULL_SCAN
+        else:
+            return []
+    return [match.group(1) for detail in details if (match := pattern.search(detail))]
+
+
+class QueryPlanMixin:
+    """
+    Mix into a TestCase to fail when a view reads a table with a full scan::
+
+        self.assertNoFullScans('manage_attendees', args=[event.pk])
+
+    Every SELECT the view runs is explained; tables in ``allow`` may be scanned.
+    """
+
+    def assertNoFullScans(self, url_name, args=None, kwargs=None, method='get', data=None, allow=(), using=DEFAULT_DB_ALIAS, **extra):
+        connection = connections[using]
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        url = reverse(f'events:{url_name}', args=args, kwargs=kwargs)
+        with connection.execute_wrapper(capture):
+            response = getattr(self.client, method)(url, data, **extra)
+
+        problems = [
+            f'  {table}: {sql}'
+            for sql, params in statements
+            for table in full_scans(connection, sql, params)
+            if table not in allow
+        ]
+        if problems:
+            self.fail(f"{url_name} ran full table scans:\n" + '\n'.join(problems))
+        return response
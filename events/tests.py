@@ -1,3 +1,1787 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from django.db.utils import ConnectionHandler, load_backend
+from django.template.backends import django as django_backend
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    admission, announcements, async_views, badges, caching, checkin, exports, live, metrics, routing,
+    search, tasks, views, waitlist,
+)
+from .benchmarks import (
+    benchmark_views, compare, compare_sync_async, generate_synthetic_data,
+    percentile, stress_checkins, stress_registrations,
+)
+from .importing import import_attendees, read_csv
+from .middleware import RequestTimings
+from .models import Announcement, Event, Attendee, EventFullError, Task, WaitlistEntry
+from .pagination import encode_cursor, paginate_keyset
+from .search import search_attendees
+from .testing import QueryBudgetMixin, QueryPlanMixin, full_scans
+
+
+def make_event(**kwargs):
+    start = timezone.now() + timedelta(days=7)
+    defaults = {
+        'title': 'PyCon',
+        'description': 'Talks and sprints',
+        'start_date': start,
+        'end_date': start + timedelta(hours=8),
+        'location': 'Harare',
+        'max_attendees': 10,
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(**defaults)
+
+
+def make_attendee(event, n=0, **kwargs):
+    defaults = {
+        'first_name': f'Ada{n}',
+        'last_name': 'Lovelace',
+        'email': f'ada{n}@example.com',
+    }
+    defaults.update(kwargs)
+    return Attendee.objects.create(event=event, **defaults)
+
+
+class RegisteredCountTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=3)
+
+    def refresh_count(self):
+        self.event.refresh_from_db()
+        return self.event.registered_count
+
+    def test_counter_follows_inserts_cancellations_and_deletes(self):
+        first = make_attendee(self.event, 1)
+        make_attendee(self.event, 2)
+        self.assertEqual(self.refresh_count(), 2)
+
+        first.attendance_status = 'cancelled'
+        first.save()
+        self.assertEqual(self.refresh_count(), 1)
+
+        first.attendance_status = 'registered'
+        first.save()
+        self.assertEqual(self.refresh_count(), 2)
+
+        first.delete()
+        self.assertEqual(self.refresh_count(), 1)
+
+        self.event.attendees.all().delete()
+        self.assertEqual(self.refresh_count(), 0)
+
+    def test_registrations_cannot_move_between_events(self):
+        other = make_event(title='DjangoCon', max_attendees=1)
+        make_attendee(other)
+        attendee = Attendee.objects.get(pk=make_attendee(self.event, 1).pk)
+        attendee.event = other
+        with self.assertRaises(ValidationError):
+            attendee.save()
+        self.assertEqual(self.refresh_count(), 1)
+        self.assertEqual(Event.objects.get(pk=other.pk).registered_count, 1)
+
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:events_attendee_change', args=[attendee.pk]))
+        self.assertNotIn('event', response.context['adminform'].form.fields)
+
+    def test_capacity_methods_read_the_counter(self):
+        for n in range(3):
+            make_attendee(self.event, n)
+        self.event.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.event.registered_attendees_count(), 3)
+            self.assertEqual(self.event.available_spots(), 0)
+            self.assertTrue(self.event.is_full())
+
+    def test_reconcile_command_repairs_drift(self):
+        make_attendee(self.event, 1)
+        other = make_event(title='DjangoCon')
+        Event.objects.filter(pk=self.event.pk).update(registered_count=3)
+        Event.objects.filter(pk=other.pk).update(registered_count=2)
+
+        out = StringIO()
+        call_command('reconcile_registration_counts', stdout=out)
+
+        self.assertIn('Reconciled 2', out.getvalue())
+        self.assertEqual(self.refresh_count(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.registered_count, 0)
+
+    def test_event_list_query_count_is_flat(self):
+        for n in range(20):
+            make_event(title=f'Event {n}')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('events:event_list'))
+
+
+class SeatReservationTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=2)
+
+    def test_reserve_seats_refuses_past_capacity(self):
+        self.assertTrue(Event.reserve_seats(self.event.pk, 2))
+        self.assertFalse(Event.reserve_seats(self.event.pk))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 2)
+
+    def test_save_claims_a_seat_or_raises(self):
+        make_attendee(self.event, 1)
+        make_attendee(self.event, 2)
+        with self.assertRaises(EventFullError):
+            make_attendee(self.event, 3)
+        self.assertEqual(self.event.attendees.count(), 2)
+
+    def test_reactivating_a_cancellation_needs_a_free_seat(self):
+        first = make_attendee(self.event, 1, attendance_status='cancelled')
+        make_attendee(self.event, 2)
+        make_attendee(self.event, 3)
+        first.attendance_status = 'registered'
+        with self.assertRaises(EventFullError):
+            first.save()
+
+    def test_register_view_rolls_back_when_seat_is_gone(self):
+        url = reverse('events:register_attendee', args=[self.event.pk])
+        data = {'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'category': 'general'}
+        response = self.client.post(url, data)
+        attendee = Attendee.objects.get(email='grace@example.com')
+        self.assertRedirects(
+            response, reverse('events:registration_confirmation', args=[attendee.confirmation_code]),
+            fetch_redirect_response=False,
+        )
+
+        # Another request takes the last seat between the capacity read and our claim
+        self.client.logout()
+        data.update(email='late@example.com', create_account='on', username='late', password='s3cret-pass')
+        with mock.patch.object(Event, 'reserve_seats', return_value=False):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('events:event_detail', args=[self.event.pk]), fetch_redirect_response=False)
+        self.assertFalse(Attendee.objects.filter(email='late@example.com').exists())
+        self.assertFalse(User.objects.filter(username='late').exists())
+
+
+class RegistrationStressTests(TransactionTestCase):
+    def test_concurrent_registrations_never_oversell(self):
+        event = make_event(max_attendees=25)
+        result = stress_registrations(event, attempts=120, workers=8)
+
+        self.assertEqual(result['error'], 0)
+        self.assertEqual(result['admitted'], 25)
+        self.assertEqual(result['rejected'], 95)
+        self.assertEqual(result['attendee_rows'], 25)
+        self.assertEqual(result['registered_count'], 25)
+        self.assertGreater(result['registrations_per_second'], 0)
+
+    def test_concurrent_checkins_each_succeed_once(self):
+        event = make_event(max_attendees=40)
+        for n in range(40):
+            make_attendee(event, n)
+        result = stress_checkins(event, workers=8)
+        self.assertEqual(result['checked_in'], 40)
+        self.assertEqual(result['error'], 0)
+        self.assertEqual(event.attendees.filter(attendance_status='checked_in').count(), 40)
+
+
+class DatabaseProfileTests(TestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'event_management' / 'settings.py'))
+
+    def test_postgres_profile_uses_a_connection_pool(self):
+        databases = self.load_settings(
+            EVENTS_DB_PROFILE='postgres', POSTGRES_HOST='db.internal', POSTGRES_POOL_MIN='3',
+            POSTGRES_POOL_MAX='7', EVENTS_REPLICAS='replica-a.internal',
+        )['DATABASES']
+        default = databases['default']
+        self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(default['HOST'], 'db.internal')
+        # Django refuses a pool together with persistent connections
+        self.assertEqual(default['CONN_MAX_AGE'], 0)
+        self.assertEqual(default['OPTIONS']['pool'], {'min_size': 3, 'max_size': 7, 'timeout': 10})
+        self.assertEqual(databases['replica_1']['HOST'], 'replica-a.internal')
+        self.assertEqual(databases['replica_1']['OPTIONS']['pool'], default['OPTIONS']['pool'])
+
+    def test_postgres_pool_options_are_accepted_by_the_backend(self):
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            self.skipTest('pip install -r requirements-postgres.txt')
+        databases = self.load_settings(EVENTS_DB_PROFILE='postgres', POSTGRES_POOL_MIN='3', POSTGRES_POOL_MAX='7')
+        # Under its own alias: pools are shared per alias, and 'default' may have a live one
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.dummy'},
+            'profile': databases['DATABASES']['default'],
+        })
+        wrapper = handler['profile']
+        # The pool is created closed; nothing connects until a query runs
+        pool = wrapper.pool
+        self.addCleanup(wrapper.close_pool)
+        self.assertEqual((pool.min_size, pool.max_size, pool.timeout), (3, 7, 10))
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings(EVENTS_DB_PROFILE='mysql')
+
+    def test_sqlite_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite profile only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.EVENTS_SQLITE_PRAGMAS['busy_timeout'])
+
+
+class AttendeeSearchTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=50)
+        self.ada = make_attendee(self.event, 1, first_name='Ada', last_name='Lovelace', company='Analytical Engines')
+        self.grace = make_attendee(self.event, 2, first_name='Grace', last_name='Hopper', email='grace@navy.mil', company='US Navy')
+        self.adaline = make_attendee(self.event, 3, first_name='Adaline', last_name='Byron', email='byron@example.com')
+
+    def search(self, text, **kwargs):
+        return list(search_attendees(Attendee.objects.all(), text, **kwargs))
+
+    def test_prefix_matching_across_columns(self):
+        self.assertCountEqual(self.search('ada'), [self.ada, self.adaline])
+        self.assertEqual(self.search('ada love'), [self.ada])
+        self.assertEqual(self.search('navy.m'), [self.grace])
+        self.assertEqual(self.search(self.grace.confirmation_code[:4].lower()), [self.grace])
+
+    def test_results_keep_the_queryset_ordering(self):
+        self.assertEqual(
+            list(search_attendees(Attendee.objects.order_by('-id'), 'ada')), [self.adaline, self.ada],
+        )
+
+    def test_triggers_follow_updates_and_deletes(self):
+        self.grace.last_name = 'Brewster'
+        self.grace.save()
+        self.assertEqual(self.search('hopper'), [])
+        self.assertEqual(self.search('brew'), [self.grace])
+
+        self.adaline.delete()
+        self.assertEqual(self.search('ada'), [self.ada])
+
+    def test_rebuild_command_backfills_the_index(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Run the deferred FK checks of setUp's inserts, which block DDL on the table
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cursor.execute(f"DROP INDEX {search.PG_INDEX}")
+            else:
+                cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES ('delete-all')")
+                self.assertEqual(self.search('grace'), [])
+
+        call_command('rebuild_attendee_search', stdout=StringIO())
+        self.assertEqual(self.search('grace'), [self.grace])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [search.PG_INDEX])
+                self.assertIsNotNone(cursor.fetchone())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=50)
+        self.attendees = [make_attendee(self.event, n) for n in range(7)]
+        # Several rows share a registration_date so the id tie-breaker matters
+        Attendee.objects.filter(pk__in=[a.pk for a in self.attendees[2:5]]).update(
+            registration_date=self.attendees[2].registration_date
+        )
+        self.ordered = list(self.event.attendees.order_by('-registration_date', '-id'))
+
+    def walk(self, page_size=3):
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(self.event.attendees.all(), after=cursor, page_size=page_size)
+            seen.extend(page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_walks_every_row_once_in_order(self):
+        self.assertEqual(self.walk(), self.ordered)
+
+    def test_inserts_do_not_shift_later_pages(self):
+        first = paginate_keyset(self.event.attendees.all(), page_size=3)
+        make_attendee(self.event, 99)
+        second = paginate_keyset(self.event.attendees.all(), after=first.next_cursor, page_size=3)
+        self.assertEqual(second.object_list, self.ordered[3:6])
+
+    def test_before_cursor_returns_previous_page(self):
+        first = paginate_keyset(self.event.attendees.all(), page_size=3)
+        second = paginate_keyset(self.event.attendees.all(), after=first.next_cursor, page_size=3)
+        back = paginate_keyset(self.event.attendees.all(), before=second.previous_cursor, page_size=3)
+        self.assertEqual(back.object_list, first.object_list)
+        self.assertFalse(back.has_previous)
+
+    def test_garbage_cursor_starts_from_the_top(self):
+        page = paginate_keyset(self.event.attendees.all(), after='not-a-cursor', page_size=3)
+        self.assertEqual(page.object_list, self.ordered[:3])
+
+    def test_cursor_with_wrongly_typed_values_starts_from_the_top(self):
+        for values in (['notadate', 1], [self.ordered[0].registration_date, 'x'], [None, 1], [[1], 1]):
+            cursor = encode_cursor(values)
+            page = paginate_keyset(self.event.attendees.all(), after=cursor, page_size=3)
+            self.assertEqual(page.object_list, self.ordered[:3])
+
+    def test_bad_cursor_in_view_is_not_an_error(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('events:manage_attendees', args=[self.event.pk])
+        response = self.client.get(url, {'after': encode_cursor(['notadate', 1]), 'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page']), self.ordered[:3])
+
+    def test_staff_views_render_one_page(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        for name in ('manage_attendees', 'attendance_report'):
+            response = self.client.get(reverse(f'events:{name}', args=[self.event.pk]), {'page_size': 4})
+            self.assertEqual(len(response.context['page']), 4)
+            self.assertContains(response, 'after=')
+
+    def test_search_results_page_stably(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('events:manage_attendees', args=[self.event.pk])
+        seen, params = [], {'search': 'ada', 'page_size': 2}
+        while True:
+            page = self.client.get(url, params).context['page']
+            seen.extend(a.pk for a in page)
+            if not page.has_next:
+                break
+            params['after'] = page.next_cursor
+            make_attendee(self.event, 100 + len(seen))
+        self.assertEqual(seen, [a.pk for a in self.ordered])
+
+
+class AttendanceSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = make_event(max_attendees=50)
+        make_attendee(self.event, 1, category='vip')
+        make_attendee(self.event, 2, category='vip', attendance_status='checked_in')
+        make_attendee(self.event, 3, attendance_status='cancelled')
+        make_attendee(self.event, 4, company='Initech')
+
+    def test_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            summary = self.event.attendees.attendance_summary()
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['registered'], 2)
+        self.assertEqual(summary['checked_in'], 1)
+        self.assertEqual(summary['cancelled'], 1)
+        self.assertEqual(summary['no_show'], 0)
+        self.assertEqual(summary['categories'], {'general': 2, 'vip': 2, 'speaker': 0, 'sponsor': 0})
+
+    def test_summary_respects_search_filters(self):
+        summary = search_attendees(Attendee.objects.all(), 'initech').attendance_summary()
+        self.assertEqual(summary['total'], 1)
+
+    @override_settings(EVENTS_STATS_CACHE_TIMEOUT=30)
+    def test_event_summary_is_cached(self):
+        self.event.attendance_summary()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.event.attendance_summary()['total'], 4)
+
+    @override_settings(EVENTS_STATS_CACHE_TIMEOUT=30)
+    def test_status_updates_show_in_the_cached_summary_at_once(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        manage = reverse('events:manage_attendees', args=[self.event.pk])
+        self.assertEqual(self.client.get(manage).context['stats']['checked_in'], 1)
+        attendee = self.event.attendees.get(email='ada1@example.com')
+        response = self.client.post(
+            reverse('events:update_attendance_status', args=[attendee.pk]), {'status': 'checked_in'}, follow=True,
+        )
+        self.assertEqual(response.context['stats']['checked_in'], 2)
+
+    def test_report_renders_counts_and_chart_data(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('events:attendance_report', args=[self.event.pk]))
+        self.assertEqual(response.context['total_attendees'], 4)
+        self.assertContains(response, 'const categoryData = {"general": 2, "vip": 2')
+
+
+class AttendeeExportTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=50)
+        self.other = make_event(title='Other')
+        make_attendee(self.event, 1, first_name='Ada', category='vip')
+        make_attendee(self.event, 2, first_name='Grace')
+        make_attendee(self.other, 3, first_name='Linus')
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_event_csv_export(self):
+        body = self.export(reverse('events:export_attendees', args=[self.event.pk]))
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['first_name'] for row in rows], ['Ada', 'Grace'])
+        self.assertEqual(rows[0]['event'], 'PyCon')
+
+    def test_export_honours_search_form_filters(self):
+        body = self.export(reverse('events:export_all_attendees'), format='ndjson', category='vip')
+        self.assertEqual([json.loads(line)['first_name'] for line in body.splitlines()], ['Ada'])
+
+        body = self.export(reverse('events:export_all_attendees'), format='ndjson', search='lin')
+        self.assertEqual([json.loads(line)['first_name'] for line in body.splitlines()], ['Linus'])
+
+
+class AttendeeImportTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=4)
+        make_attendee(self.event, 0, email='taken@example.com')
+
+    def csv_file(self, rows):
+        lines = ['first_name,last_name,email,phone_number,category']
+        lines += [','.join(row) for row in rows]
+        return BytesIO('\n'.join(lines).encode())
+
+    def test_import_validates_dedupes_and_claims_capacity(self):
+        rows = [
+            ('Ada', 'Lovelace', 'ada@example.com', '+263771234567', 'speaker'),
+            ('Bad', 'Phone', 'bad@example.com', 'call me', ''),
+            ('Again', 'Taken', 'taken@example.com', '', ''),
+            ('Ada', 'Twice', 'ada@example.com', '', ''),
+            ('Grace', 'Hopper', 'grace@example.com', '', 'sponsor'),
+            ('Linus', 'T', 'linus@example.com', '', ''),
+            ('Late', 'Comer', 'late@example.com', '', ''),
+        ]
+        report = import_attendees(self.event, read_csv(self.csv_file(rows)), batch_size=2)
+
+        self.assertEqual(report.created, 3)
+        self.assertEqual([line for line, _, _ in report.errors], [3, 4, 5, 8])
+        self.assertIn('phone_number', report.errors[0][2])
+        self.assertEqual(report.errors[-1][2], 'Event is full.')
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 4)
+        self.assertEqual(self.event.attendees.count(), 4)
+        self.assertEqual(Attendee.objects.get(email='ada@example.com').category, 'speaker')
+
+    def test_upload_view_reports_results(self):
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        upload = self.csv_file([('Ada', 'Lovelace', 'ada@example.com', '', '')])
+        upload.name = 'partners.csv'
+        response = self.client.post(reverse('events:import_attendees', args=[self.event.pk]), {'csv_file': upload})
+        self.assertEqual(response.context['report'].created, 1)
+        self.assertTrue(self.event.attendees.filter(email='ada@example.com').exists())
+
+    def test_emails_are_deduplicated_case_insensitively(self):
+        rows = [
+            ('Ada', 'Lovelace', ' Ada@Example.com', '', ''),
+            ('Ada', 'Again', 'ada@example.COM', '', ''),
+            ('Again', 'Taken', 'TAKEN@example.com', '', ''),
+        ]
+        report = import_attendees(self.event, read_csv(self.csv_file(rows)))
+        self.assertEqual(report.created, 1)
+        self.assertEqual([message for _, _, message in report.errors],
+                         ["Duplicate email in this file.", "Already registered for this event."])
+
+    def test_unreadable_uploads_are_form_errors(self):
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        url = reverse('events:import_attendees', args=[self.event.pk])
+        latin1 = BytesIO('first_name,last_name,email\nJosé,Núñez,jose@example.com\n'.encode('latin-1'))
+        latin1.name = 'partners.csv'
+        response = self.client.post(url, {'csv_file': latin1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('UTF-8', response.context['form'].errors['csv_file'][0])
+
+        oversized = self.csv_file([
+            ('Ada', 'Lovelace', 'ada@example.com', '', ''),
+            ('"' + 'x' * 200000 + '"', 'Long', 'long@example.com', '', ''),
+        ])
+        oversized.name = 'partners.csv'
+        response = self.client.post(url, {'csv_file': oversized})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('not valid CSV', response.context['form'].errors['csv_file'][0])
+        # Rows before the unreadable line are kept
+        self.assertEqual(response.context['report'].created, 1)
+
+
+class CheckInSyncTests(TestCase):
+    def setUp(self):
+        caches['checkin'].clear()
+        self.event = make_event(max_attendees=50)
+        self.ada = make_attendee(self.event, 1)
+        self.grace = make_attendee(self.event, 2, attendance_status='cancelled')
+        self.linus = make_attendee(self.event, 3, attendance_status='checked_in', check_in_time=timezone.now())
+        self.url = reverse('events:check_in_sync', args=[self.event.pk])
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+
+    def sync(self, scans):
+        return self.client.post(self.url, json.dumps({'scans': scans}), content_type='application/json')
+
+    def test_batch_reports_per_code_results_and_is_idempotent(self):
+        scanned_at = timezone.now() - timedelta(minutes=5)
+        scans = [
+            {'confirmation_code': self.ada.confirmation_code.lower(), 'scanned_at': scanned_at.isoformat()},
+            {'confirmation_code': self.grace.confirmation_code},
+            {'confirmation_code': self.linus.confirmation_code},
+            {'confirmation_code': 'NOPE0000'},
+        ]
+        checkin.warm_index(self.event.pk)
+        # session, user, event, DB fallback for the unknown code, one UPDATE and
+        # one read-back of the rows it skipped
+        with self.assertNumQueries(6):
+            response = self.sync(scans)
+        results = {r['confirmation_code']: r['result'] for r in response.json()['results']}
+        self.assertEqual(results, {
+            self.ada.confirmation_code: 'ok',
+            self.grace.confirmation_code: 'cancelled',
+            self.linus.confirmation_code: 'already_checked_in',
+            'NOPE0000': 'unknown',
+        })
+        self.ada.refresh_from_db()
+        self.assertEqual(self.ada.attendance_status, 'checked_in')
+        self.assertEqual(self.ada.check_in_time, scanned_at)
+
+        replay = {r['confirmation_code']: r['result'] for r in self.sync(scans).json()['results']}
+        self.assertEqual(replay, results)
+        self.ada.refresh_from_db()
+        self.assertEqual(self.ada.check_in_time, scanned_at)
+
+        rescan = self.sync([{'confirmation_code': self.ada.confirmation_code}]).json()['results']
+        self.assertEqual(rescan[0]['result'], 'already_checked_in')
+
+    def test_rejects_malformed_batches_and_non_staff(self):
+        self.assertEqual(self.sync([{'scanned_at': 'x'}]).status_code, 400)
+        self.assertEqual(self.sync([{'confirmation_code': 'A', 'scanned_at': 'yesterday'}]).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.sync([]).status_code, 403)
+
+
+class CheckInIndexTests(TestCase):
+    def setUp(self):
+        caches['checkin'].clear()
+        self.event = make_event(max_attendees=50)
+        self.ada = make_attendee(self.event, 1)
+
+    def test_warm_index_answers_without_queries(self):
+        self.assertEqual(checkin.warm_index(self.event.pk), 1)
+        with self.assertNumQueries(0):
+            entry = checkin.resolve_code(self.event, self.ada.confirmation_code)
+        self.assertEqual(entry, (self.ada.pk, 'registered', 'Ada1 Lovelace'))
+
+    def test_miss_falls_back_to_the_database_and_fills_the_index(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(checkin.resolve_code(self.event, self.ada.confirmation_code)[0], self.ada.pk)
+        with self.assertNumQueries(0):
+            checkin.resolve_code(self.event, self.ada.confirmation_code)
+        self.assertIsNone(checkin.resolve_code(self.event, 'NOPE0000'))
+
+    def test_signals_keep_the_index_current(self):
+        checkin.warm_index(self.event.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            grace = make_attendee(self.event, 2)
+            self.ada.attendance_status = 'cancelled'
+            self.ada.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(checkin.resolve_code(self.event, grace.confirmation_code)[1], 'registered')
+            self.assertEqual(checkin.resolve_code(self.event, self.ada.confirmation_code)[1], 'cancelled')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grace.delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(checkin.resolve_code(self.event, grace.confirmation_code))
+
+    def test_stale_entry_cannot_check_in_a_cancelled_attendee(self):
+        checkin.warm_index(self.event.pk)
+        Attendee.objects.filter(pk=self.ada.pk).update(attendance_status='cancelled')
+        results = checkin.apply_scans(self.event, [(self.ada.confirmation_code, timezone.now())])
+        self.assertEqual(results[self.ada.confirmation_code], 'cancelled')
+
+    def test_check_in_station_warms_and_uses_the_index(self):
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        url = reverse('events:check_in_attendee', args=[self.event.pk])
+        self.client.get(url)
+        self.assertTrue(checkin.is_warm(self.event.pk))
+
+        response = self.client.post(url, {'confirmation_code': self.ada.confirmation_code.lower()}, follow=True)
+        self.assertContains(response, 'Successfully checked in Ada1 Lovelace')
+        self.ada.refresh_from_db()
+        self.assertEqual(self.ada.attendance_status, 'checked_in')
+
+
+@override_settings(EVENTS_METRICS=True)
+class RequestMetricsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        metrics.reset()
+        cache.clear()
+        self.event = make_event(max_attendees=50)
+        make_attendee(self.event, 1)
+
+    def test_server_timing_header_and_prometheus_endpoint(self):
+        response = self.client.get(reverse('events:event_detail', args=[self.event.pk]))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="1 queries, 0 duplicate", tpl;dur=[\d.]+')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('events_requests_total{view="events:event_detail"} 1', body)
+        self.assertIn('events_request_queries_total{view="events:event_detail"} 1', body)
+        self.assertRegex(body, r'events_response_bytes_total\{view="events:event_detail"\} [1-9]')
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        timings = RequestTimings()
+        for ids in ((1, 2), (3, 4, 5), (6, 7)):
+            sql = 'SELECT 1 WHERE id IN ({})'.format(', '.join(['%s'] * len(ids)))
+            timings(lambda *args: None, sql, ids, False, {})
+        self.assertEqual(timings.duplicate_queries, 2)
+        self.assertEqual(timings.duplicate_fingerprints(), {'SELECT 1 WHERE id IN (...)': 2})
+
+    def test_n_plus_one_queries_count_as_duplicates(self):
+        timings = RequestTimings()
+        for event_id in range(1, 5):
+            timings(lambda *args: None, 'SELECT * FROM events_event WHERE id = %s', (event_id,), False, {})
+        self.assertEqual(timings.duplicate_queries, 3)
+        self.assertEqual(timings.duplicate_fingerprints(), {'SELECT * FROM events_event WHERE id = %s': 3})
+
+    @override_settings(EVENTS_METRICS_ALLOWED_IPS=[])
+    def test_metrics_endpoint_is_for_staff_and_allowed_scrapers(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.client.logout()
+        with self.settings(EVENTS_METRICS_ALLOWED_IPS=['10.0.0.9']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+    def test_template_timing_is_only_installed_during_requests(self):
+        original = django_backend.Template.render
+        response = self.client.get(reverse('events:event_detail', args=[self.event.pk]))
+        self.assertRegex(response['Server-Timing'], r'tpl;dur=(?!0\.00)[\d.]+')
+        self.assertIs(django_backend.Template.render, original)
+
+    @override_settings(EVENTS_METRICS=False)
+    def test_metrics_endpoint_is_off_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_public_views_stay_within_budget(self):
+        self.assertQueryBudget('event_list', 1)
+        self.assertQueryBudget('event_detail', 1, args=[self.event.pk])
+        self.assertQueryBudget('check_registration_status', 1, args=[self.event.pk])
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertQueryBudget('manage_attendees', 5, args=[self.event.pk])
+        self.assertQueryBudget('attendance_report', 5, args=[self.event.pk])
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_synthetic_data_keeps_counters_consistent(self):
+        events = generate_synthetic_data(events=3, attendees=200, seed=7, batch_size=50)
+        self.assertEqual(Attendee.objects.count(), 200)
+        self.assertEqual(Event.drifted_counters().count(), 0)
+        for event in Event.objects.filter(pk__in=[e.pk for e in events]):
+            self.assertLess(event.registered_count, event.max_attendees)
+        statuses = set(Attendee.objects.values_list('attendance_status', flat=True))
+        self.assertIn('checked_in', statuses)
+        self.assertFalse(Attendee.objects.filter(attendance_status='checked_in', check_in_time=None).exists())
+
+    def test_generate_command_rejects_bad_options(self):
+        for options in ({'events': 0}, {'attendees': -1}, {'batch_size': 0}):
+            with self.subTest(**options), self.assertRaises(CommandError):
+                call_command('generate_synthetic_data', stdout=StringIO(), **options)
+        self.assertFalse(Event.objects.exists())
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+
+    def test_benchmark_views_reports_every_view(self):
+        event = generate_synthetic_data(events=1, attendees=40, seed=1)[0]
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        before = event.attendees.count()
+        results = benchmark_views(event, staff, iterations=3, warmup=1)
+
+        self.assertEqual(set(results), {
+            'event_list', 'event_detail', 'check_registration_api', 'register_attendee',
+            'manage_attendees', 'attendance_report', 'check_in_attendee',
+        })
+        for stats in results.values():
+            self.assertEqual(stats['requests'], 3)
+            self.assertGreaterEqual(stats['p99_ms'], stats['p50_ms'])
+        self.assertGreater(results['manage_attendees']['queries_per_request'], 0)
+        # Registrations went through rather than re-rendering an invalid form
+        self.assertEqual(event.attendees.count(), before + 4)
+
+        report = {'runs': [{'events': 1, 'attendees': 40, 'views': results}]}
+        self.assertTrue(all(change['p50_ratio'] == 1.0 for change in compare(report, report)))
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        caching.page_cache().clear()
+        caching.reset_stats()
+        self.event = make_event(title='Cached Conf', max_attendees=10)
+
+    def test_anonymous_detail_page_is_served_from_cache_until_a_registration(self):
+        url = reverse('events:event_detail', args=[self.event.pk])
+        self.assertContains(self.client.get(url), '0/10')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), '0/10')
+
+        make_attendee(self.event, 1)
+        self.assertContains(self.client.get(url), '1/10')
+        self.assertEqual(caching.stats()['event_detail'], {'hit': 1, 'miss': 2, 'bypass': 0})
+
+    def test_event_changes_invalidate_the_catalog(self):
+        url = reverse('events:event_list')
+        self.assertContains(self.client.get(url), 'Cached Conf')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.event.title = 'Renamed Conf'
+        self.event.save()
+        self.assertContains(self.client.get(url), 'Renamed Conf')
+        self.event.delete()
+        self.assertNotContains(self.client.get(url), 'Renamed Conf')
+
+    def test_logged_in_users_bypass_the_page_but_reuse_card_fragments(self):
+        self.client.force_login(User.objects.create_user('ada', password='pw'))
+        url = reverse('events:event_list')
+        self.assertContains(self.client.get(url), '10 spots available')
+        make_attendee(self.event, 1)
+        self.assertContains(self.client.get(url), '9 spots available')
+        self.assertEqual(caching.stats()['event_list']['bypass'], 2)
+
+    def test_bulk_counter_repair_retires_cached_pages(self):
+        url = reverse('events:event_detail', args=[self.event.pk])
+        self.client.get(url)
+        Attendee.objects.bulk_create([Attendee(event=self.event, first_name='Bulk', last_name='Row',
+                                               email='bulk@example.com', confirmation_code='BULK0001')])
+        self.assertContains(self.client.get(url), '0/10')
+        Event.reconcile_registered_counts()
+        self.assertContains(self.client.get(url), '1/10')
+
+    def test_version_stamps_expire(self):
+        cache = caching.page_cache()
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            caching.event_version(987654)
+            caching.bump_event(987655)
+        self.assertTrue(add.call_args_list)
+        self.assertEqual({call.args[2] for call in add.call_args_list}, {caching.version_timeout()})
+        self.assertIsNotNone(caching.version_timeout())
+
+    def test_cache_stats_are_exported(self):
+        self.client.get(reverse('events:event_list'))
+        self.assertIn('events_page_cache_requests_total{page="event_list",result="miss"} 1', metrics.render_prometheus())
+
+
+class FileBasedPageCacheTests(PublicPageCacheTests):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+            'checkin': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'checkin-tests'},
+        }))
+        super().setUp()
+
+
+class RegistrationStatusApiTests(TestCase):
+    def setUp(self):
+        caching.page_cache().clear()
+        self.event = make_event(max_attendees=10)
+        self.url = reverse('events:check_registration_status', args=[self.event.pk])
+
+    def test_matching_etag_is_answered_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['spots_remaining'], 10)
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        make_attendee(self.event, 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['spots_remaining'], 9)
+
+    def test_logged_in_responses_are_private_and_per_user(self):
+        anonymous_etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user('ada', email='ada1@example.com', password='pw')
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], anonymous_etag)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.json()['is_registered'])
+
+        make_attendee(self.event, 1, user=user)
+        self.assertTrue(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).json()['is_registered'])
+
+    def test_capacity_endpoint_is_shareable(self):
+        response = self.client.get(reverse('events:event_capacity', args=[self.event.pk]))
+        self.assertEqual(response.json(), {'total_registered': 0, 'max_attendees': 10, 'spots_remaining': 10})
+        self.assertIn('public', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertEqual(self.client.get(reverse('events:event_capacity', args=[999])).status_code, 404)
+
+
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=10)
+
+    def test_attendee_changes_publish_deltas_on_commit(self):
+        with mock.patch.object(live.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                attendee = make_attendee(self.event, 1)
+            publish.assert_called_once_with(self.event.pk, {'registered': 1, 'checked_in': 0})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                checkin.apply_scans(self.event, [(attendee.confirmation_code, timezone.now())])
+            publish.assert_called_with(self.event.pk, {'registered': 0, 'checked_in': 1})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Attendee.objects.get(pk=attendee.pk).delete()
+            publish.assert_called_with(self.event.pk, {'registered': -1, 'checked_in': -1})
+
+    def test_stream_applies_deltas_published_from_other_threads(self):
+        async def load_state(event_id):
+            return {'total_registered': 3, 'max_attendees': 10, 'spots_remaining': 7, 'checked_in': 1}
+
+        async def scenario():
+            stream = live.capacity_stream(self.event.pk, load_state=load_state, heartbeat=0.05)
+            first = await anext(stream)
+            self.assertEqual(live.broker.subscriber_count(), 1)
+            self.assertEqual(await anext(stream), ': ping\n\n')
+            publisher = threading.Thread(target=live.broker.publish,
+                                         args=(self.event.pk, {'registered': 2, 'checked_in': 1}))
+            publisher.start()
+            publisher.join()
+            update = await anext(stream)
+            await stream.aclose()
+            return first, update
+
+        first, update = asyncio.run(scenario())
+        self.assertIn('"spots_remaining":7', first)
+        self.assertEqual(update, live.format_event(
+            {'total_registered': 5, 'max_attendees': 10, 'spots_remaining': 5, 'checked_in': 2}
+        ))
+        self.assertEqual(live.broker.subscriber_count(), 0)
+
+    async def test_endpoint_streams_the_current_counts_to_staff_only(self):
+        url = reverse('events:event_live', args=[self.event.pk])
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+        await self.async_client.aforce_login(await User.objects.acreate(username='staff', is_staff=True))
+        response = await self.async_client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), live.format_event(
+            {'total_registered': 0, 'max_attendees': 10, 'spots_remaining': 10, 'checked_in': 0}
+        ).encode())
+        await stream.aclose()
+        missing = await self.async_client.get(reverse('events:event_live', args=[999]))
+        self.assertEqual(missing.status_code, 404)
+
+
+class AsyncPublicViewTests(TestCase):
+    def setUp(self):
+        caching.page_cache().clear()
+        self.event = make_event(title='Async Conf')
+        self.attendee = make_attendee(self.event, 1)
+
+    async def test_public_views_are_routed_to_async_versions_under_asgi(self):
+        url = reverse('events:event_detail', args=[self.event.pk])
+        response = await self.async_client.get(url)
+        self.assertIs(response.asgi_request.resolver_match.func, async_views.event_detail)
+        response = await sync_to_async(self.client.get)(url)
+        self.assertIs(response.wsgi_request.resolver_match.func, views.event_detail)
+
+    @override_settings(EVENTS_METRICS=True, EVENTS_READ_REPLICAS=['default'])
+    async def test_routing_holds_with_metrics_and_replicas_enabled(self):
+        await sync_to_async(metrics.reset)()
+        url = reverse('events:event_detail', args=[self.event.pk])
+        response = await self.async_client.get(url)
+        self.assertIs(response.asgi_request.resolver_match.func, async_views.event_detail)
+        # Queries made on the request's sync thread are still counted
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries')
+        response = await sync_to_async(self.client.get)(url)
+        self.assertIs(response.wsgi_request.resolver_match.func, views.event_detail)
+
+        # A write made through the async chain still pins the client to the primary
+        await sync_to_async(admission.admission_cache().clear)()
+        response = await self.async_client.post(reverse('events:register_attendee', args=[self.event.pk]), {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'category': 'general',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[routing.PIN_COOKIE].value, '1')
+
+    def test_asgi_routes_match_the_wsgi_routes(self):
+        for name, args in (('event_list', []), ('event_detail', [1]), ('register_attendee', [1]),
+                           ('check_registration_status', [1]), ('manage_attendees', [1])):
+            self.assertEqual(
+                reverse(f'events:{name}', args=args, urlconf=settings.EVENTS_ASGI_URLCONF),
+                reverse(f'events:{name}', args=args),
+            )
+
+    async def test_async_views_render(self):
+        response = await self.async_client.get(reverse('events:event_list'))
+        self.assertContains(response, 'Async Conf')
+        response = await self.async_client.get(reverse('events:event_detail', args=[self.event.pk]))
+        self.assertContains(response, '1/10')
+        response = await self.async_client.get(
+            reverse('events:registration_confirmation', args=[self.attendee.confirmation_code])
+        )
+        self.assertContains(response, self.attendee.confirmation_code)
+        missing = await self.async_client.get(reverse('events:event_detail', args=[999]))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_check_registration_status_lookup(self):
+        url = reverse('events:check_registration')
+        response = await self.async_client.post(url, {
+            'email': self.attendee.email, 'confirmation_code': self.attendee.confirmation_code,
+        })
+        self.assertContains(response, self.attendee.confirmation_code)
+        response = await self.async_client.post(url, {'email': 'nobody@example.com', 'confirmation_code': 'X'})
+        self.assertContains(response, 'No registration found')
+
+    async def test_status_api_answers_conditional_requests(self):
+        url = reverse('events:check_registration_status', args=[self.event.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()['spots_remaining'], 9)
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class SyncAsyncBenchmarkTests(TransactionTestCase):
+    def test_both_paths_serve_every_request(self):
+        event = generate_synthetic_data(events=2, attendees=30, seed=3)[0]
+        result = compare_sync_async(event, concurrency=4, total=16)
+        for mode in ('wsgi', 'asgi'):
+            self.assertEqual(result[mode]['requests'], 16)
+            self.assertEqual(result[mode]['errors'], 0)
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    """The hot queries in views.py must stay on indexes as the tables grow."""
+
+    def setUp(self):
+        caching.page_cache().clear()
+        self.event = make_event()
+        make_event(title='Closed', registration_open=False)
+        self.user = User.objects.create_user('ada', email='ada1@example.com', password='pw', is_staff=True)
+        self.attendee = make_attendee(self.event, 1, user=self.user)
+        for n in range(2, 6):
+            make_attendee(self.event, n)
+
+    def test_public_views(self):
+        self.assertNoFullScans('event_list')
+        self.assertNoFullScans('event_detail', args=[self.event.pk])
+        self.assertNoFullScans('check_registration', method='post', data={
+            'email': self.attendee.email, 'confirmation_code': self.attendee.confirmation_code,
+        })
+
+    def test_account_linking_lookups(self):
+        admission.admission_cache().clear()
+        self.assertNoFullScans('register_attendee', args=[self.event.pk], method='post', data={
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'Grace@example.com', 'category': 'general',
+        })
+        # The same lookup runs on every login (link_registrations)
+        lookup = User.objects.filter(Exact(Lower('email'), 'ada1@example.com')).values_list('pk', flat=True)[:2]
+        self.assertEqual(full_scans(connection, *lookup.query.sql_with_params()), [])
+
+    def test_attendee_views(self):
+        self.client.force_login(self.user)
+        self.assertNoFullScans('my_registrations')
+        self.assertNoFullScans('check_registration_status', args=[self.event.pk])
+
+    def test_staff_views(self):
+        self.client.force_login(self.user)
+        self.assertNoFullScans('manage_attendees', args=[self.event.pk])
+        self.assertNoFullScans('attendance_report', args=[self.event.pk])
+        self.assertNoFullScans('check_in_attendee', args=[self.event.pk])
+
+    def test_detects_full_scans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan text checked for SQLite only')
+        self.assertEqual(full_scans(connection, 'SELECT * FROM events_attendee WHERE notes = %s', ['x']), ['events_attendee'])
+
+
+class ReplicaRouterTests(TestCase):
+    @override_settings(EVENTS_READ_REPLICAS=['replica_1'])
+    def test_reads_use_a_replica_only_when_the_request_allows_it(self):
+        router = routing.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Event))
+        state = routing.RoutingState(use_replica=True)
+        token = routing._state.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Event), 'replica_1')
+            self.assertEqual(router.db_for_write(Event), 'default')
+            self.assertTrue(state.wrote)
+        finally:
+            routing._state.reset(token)
+        self.assertFalse(router.allow_migrate('replica_1', 'events'))
+        self.assertIsNone(router.allow_migrate('default', 'events'))
+
+    def test_middleware_is_off_without_replicas(self):
+        response = self.client.post(reverse('events:register_attendee', args=[make_event().pk]), {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'category': 'general',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(routing.PIN_COOKIE, response.cookies)
+
+
+class ReplicaReadTests(TransactionTestCase):
+    """Two SQLite files: the test database as primary and a stale copy of it as replica."""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Uses SQLite files as replicas')
+        caching.page_cache().clear()
+        caching.reset_stats()
+        self.event = make_event(max_attendees=10)
+
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        # Registered directly rather than in DATABASES, like a connection made at runtime
+        wrapper = load_backend(connection.settings_dict['ENGINE']).DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': path}, 'replica_test',
+        )
+        connections['replica_test'] = wrapper
+        self.addCleanup(self.drop_replica)
+        self.enterContext(override_settings(EVENTS_READ_REPLICAS=['replica_test'], EVENTS_PAGE_CACHE_TIMEOUT=0))
+
+        # Only the primary sees this registration
+        make_attendee(self.event, 1)
+
+    def drop_replica(self):
+        connections['replica_test'].close()
+        del connections['replica_test']
+
+    def test_public_reads_hit_the_replica_until_the_client_writes(self):
+        detail = reverse('events:event_detail', args=[self.event.pk])
+        self.assertContains(self.client.get(detail), '0/10')
+
+        response = self.client.post(reverse('events:register_attendee', args=[self.event.pk]), {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'category': 'general',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[routing.PIN_COOKIE]['max-age'], 10)
+
+        # Pinned to the primary: the new registrant sees their own registration
+        self.assertContains(self.client.get(detail), '2/10')
+        self.assertContains(self.client.get(response['Location']), 'Grace')
+
+    def test_versioned_responses_are_not_read_from_a_lagging_replica(self):
+        detail = reverse('events:event_detail', args=[self.event.pk])
+        capacity = reverse('events:event_capacity', args=[self.event.pk])
+        with override_settings(EVENTS_PAGE_CACHE_TIMEOUT=300):
+            # The replica still shows 0/10; the page cached under the current version must not
+            self.assertContains(self.client.get(detail), '1/10')
+            self.assertContains(self.client.get(detail), '1/10')
+            self.assertEqual(caching.stats()['event_detail']['hit'], 1)
+
+        response = self.client.get(capacity)
+        self.assertEqual(response.json()['total_registered'], 1)
+        status = reverse('events:check_registration_status', args=[self.event.pk])
+        self.assertEqual(self.client.get(status).json()['total_registered'], 1)
+
+        # A write on the primary moves the version; the next tag matches the new rows
+        make_attendee(self.event, 2)
+        refreshed = self.client.get(capacity, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()['total_registered'], 2)
+        self.assertEqual(self.client.get(capacity, headers={'If-None-Match': refreshed['ETag']}).status_code, 304)
+
+
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        admission.admission_cache().clear()
+        self.addCleanup(admission.admission_cache().clear)
+        admission.reset()
+        self.event = make_event(max_attendees=1)
+        self.url = reverse('events:register_attendee', args=[self.event.pk])
+
+    def register(self, n):
+        return self.client.post(self.url, {
+            'first_name': 'Grace', 'last_name': f'Hopper {n}', 'email': f'grace{n}@example.com', 'category': 'general',
+        })
+
+    def test_sold_out_events_are_answered_without_queries(self):
+        self.assertEqual(self.register(1).status_code, 302)
+        self.register(2)  # finds the event full and marks it
+        with self.assertNumQueries(0):
+            response = self.register(3)
+        self.assertRedirects(response, reverse('events:event_detail', args=[self.event.pk]), fetch_redirect_response=False)
+        self.assertEqual(admission.decisions()[admission.SOLD_OUT], 1)
+
+        # A cancellation moves the event version, which retires the marker
+        attendee = self.event.attendees.get()
+        attendee.attendance_status = 'cancelled'
+        attendee.save()
+        self.assertFalse(admission.is_sold_out(self.event.pk))
+        self.assertEqual(self.register(4)['Location'], reverse('events:registration_confirmation', args=[
+            Attendee.objects.get(email='grace4@example.com').confirmation_code,
+        ]))
+
+    @override_settings(EVENTS_REGISTRATION_CLIENT_RATE=(2, 0.001))
+    def test_clients_over_their_rate_get_429(self):
+        self.event.max_attendees = 10
+        self.event.save()
+        self.register(1)
+        self.register(2)
+        with self.assertNumQueries(0):
+            response = self.register(3)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 1)
+        # A made-up session cookie does not buy a fresh bucket
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'forged'
+        self.assertEqual(self.register(4).status_code, 429)
+        # Another client still gets through
+        self.client.cookies.clear()
+        self.assertEqual(self.client.post(self.url, {
+            'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'category': 'general',
+        }, REMOTE_ADDR='10.0.0.9').status_code, 302)
+
+    @override_settings(EVENTS_REGISTRATION_EVENT_RATE=(1, 0.001))
+    def test_events_over_their_rate_get_429_and_decisions_are_exported(self):
+        self.register(1)
+        self.assertEqual(self.register(2).status_code, 429)
+        body = metrics.render_prometheus()
+        self.assertIn('events_registration_admission_total{decision="admitted"} 1', body)
+        self.assertIn('events_registration_admission_total{decision="event_rate_limited"} 1', body)
+
+    @override_settings(EVENTS_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_clients_behind_a_trusted_proxy_are_told_apart(self):
+        def address(remote, forwarded=None):
+            request = RequestFactory().get('/', REMOTE_ADDR=remote)
+            if forwarded is not None:
+                request.META['HTTP_X_FORWARDED_FOR'] = forwarded
+            return admission.client_address(request)
+
+        self.assertEqual(address('10.0.0.1', '203.0.113.7'), '203.0.113.7')
+        # The left-most entries come from the client and cannot be trusted
+        self.assertEqual(address('10.0.0.1', '198.51.100.1, 203.0.113.7, 10.0.0.2'), '203.0.113.7')
+        # Only a trusted peer may set the header
+        self.assertEqual(address('192.0.2.5', '203.0.113.7'), '192.0.2.5')
+        self.assertEqual(address('10.0.0.1'), '10.0.0.1')
+
+    @override_settings(EVENTS_TRUSTED_PROXIES=['10.0.0.1'], EVENTS_REGISTRATION_CLIENT_RATE=(1, 0.001))
+    def test_each_client_behind_a_proxy_gets_its_own_bucket(self):
+        self.event.max_attendees = 10
+        self.event.save()
+        for n in range(3):
+            response = self.client.post(self.url, {
+                'first_name': 'Grace', 'last_name': 'Hopper', 'email': f'grace{n}@example.com', 'category': 'general',
+            }, REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{n}')
+            self.assertEqual(response.status_code, 302)
+
+    def test_sold_out_markers_expire(self):
+        with mock.patch.object(admission.admission_cache(), 'set') as cache_set:
+            admission.mark_sold_out(self.event.pk)
+        self.assertEqual(cache_set.call_args.args[2], settings.EVENTS_SOLD_OUT_TIMEOUT)
+
+    def test_token_bucket_refills(self):
+        with mock.patch('events.admission.time.time', return_value=1000.0):
+            self.assertTrue(admission.take_token('bucket', 1, 0.5)[0])
+            taken, retry_after = admission.take_token('bucket', 1, 0.5)
+            self.assertFalse(taken)
+            self.assertEqual(retry_after, 2)
+        with mock.patch('events.admission.time.time', return_value=1002.0):
+            self.assertTrue(admission.take_token('bucket', 1, 0.5)[0])
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.event = make_event(max_attendees=1)
+        self.holder = make_attendee(self.event)
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def join(self, n):
+        return waitlist.join(self.event, f'Grace{n}', 'Hopper', f'grace{n}@example.com')
+
+    def cancel(self, attendee):
+        self.client.force_login(self.staff)
+        return self.client.post(
+            reverse('events:update_attendance_status', args=[attendee.pk]), {'status': 'cancelled'},
+        )
+
+    def test_join_endpoint_queues_in_order(self):
+        url = reverse('events:join_waitlist', args=[self.event.pk])
+        for n in (1, 2):
+            response = self.client.post(url, {
+                'first_name': 'Grace', 'last_name': 'Hopper', 'email': f'grace{n}@example.com', 'category': 'general',
+            }, follow=True)
+            self.assertContains(response, f"number {n} on the waitlist")
+        response = self.client.post(url, {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace1@example.com', 'category': 'general',
+        })
+        self.assertContains(response, "already on the waitlist")
+        with self.assertRaises(waitlist.WaitlistError):
+            waitlist.join(self.event, 'Ada', 'Lovelace', self.holder.email)
+
+    def test_join_redirects_to_registration_when_spots_are_free(self):
+        self.event.max_attendees = 5
+        self.event.save()
+        response = self.client.get(reverse('events:join_waitlist', args=[self.event.pk]))
+        self.assertRedirects(response, reverse('events:register_attendee', args=[self.event.pk]))
+
+    def test_cancellation_promotes_the_head_of_the_queue(self):
+        first, second = self.join(1), self.join(2)
+        self.cancel(self.holder)
+
+        first.refresh_from_db()
+        self.event.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(first.attendee.attendance_status, 'registered')
+        self.assertEqual(self.event.registered_count, 1)
+        self.assertEqual(second.position(), 1)
+
+        # Restoring the cancelled attendee now fails cleanly: the seat has been given away
+        self.client.post(reverse('events:update_attendance_status', args=[self.holder.pk]), {'status': 'registered'})
+        self.holder.refresh_from_db()
+        self.assertEqual(self.holder.attendance_status, 'cancelled')
+
+    def test_cancelling_in_the_admin_promotes(self):
+        first = self.join(1)
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        response = self.client.post(reverse('admin:events_attendee_changelist'), {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+            'form-0-id': self.holder.pk, 'form-0-attendance_status': 'cancelled', 'form-0-is_approved': 'on',
+            '_save': 'Save',
+        })
+        self.assertEqual(response.status_code, 302)
+        first.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).registered_count, 1)
+
+    def test_deleting_a_registration_promotes(self):
+        first = self.join(1)
+        Attendee.objects.get(pk=self.holder.pk).delete()
+        first.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).registered_count, 1)
+
+    def test_promotion_skips_waiters_who_registered_directly(self):
+        self.event.max_attendees = 2
+        self.event.save()
+        early = self.join(1)
+        direct = make_attendee(self.event, 1, email=early.email.upper(), attendance_status='checked_in',
+                               check_in_time=timezone.now())
+        second = self.join(2)
+        self.cancel(self.holder)
+
+        direct.refresh_from_db()
+        self.assertEqual(direct.attendance_status, 'checked_in')
+        self.assertIsNotNone(direct.check_in_time)
+        early.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(early.status, WaitlistEntry.WITHDRAWN)
+        self.assertEqual(second.status, WaitlistEntry.PROMOTED)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).registered_count, 2)
+
+    def test_registering_directly_leaves_the_waitlist(self):
+        entry = self.join(1)
+        other = self.join(2)
+        self.event.max_attendees = 5
+        self.event.save()
+        admission.admission_cache().clear()
+        self.client.post(reverse('events:register_attendee', args=[self.event.pk]), {
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': entry.email, 'category': 'general',
+        })
+        import_attendees(self.event, [{'first_name': 'G', 'last_name': 'H', 'email': other.email}])
+        entry.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((entry.status, other.status), (WaitlistEntry.WITHDRAWN, WaitlistEntry.WITHDRAWN))
+
+    def test_promotion_cost_does_not_depend_on_queue_length(self):
+        def promotion_queries(waiting):
+            WaitlistEntry.objects.bulk_create([
+                WaitlistEntry(event=self.event, first_name='Q', last_name=str(n), email=f'q{waiting}-{n}@example.com')
+                for n in range(waiting)
+            ])
+            attendee = self.event.attendees.exclude(attendance_status='cancelled').get()
+            self.client.force_login(self.staff)
+            with CaptureQueriesContext(connection) as context:
+                self.cancel(attendee)
+            return len(context)
+
+        self.assertEqual(promotion_queries(2), promotion_queries(200))
+
+    def test_promotion_reinstates_an_earlier_cancellation(self):
+        self.holder.attendance_status = 'cancelled'
+        self.holder.save()
+        other = make_attendee(self.event, 1)
+        waitlist.join(self.event, 'Ada', 'Lovelace', self.holder.email)
+        self.cancel(other)
+        self.holder.refresh_from_db()
+        self.assertEqual(self.holder.attendance_status, 'registered')
+        self.assertEqual(Attendee.objects.filter(event=self.event, email=self.holder.email).count(), 1)
+
+    def test_staff_see_waitlist_depth(self):
+        for n in range(3):
+            self.join(n)
+        quiet = make_event(title='Quiet')
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(3):  # session, user, the annotated events
+            response = self.client.get(reverse('events:waitlist_overview'))
+        self.assertEqual([(event.pk, event.waiting) for event in response.context['events']], [(self.event.pk, 3)])
+        self.assertNotContains(response, quiet.title)
+
+
+class AdminScaleTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def populate(self, events, per_event):
+        for _ in range(events):
+            event = make_event(title=f'Event {Event.objects.count()}', max_attendees=per_event)
+            for n in range(per_event):
+                make_attendee(event, n, attendance_status='checked_in' if n % 2 else 'registered')
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def test_changelists_do_not_query_per_row(self):
+        for url in (reverse('admin:events_event_changelist'), reverse('admin:events_attendee_changelist')):
+            with self.subTest(url=url):
+                Attendee.objects.all().delete()
+                Event.objects.all().delete()
+                self.populate(2, 2)
+                small = self.changelist_queries(url)
+                self.populate(6, 5)
+                self.assertEqual(self.changelist_queries(url), small)
+
+    def test_event_filter_lists_a_bounded_set_of_events(self):
+        self.populate(3, 1)
+        past = make_event(title='Last year', start_date=timezone.now() - timedelta(days=365),
+                          end_date=timezone.now() - timedelta(days=364))
+        make_attendee(past)
+        url = reverse('admin:events_attendee_changelist')
+        with mock.patch('events.admin.EventListFilter.limit', 2):
+            response = self.client.get(url)
+            choices = [choice['display'] for choice in response.context['cl'].filter_specs[0].choices(response.context['cl'])]
+            self.assertEqual(choices, ['All', 'Event 0', 'Event 1'])
+            response = self.client.get(url, {'event': past.pk})
+        self.assertEqual([attendee.event_id for attendee in response.context['cl'].result_list], [past.pk])
+        self.assertContains(response, 'Last year')
+
+    def test_event_filter_ignores_malformed_ids(self):
+        self.populate(1, 1)
+        response = self.client.get(reverse('admin:events_attendee_changelist'), {'event': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_bulk_actions_issue_one_update_and_skip_cancelled(self):
+        event = make_event()
+        attendees = [make_attendee(event, n) for n in range(3)]
+        attendees[2].attendance_status = 'cancelled'
+        attendees[2].save()
+        version = caching.event_version(event.pk)
+        checkin.warm_index(event.pk)
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('admin:events_attendee_changelist'), {
+                'action': 'check_in', '_selected_action': [a.pk for a in attendees],
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        statuses = dict(Attendee.objects.values_list('pk', 'attendance_status'))
+        self.assertEqual([statuses[a.pk] for a in attendees], ['checked_in', 'checked_in', 'cancelled'])
+        self.assertNotEqual(caching.event_version(event.pk), version)
+        self.assertFalse(checkin.is_warm(event.pk))
+
+        self.client.post(reverse('admin:events_attendee_changelist'), {
+            'action': 'mark_no_show', '_selected_action': [a.pk for a in attendees],
+        })
+        self.assertEqual(Attendee.objects.filter(attendance_status='no_show').count(), 0)
+
+    @override_settings(EVENTS_ESTIMATED_COUNT_THRESHOLD=5)
+    def test_unfiltered_changelist_uses_the_estimated_count(self):
+        self.populate(2, 4)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Attendee.objects.filter(pk__in=list(Attendee.objects.values_list('pk', flat=True)[:3])).delete()
+        url = reverse('admin:events_attendee_changelist')
+        self.assertEqual(self.client.get(url).context['cl'].result_count, 8)
+        # Filtered lists are counted exactly
+        self.assertEqual(self.client.get(url, {'attendance_status__exact': 'registered'}).context['cl'].result_count,
+                         Attendee.objects.filter(attendance_status='registered').count())
+
+
+class AccountLinkTests(TestCase):
+    def setUp(self):
+        self.event = make_event()
+        self.other = make_event(title='DjangoCon')
+
+    def test_login_links_registrations_by_normalized_email(self):
+        attendee = make_attendee(self.event, email='Ada@Example.com')
+        user = User.objects.create_user('ada', email='ada@example.COM', password='pw')
+        # Signing up links the registrations that already exist
+        attendee.refresh_from_db()
+        self.assertEqual(attendee.user, user)
+
+        later = make_attendee(self.other, email='ada@example.com')
+        self.assertIsNone(later.user)
+        self.client.force_login(user)
+        later.refresh_from_db()
+        self.assertEqual(later.user, user)
+        response = self.client.get(reverse('events:check_registration_status', args=[self.other.pk]))
+        self.assertTrue(response.json()['is_registered'])
+
+    def test_registering_while_logged_out_links_at_once(self):
+        user = User.objects.create_user('ada', email='Ada@example.com', password='pw')
+        self.client.post(reverse('events:register_attendee', args=[self.event.pk]), {
+            'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com ', 'category': 'general',
+        })
+        self.assertEqual(Attendee.objects.get(event=self.event).user, user)
+
+    def test_shared_emails_are_not_linked(self):
+        User.objects.create_user('one', email='shared@example.com')
+        second = User.objects.create_user('two', email='Shared@example.com')
+        attendee = make_attendee(self.event, email='shared@example.com')
+        self.client.force_login(second)
+        call_command('link_registrations', stdout=StringIO())
+        attendee.refresh_from_db()
+        self.assertIsNone(attendee.user)
+
+    def test_backfill_links_in_chunks(self):
+        users = [User.objects.create_user(f'u{n}', email=f'u{n}@example.com') for n in range(3)]
+        attendees = [make_attendee(self.event, n, email=f'U{n}@Example.com') for n in range(3)]
+        make_attendee(self.event, 9, email='nobody@example.com')
+        out = StringIO()
+        call_command('link_registrations', chunk_size=2, stdout=out)
+        self.assertIn('Linked 3 registration(s)', out.getvalue())
+        self.assertEqual([Attendee.objects.get(pk=a.pk).user for a in attendees], users)
+
+    def test_my_registrations_pages_by_account(self):
+        user = User.objects.create_user('ada', email='ada@example.com', password='pw')
+        for n in range(3):
+            make_attendee(make_event(title=f'Event {n}'), user=user)
+        make_attendee(self.event, email='stranger@example.com')
+        self.client.force_login(user)
+        response = self.client.get(reverse('events:my_registrations'), {'page_size': 2})
+        page = response.context['page']
+        self.assertEqual([a.event.title for a in page], ['Event 2', 'Event 1'])
+        response = self.client.get(reverse('events:my_registrations'), {'page_size': 2, 'after': page.next_cursor})
+        self.assertEqual([a.event.title for a in response.context['page']], ['Event 0'])
+
+
+@tasks.task(name='tests.flaky', max_attempts=2)
+def flaky_task(fail_times, marker):
+    calls = cache.get(marker, 0) + 1
+    cache.set(marker, calls)
+    if calls <= fail_times:
+        raise RuntimeError('boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admission.admission_cache().clear()
+
+    def test_registration_queues_a_confirmation_after_commit(self):
+        event = make_event()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('events:register_attendee', args=[event.pk]), {
+                'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'category': 'general',
+            })
+        task = Task.objects.get()
+        self.assertEqual(task.name, tasks.send_registration_confirmation.task_name)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.DONE)
+        self.assertEqual(mail.outbox[0].to, ['grace@example.com'])
+        self.assertIn(Attendee.objects.get().confirmation_code, mail.outbox[0].body)
+
+    def test_enqueue_is_idempotent_per_key(self):
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.enqueue(flaky_task, key='once', fail_times=0, marker='m')
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(flaky_task, fail_times=5, marker='m')
+        tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn('boom', task.last_error)
+        self.assertGreater(task.run_after, timezone.now())
+        # Not ready until the backoff has passed
+        self.assertEqual(tasks.run_pending(), 0)
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('events.tasks', 'ERROR'):
+            tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def lost_task(self, attempts):
+        started = timezone.now() - timedelta(hours=1)
+        return Task.objects.create(
+            name=flaky_task.task_name, payload={'fail_times': 0, 'marker': 'm'}, max_attempts=2,
+            status=Task.RUNNING, started_at=started, lease_expires_at=started + timedelta(minutes=5), attempts=attempts,
+        )
+
+    def test_lost_tasks_are_reclaimed_after_their_lease(self):
+        self.lost_task(attempts=1)
+        self.assertEqual(tasks.run_pending(), 1)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.DONE, 2))
+
+    def test_lost_tasks_on_their_last_attempt_fail(self):
+        task = self.lost_task(attempts=2)
+        with self.assertLogs('events.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIsNotNone(task.finished_at)
+
+    @override_settings(EVENTS_TASK_LEASE=60)
+    def test_running_tasks_renew_their_lease(self):
+        leases = []
+
+        @tasks.task(name='tests.slow')
+        def slow_task():
+            before = Task.objects.get().lease_expires_at
+            self.assertTrue(tasks.renew_lease())
+            leases.append((before, Task.objects.get().lease_expires_at))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(slow_task)
+        tasks.run_pending()
+        before, after = leases[0]
+        self.assertGreaterEqual(after, before)
+        self.assertGreater(after, timezone.now() + timedelta(seconds=30))
+        self.assertTrue(tasks.renew_lease())  # outside a task
+
+    def test_reclaimed_runs_do_not_record_their_outcome(self):
+        @tasks.task(name='tests.overtaken')
+        def overtaken_task():
+            # Another worker reclaimed the task and started the next attempt
+            Task.objects.update(attempts=F('attempts') + 1)
+            self.assertFalse(tasks.renew_lease())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(overtaken_task)
+        with self.assertLogs('events.tasks', 'WARNING'):
+            tasks.run_pending()
+        self.assertEqual(Task.objects.get().status, Task.RUNNING)
+
+    def test_plain_text_emails_are_not_html_escaped(self):
+        attendee = make_attendee(make_event(title='R&D Day'), first_name="D'Arcy")
+        tasks.send_registration_confirmation(attendee.pk)
+        self.assertIn("Hi D'Arcy,", mail.outbox[0].body)
+        self.assertIn("R&D Day", mail.outbox[0].body)
+
+    def test_worker_command_and_metrics(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                tasks.enqueue(flaky_task, fail_times=0, marker=f'm{n}')
+        body = metrics.render_prometheus()
+        self.assertIn('events_task_queue_depth{status="queued"} 3', body)
+
+        out = StringIO()
+        call_command('run_tasks', once=True, workers=1, stdout=out)
+        self.assertIn('Ran 3 task(s)', out.getvalue())
+        body = metrics.render_prometheus()
+        self.assertIn('events_task_queue_depth{status="queued"} 0', body)
+        self.assertIn('events_tasks_finished{task="tests.flaky",status="done"} 3', body)
+        self.assertIn('events_task_latency_seconds_avg{task="tests.flaky"}', body)
+
+    @override_settings(EVENTS_TASK_BACKEND='local', EVENTS_TASK_RETRY_DELAY=0)
+    def test_local_backend_runs_in_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue(flaky_task, fail_times=1, marker='local')
+        deadline = time.monotonic() + 5
+        while cache.get('local') != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.get('local'), 2)
+        self.assertFalse(Task.objects.exists())
+
+
+class AnnouncementTests(TestCase):
+    def setUp(self):
+        self.event = make_event(title='R&D Day', max_attendees=200000)
+
+    def add_recipients(self, count, cancelled=0):
+        Attendee.objects.bulk_create([
+            Attendee(
+                event=self.event, first_name=f'A{n}', last_name='Lovelace', email=f'a{n}@example.com',
+                confirmation_code=f'N{n:07d}', attendance_status='cancelled' if n < cancelled else 'registered',
+            )
+            for n in range(count)
+        ], batch_size=5000)
+
+    def check_streaming(self, count, batch_size):
+        self.add_recipients(count, cancelled=10)
+        announcement = Announcement.objects.create(event=self.event, subject='Venue change', message='Hall B & C')
+        with CaptureQueriesContext(connection) as context:
+            sent = announcements.send_announcement(announcement, batch_size=batch_size)
+        self.assertEqual(sent, count - 10)
+        self.assertEqual(len(mail.outbox), count - 10)
+        # One streaming read plus one checkpoint per batch, not one query per recipient
+        self.assertLess(len(context), count // batch_size + 10)
+        announcement.refresh_from_db()
+        self.assertEqual((announcement.status, announcement.sent_count), (Announcement.SENT, count - 10))
+        self.assertEqual((announcement.claimed_by, announcement.lease_expires_at), ('', None))
+        first = mail.outbox[0]
+        self.assertEqual(first.to, ['a10@example.com'])
+        self.assertIn('Hi A10,', first.body)
+        self.assertIn('Hall B & C', first.body)
+        self.assertIn('R&D Day', first.body)
+
+    def test_streams_recipients_in_batches(self):
+        self.check_streaming(5000, 500)
+
+    @tag('slow')
+    @skipUnless(os.environ.get('EVENTS_SLOW_TESTS'), 'set EVENTS_SLOW_TESTS=1 to run')
+    def test_streams_100k_recipients_in_batches(self):
+        self.check_streaming(100000, 2000)
+
+    def test_resumes_from_the_checkpoint_after_a_crash(self):
+        self.add_recipients(25)
+        announcement = Announcement.objects.create(event=self.event, subject='Update', message='Doors at 9')
+        backend = mail.get_connection()
+        original = backend.send_messages
+        calls = []
+
+        def crash_on_third_batch(messages):
+            calls.append(len(messages))
+            if len(calls) == 3:
+                raise ConnectionError('SMTP went away')
+            return original(messages)
+
+        with mock.patch.object(backend, 'send_messages', crash_on_third_batch):
+            with self.assertRaises(ConnectionError):
+                announcements.send_announcement(announcement, batch_size=10, connection=backend)
+        announcement.refresh_from_db()
+        self.assertEqual((announcement.status, announcement.sent_count), (Announcement.SENDING, 20))
+
+        out = StringIO()
+        call_command('send_announcement', resume=announcement.pk, batch_size=10, stdout=out)
+        self.assertIn('Sent 5 message(s)', out.getvalue())
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(sorted(recipients), sorted(f'a{n}@example.com' for n in range(25)))
+
+    def test_a_claimed_announcement_is_not_sent_twice(self):
+        self.add_recipients(5)
+        announcement = Announcement.objects.create(event=self.event, subject='Update', message='Doors at 9')
+        self.assertTrue(announcements.claim(announcement, 'other-worker'))
+
+        with self.assertRaisesMessage(CommandError, 'being sent by another worker'):
+            call_command('send_announcement', resume=announcement.pk, stdout=StringIO())
+        # The task backs off and tries again later
+        with self.captureOnCommitCallbacks(execute=True):
+            announcements.queue_announcement(announcement)
+        tasks.run_pending()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+        # Once the other sender's claim has expired, the send is taken over
+        Announcement.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(announcements.send_announcement(announcement), 5)
+
+    def test_staff_view_queues_the_send(self):
+        self.add_recipients(3)
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('events:announce', args=[self.event.pk]), {
+                'subject': 'Parking', 'message': 'Use the north lot.',
+            })
+        self.assertRedirects(response, reverse('events:announce', args=[self.event.pk]))
+        self.assertEqual(len(mail.outbox), 0)
+        tasks.run_pending()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertContains(self.client.get(reverse('events:announce', args=[self.event.pk])), 'Parking')
+
+
+class BadgeTests(TestCase):
+    def setUp(self):
+        self.event = make_event()
+        self.attendees = [
+            make_attendee(self.event, n, company='R&D <Labs>', job_title='Engineer', category=category)
+            for n, category in enumerate(['general', 'vip', 'speaker', 'sponsor', 'general'])
+        ]
+        self.attendees[4].attendance_status = 'cancelled'
+        self.attendees[4].save()
+
+    def test_code128_symbols(self):
+        for value, pattern in enumerate(badges.CODE128_PATTERNS):
+            widths = [int(width) for width in pattern]
+            self.assertEqual(sum(widths), 13 if value == badges.STOP else 11)
+            # Code 128 bars always cover an even number of modules
+            self.assertEqual(sum(widths[0::2]) % 2, 0)
+        self.assertEqual(len(set(badges.CODE128_PATTERNS)), 107)
+        self.assertEqual(badges.code128_values('A'), [104, 33, (104 + 33) % 103, 106])
+        with self.assertRaises(ValueError):
+            badges.code128_values('é')
+
+    def read_archive(self, chunks):
+        archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+        return {name: archive.read(name).decode() for name in archive.namelist()}
+
+    def test_archive_has_one_escaped_badge_per_registered_attendee(self):
+        files = self.read_archive(exports.stream_badges(self.event.attendees.exclude(attendance_status='cancelled'), workers=1, chunk_size=2))
+        expected = [badges.badge_filename({'id': a.pk, 'confirmation_code': a.confirmation_code}) for a in self.attendees[:4]]
+        self.assertEqual(list(files), expected)
+        svg = files[expected[1]]
+        self.assertIn('Ada1 Lovelace', svg)
+        self.assertIn('R&amp;D &lt;Labs&gt;', svg)
+        self.assertIn('>VIP<', svg)
+        self.assertIn(self.attendees[1].confirmation_code, svg)
+
+    def test_process_pool_output_matches_serial_output(self):
+        attendees = self.event.attendees.all()
+        serial = self.read_archive(exports.stream_badges(attendees, workers=1, chunk_size=2))
+        parallel = self.read_archive(exports.stream_badges(attendees, workers=2, chunk_size=2))
+        self.assertEqual(parallel, serial)
+
+    @override_settings(EVENTS_BADGE_WORKERS=1)
+    def test_staff_endpoint_and_command(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('events:export_badges', args=[self.event.pk]), {'category': 'vip'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(len(self.read_archive(response.streaming_content)), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'badges.zip')
+            out = StringIO()
+            call_command('render_badges', self.event.pk, output=output, stdout=out)
+            self.assertIn('for 4 attendee(s)', out.getvalue())
+            self.assertEqual(len(zipfile.ZipFile(output).namelist()), 4)
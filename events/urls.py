@@ -9,24 +9,35 @@ from django.contrib.auth import views as auth_views
 
 app_name = 'events'
 
-# Public URLs for attendees
+# Public URLs for attendees. Under ASGI the read-only ones are served by their
+# async versions instead (async_urls.py).
 urlpatterns = [
     path('', views.event_list, name='event_list'),
     path('<int:event_id>/', views.event_detail, name='event_detail'),
     path('<int:event_id>/register/', views.register_attendee, name='register_attendee'),
+    path('<int:event_id>/waitlist/', views.join_waitlist, name='join_waitlist'),
     path('confirmation/<str:confirmation_code>/', views.registration_confirmation, name='registration_confirmation'),
     path('check-registration/', views.check_registration_status, name='check_registration'),
     path('my-registrations/', views.my_registrations, name='my_registrations'),
     path('<int:event_id>/status/', views.check_registration_api, name='check_registration_status'),
+    path('<int:event_id>/capacity/', views.event_capacity_api, name='event_capacity'),
+    path('<int:event_id>/live/', views.live_event_stream, name='event_live'),
 
 
 # Management URLs for event staff
 
     path('', views.manage_attendees, name='attendee_list'),
     path('events/<int:event_id>/attendees/', views.manage_attendees, name='manage_attendees'),
+    path('events/<int:event_id>/attendees/export/', views.export_attendees, name='export_attendees'),
+    path('attendees/export/', views.export_attendees, name='export_all_attendees'),
+    path('events/<int:event_id>/badges/', views.export_badges, name='export_badges'),
+    path('events/<int:event_id>/attendees/import/', views.import_attendees_view, name='import_attendees'),
+    path('events/<int:event_id>/announce/', views.announce_view, name='announce'),
     path('events/<int:event_id>/check-in/', views.check_in_attendee, name='check_in_attendee'),
+    path('events/<int:event_id>/check-in/sync/', views.check_in_sync_api, name='check_in_sync'),
     path('attendees/<int:attendee_id>/update-status/', views.update_attendance_status, name='update_attendance_status'),
     path('events/<int:event_id>/report/', views.attendance_report, name='attendance_report'),
+    path('waitlist/', views.waitlist_overview, name='waitlist_overview'),
 
 # Login Urls
 
@@ -1,14 +1,37 @@
+import json
+import math
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib.auth import login
-from django.db.models import Q
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from django.db import transaction
-from .models import Event, Attendee
-from .forms import AttendeeRegistrationForm, AttendeeSearchForm, CheckInForm
+from django.views.decorators.http import require_POST
+from .models import Event, Attendee, EventFullError
+from .forms import AnnouncementForm, AttendeeRegistrationForm, AttendeeSearchForm, CheckInForm, AttendeeImportForm, WaitlistForm
+from . import accounts, tasks
+from .admission import ADMITTED, SOLD_OUT, admit, mark_sold_out
+from .announcements import queue_announcement
+from .caching import cache_public_page, catalog_version, event_version, event_versions, page_timeout
+from .checkin import (
+    ALREADY_CHECKED_IN, CANCELLED, UNKNOWN, ScanError, apply_scans, is_warm,
+    normalize_code, parse_scans, resolve_code, warm_index,
+)
+from .exports import FORMATS, stream_badges, stream_export
+from .importing import READ_ERRORS, import_attendees, missing_columns, read_csv, read_error_message
+from .live import capacity_stream
+from .metrics import render_prometheus
+from .pagination import paginate_request
+from .routing import read_from_primary
+from .search import search_attendees
+from .waitlist import WaitlistError, depth_by_event, join as join_waitlist_queue, withdraw as withdraw_from_waitlist
 from django.contrib.auth import login
 from django.shortcuts import render, redirect
 from django.contrib.auth import get_user_model
@@ -17,19 +40,41 @@ from django.contrib import messages # Import messages for success/error feedback
 from django.contrib.auth.decorators import login_required
 
 # Public views for attendees
+@cache_public_page('event_list', catalog_version)
 def event_list(request):
-    events = Event.objects.filter(is_active=True, registration_open=True).order_by('start_date')
-    return render(request, 'events/event_list.html', {'events': events})
+    events = list(Event.objects.filter(is_active=True, registration_open=True).order_by('start_date'))
+    # Each card fragment is cached under its event's version
+    versions = event_versions([event.pk for event in events])
+    for event in events:
+        event.cache_version = versions[event.pk]
+    return render(request, 'events/event_list.html', {
+        'events': events,
+        'card_timeout': page_timeout(),
+    })
 
+@cache_public_page('event_detail', event_version)
 def event_detail(request, event_id):
     event = get_object_or_404(Event, id=event_id, is_active=True)
     return render(request, 'events/event_detail.html', {'event': event})
 
 def register_attendee(request, event_id):
+    # Admission control runs before any query: sold-out events and clients or events
+    # over their rate are turned away without touching the database
+    if request.method == 'POST':
+        decision, retry_after = admit(request, event_id)
+        if decision == SOLD_OUT:
+            messages.error(request, "Sorry, this event is fully booked. No more registrations can be accepted.")
+            return redirect('events:event_detail', event_id=event_id)
+        if decision != ADMITTED:
+            response = HttpResponse("Too many registration attempts. Please try again shortly.", status=429, content_type='text/plain')
+            response['Retry-After'] = max(1, math.ceil(retry_after))
+            return response
+    
     event = get_object_or_404(Event, id=event_id, is_active=True, registration_open=True)
     
-    # Check if event is full
+    # Check if event is full (reads the stored counter, no COUNT query)
     if event.is_full():
+        mark_sold_out(event_id)
         messages.error(request, "Sorry, this event is fully booked. No more registrations can be accepted.")
         return redirect('events:event_detail', event_id=event_id)
     
@@ -39,11 +84,6 @@ def register_attendee(request, event_id):
     if request.method == 'POST':
         form = AttendeeRegistrationForm(request.POST, event=event)
         if form.is_valid():
-            # Double-check capacity before saving (race condition protection)
-            if event.is_full():
-                messages.error(request, "Sorry, this event just became fully booked. Please try another event.")
-                return redirect('events:event_detail', event_id=event_id)
-            
             try:
                 with transaction.atomic():
                     attendee = form.save(commit=False)
@@ -64,19 +104,38 @@ def register_attendee(request, event_id):
                             last_name=form.cleaned_data['last_name']
                         )
                         attendee.user = user
-                        login(request, user)
                     
                     elif request.user.is_authenticated:
                         attendee.user = request.user
                     
-                    attendee.save()
-                    
-                    messages.success(request, f"Successfully registered for {event.title}!")
-                    if is_last_spot:
-                        messages.info(request, "You got the last available spot!")
-                    
-                    return redirect('events:registration_confirmation', confirmation_code=attendee.confirmation_code)
+                    else:
+                        # Shows up in that account's registrations without waiting for a login
+                        attendee.user_id = accounts.account_for_email(attendee.email)
                     
+                    # Claims the seat with a conditional UPDATE on the event row; raises
+                    # EventFullError (and rolls back any new account) if none is left.
+                    attendee.save()
+                    withdraw_from_waitlist(event.pk, [attendee.email])
+                    # Sent by the task worker once the registration has committed
+                    tasks.enqueue(
+                        tasks.send_registration_confirmation,
+                        key=f'registration-confirmation:{attendee.pk}',
+                        attendee_id=attendee.pk,
+                    )
+                
+                if attendee.user and not request.user.is_authenticated:
+                    login(request, attendee.user)
+                
+                messages.success(request, f"Successfully registered for {event.title}!")
+                if is_last_spot:
+                    messages.info(request, "You got the last available spot!")
+                
+                return redirect('events:registration_confirmation', confirmation_code=attendee.confirmation_code)
+            
+            except EventFullError:
+                mark_sold_out(event_id)
+                messages.error(request, "Sorry, this event just became fully booked. Please try another event.")
+                return redirect('events:event_detail', event_id=event_id)
             except Exception as e:
                 messages.error(request, "An error occurred during registration. Please try again.")
                 print(f"Registration error: {e}")
@@ -98,18 +157,53 @@ def register_attendee(request, event_id):
         'is_last_spot': is_last_spot
     })
 
+def join_waitlist(request, event_id):
+    event = get_object_or_404(Event, id=event_id, is_active=True, registration_open=True)
+    if not event.is_full():
+        messages.info(request, "Good news: spots are available, so you can register directly.")
+        return redirect('events:register_attendee', event_id=event_id)
+    
+    if request.method == 'POST':
+        form = WaitlistForm(request.POST)
+        if form.is_valid():
+            try:
+                entry = join_waitlist_queue(
+                    event, user=request.user if request.user.is_authenticated else None, **form.cleaned_data
+                )
+            except WaitlistError as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(
+                    request,
+                    f"You're number {entry.position()} on the waitlist for {event.title}. "
+                    "We'll register you automatically if a spot opens up.",
+                )
+                return redirect('events:event_detail', event_id=event_id)
+    else:
+        initial_data = {}
+        if request.user.is_authenticated:
+            initial_data.update({
+                'first_name': request.user.first_name,
+                'last_name': request.user.last_name,
+                'email': request.user.email,
+            })
+        form = WaitlistForm(initial=initial_data)
+    
+    return render(request, 'events/join_waitlist.html', {'form': form, 'event': event})
+
 def registration_confirmation(request, confirmation_code):
     attendee = get_object_or_404(Attendee, confirmation_code=confirmation_code)
     return render(request, 'events/registration_confirmation.html', {'attendee': attendee})
 
 @login_required
 def my_registrations(request):
-    attendee_registrations = Attendee.objects.filter(
-        Q(user=request.user) | Q(email=request.user.email)
-    ).select_related('event').order_by('-registration_date')
+    # Registrations made with this account's email are linked to it (see accounts.py)
+    registrations = Attendee.objects.filter(user=request.user).select_related('event')
+    page = paginate_request(request, registrations)
     
     return render(request, 'events/my_registrations.html', {
-        'registrations': attendee_registrations
+        'registrations': page,
+        'page': page,
     })
 
 def check_registration_status(request):
@@ -129,6 +223,18 @@ def check_registration_status(request):
 def is_event_manager(user):
     return user.is_staff or user.is_superuser
 
+def filter_attendees(attendees, form):
+    """Apply the AttendeeSearchForm search and category filters to an attendee queryset."""
+    if form.is_valid():
+        search = form.cleaned_data.get('search')
+        category = form.cleaned_data.get('category')
+        
+        if search:
+            attendees = search_attendees(attendees, search)
+        if category:
+            attendees = attendees.filter(category=category)
+    return attendees
+
 @login_required
 @user_passes_test(is_event_manager)
 def manage_attendees(request, event_id=None):
@@ -140,35 +246,112 @@ def manage_attendees(request, event_id=None):
         attendees = Attendee.objects.all()
     
     form = AttendeeSearchForm(request.GET)
-    if form.is_valid():
-        search = form.cleaned_data.get('search')
-        category = form.cleaned_data.get('category')
-        
-        if search:
-            attendees = attendees.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(email__icontains=search) |
-                Q(company__icontains=search) |
-                Q(confirmation_code__icontains=search)
-            )
-        if category:
-            attendees = attendees.filter(category=category)
+    # Search results page newest first like the unfiltered list
+    attendees = filter_attendees(attendees, form)
     
-    stats = {
-        'total': attendees.count(),
-        'checked_in': attendees.filter(attendance_status='checked_in').count(),
-        'registered': attendees.filter(attendance_status='registered').count(),
-        'cancelled': attendees.filter(attendance_status='cancelled').count(),
-    }
+    page = paginate_request(request, attendees)
+    
+    if event and not form.has_changed():
+        stats = event.attendance_summary()
+    else:
+        stats = attendees.attendance_summary()
     
     return render(request, 'events/manage_attendees.html', {
         'event': event,
-        'attendees': attendees,
+        'attendees': page,
+        'page': page,
         'form': form,
         'stats': stats
     })
 
+@login_required
+@user_passes_test(is_event_manager)
+def export_attendees(request, event_id=None):
+    if event_id:
+        event = get_object_or_404(Event, id=event_id)
+        attendees = event.attendees.all()
+        filename = f"attendees-event-{event.id}"
+    else:
+        attendees = Attendee.objects.all()
+        filename = "attendees"
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        export_format = 'csv'
+    
+    attendees = filter_attendees(attendees, AttendeeSearchForm(request.GET))
+    response = StreamingHttpResponse(stream_export(attendees, export_format), content_type=FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+@login_required
+@user_passes_test(is_event_manager)
+def export_badges(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    attendees = event.attendees.exclude(attendance_status='cancelled')
+    attendees = filter_attendees(attendees, AttendeeSearchForm(request.GET))
+    response = StreamingHttpResponse(stream_badges(attendees), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="badges-event-{event.id}.zip"'
+    return response
+
+@login_required
+@user_passes_test(is_event_manager)
+def import_attendees_view(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    report = None
+    
+    if request.method == 'POST':
+        form = AttendeeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            rows = read_csv(form.cleaned_data['csv_file'])
+            try:
+                missing = missing_columns(rows.fieldnames)
+            except READ_ERRORS as e:
+                form.add_error('csv_file', read_error_message(e))
+            else:
+                if missing:
+                    messages.error(request, f"Missing required column(s): {', '.join(missing)}")
+                else:
+                    report = import_attendees(event, rows)
+                    if report.file_error:
+                        form.add_error('csv_file', report.file_error)
+                    messages.success(request, f"Imported {report.created} attendee(s); {report.rejected} row(s) rejected.")
+    else:
+        form = AttendeeImportForm()
+    
+    return render(request, 'events/import_attendees.html', {
+        'event': event,
+        'form': form,
+        'report': report,
+        'errors': report.errors[:500] if report else [],
+    })
+
+@login_required
+@user_passes_test(is_event_manager)
+def announce_view(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    
+    if request.method == 'POST':
+        form = AnnouncementForm(request.POST)
+        if form.is_valid():
+            with transaction.atomic():
+                announcement = form.save(commit=False)
+                announcement.event = event
+                announcement.created_by = request.user
+                announcement.save()
+                # Sent in the background, in batches, by the task worker
+                queue_announcement(announcement)
+            messages.success(request, f"Announcement queued for {event.registered_count} attendee(s).")
+            return redirect('events:announce', event_id=event.id)
+    else:
+        form = AnnouncementForm()
+    
+    return render(request, 'events/announce.html', {
+        'event': event,
+        'form': form,
+        'announcements': event.announcements.all()[:20],
+    })
+
 @login_required
 @user_passes_test(is_event_manager)
 def check_in_attendee(request, event_id):
@@ -177,31 +360,31 @@ def check_in_attendee(request, event_id):
     if request.method == 'POST':
         form = CheckInForm(request.POST)
         if form.is_valid():
-            confirmation_code = form.cleaned_data['confirmation_code'].upper()
+            confirmation_code = normalize_code(form.cleaned_data['confirmation_code'])
             
-            try:
-                attendee = Attendee.objects.get(
-                    event=event, 
-                    confirmation_code=confirmation_code
-                )
-                
-                if attendee.attendance_status == 'checked_in':
-                    messages.warning(request, f"{attendee.full_name} is already checked in.")
-                elif attendee.attendance_status == 'cancelled':
-                    messages.error(request, f"{attendee.full_name} registration is cancelled.")
+            # Resolved from the warm check-in index, falling back to the database
+            entry = resolve_code(event, confirmation_code)
+            if entry is None:
+                messages.error(request, "No attendee found with this confirmation code.")
+            else:
+                full_name = entry[2]
+                result = apply_scans(event, [(confirmation_code, timezone.now())])[confirmation_code]
+                if result == ALREADY_CHECKED_IN:
+                    messages.warning(request, f"{full_name} is already checked in.")
+                elif result == CANCELLED:
+                    messages.error(request, f"{full_name} registration is cancelled.")
+                elif result == UNKNOWN:
+                    messages.error(request, "No attendee found with this confirmation code.")
                 else:
-                    attendee.attendance_status = 'checked_in'
-                    attendee.check_in_time = timezone.now()
-                    attendee.save()
-                    messages.success(request, f"Successfully checked in {attendee.full_name}!")
+                    messages.success(request, f"Successfully checked in {full_name}!")
                 
                 return redirect('events:check_in_attendee', event_id=event_id)
-                
-            except Attendee.DoesNotExist:
-                messages.error(request, "No attendee found with this confirmation code.")
     
     else:
         form = CheckInForm()
+        # Preload every code of the event the first time the station is opened
+        if not is_warm(event.id):
+            warm_index(event.id)
     
     # Get recent check-ins
     recent_checkins = event.attendees.filter(
@@ -214,6 +397,32 @@ def check_in_attendee(request, event_id):
         'recent_checkins': recent_checkins
     })
 
+@require_POST
+def check_in_sync_api(request, event_id):
+    """
+    Batch check-in endpoint for door scanners that queue scans while offline.
+    POST ``{"scans": [{"confirmation_code": "AB12CD34", "scanned_at": "<ISO 8601>"}]}``;
+    the response maps every code to ok / already_checked_in / cancelled / unknown.
+    Scanners authenticate with a staff session and send its CSRF token as X-CSRFToken.
+    """
+    if not (request.user.is_authenticated and is_event_manager(request.user)):
+        return JsonResponse({'error': 'Event manager login required.'}, status=403)
+    event = get_object_or_404(Event, id=event_id)
+    
+    try:
+        scans = parse_scans(json.loads(request.body))
+    except (ValueError, ScanError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    results = apply_scans(event, scans)
+    return JsonResponse({
+        'event_id': event.id,
+        'results': [
+            {'confirmation_code': code, 'result': results[code]}
+            for code in dict.fromkeys(code for code, _ in scans)
+        ],
+    })
+
 @login_required
 @user_passes_test(is_event_manager)
 def update_attendance_status(request, attendee_id):
@@ -225,8 +434,16 @@ def update_attendance_status(request, attendee_id):
             attendee.attendance_status = new_status
             if new_status == 'checked_in' and not attendee.check_in_time:
                 attendee.check_in_time = timezone.now()
-            attendee.save()
-            messages.success(request, f"Updated {attendee.full_name} status to {new_status}.")
+            try:
+                # Freeing a seat promotes the head of the waitlist (see signals.py)
+                attendee.save()
+            except EventFullError:
+                messages.error(request, f"Cannot restore {attendee.full_name}: the event is full.")
+            else:
+                messages.success(request, f"Updated {attendee.full_name} status to {new_status}.")
+                promoted = getattr(attendee, 'promoted', None)
+                if promoted:
+                    messages.info(request, f"{promoted.full_name} was promoted from the waitlist.")
         else:
             messages.error(request, "Invalid status.")
     
@@ -238,37 +455,109 @@ def attendance_report(request, event_id):
     event = get_object_or_404(Event, id=event_id)
     attendees = event.attendees.all()
     
-    status_counts = {
-        'checked_in': attendees.filter(attendance_status='checked_in').count(),
-        'registered': attendees.filter(attendance_status='registered').count(),
-        'cancelled': attendees.filter(attendance_status='cancelled').count(),
-        'no_show': attendees.filter(attendance_status='no_show').count(),
-    }
+    page = paginate_request(request, attendees)
+    
+    status_counts = event.attendance_summary()
     
     return render(request, 'events/attendance_report.html', {
         'event': event,
-        'attendees': attendees,
-        'status_counts': status_counts
+        'attendees': page,
+        'page': page,
+        'total_attendees': status_counts['total'],
+        'status_counts': status_counts,
+        'category_data_json': json.dumps(status_counts['categories']),
     })
 
-def check_registration_api(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
-    
-    if request.user.is_authenticated:
-        is_registered = Attendee.objects.filter(
-            event=event,
-        ).filter(
-            Q(user=request.user) | Q(email=request.user.email)
-        ).exists()
+@login_required
+@user_passes_test(is_event_manager)
+def waitlist_overview(request):
+    return render(request, 'events/waitlist_overview.html', {'events': depth_by_event()})
+
+def _capacity_payload(event):
+    registered = event.registered_attendees_count()
+    return {
+        'total_registered': registered,
+        'max_attendees': event.max_attendees,
+        'spots_remaining': event.max_attendees - registered,
+    }
+
+
+def _not_modified(request, etag):
+    """
+    A 304 response when the client already holds ``etag``, else None. The response
+    built instead is tagged with ``etag``, so its rows must come from the primary.
+    """
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        read_from_primary()
+    return response
+
+
+def _tagged_json(payload, etag):
+    response = JsonResponse(payload)
+    response['ETag'] = quote_etag(etag)
+    return response
+
+
+def _status_cache_headers(response, user):
+    if user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
     else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'EVENTS_STATUS_MAX_AGE', 5))
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def event_capacity_api(request, event_id):
+    """Capacity only, identical for every visitor so shared caches and CDNs can serve it."""
+    etag = f'capacity-{event_version(event_id)}'
+    response = _not_modified(request, etag)
+    if response is None:
+        response = _tagged_json(_capacity_payload(get_object_or_404(Event, id=event_id)), etag)
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'EVENTS_STATUS_MAX_AGE', 5))
+    return response
+
+
+def check_registration_api(request, event_id):
+    user = request.user
+    viewer = f'user-{user.pk}' if user.is_authenticated else 'anonymous'
+    # The event version moves with every registration change, so a matching
+    # If-None-Match is answered without touching the event or its attendees
+    etag = f'status-{event_version(event_id)}-{viewer}'
+    response = _not_modified(request, etag)
+    if response is None:
+        event = get_object_or_404(Event, id=event_id)
         is_registered = False
-    
-    return JsonResponse({
-        'is_registered': is_registered,
-        'total_registered': event.registered_attendees_count(),
-        'max_attendees': event.max_attendees,
-        'spots_remaining': event.max_attendees - event.registered_attendees_count()
-    })
+        if user.is_authenticated:
+            is_registered = Attendee.objects.filter(event=event, user=user).exists()
+        response = _tagged_json({'is_registered': is_registered, **_capacity_payload(event)}, etag)
+    return _status_cache_headers(response, user)
+
+async def live_event_stream(request, event_id):
+    """
+    Server-Sent Events stream of an event's spots remaining and check-in count,
+    replacing per-client polling on the check-in desk. Staff only, like the desk:
+    check-in counts are not public. Serve it through ASGI: under WSGI every open
+    stream ties up a worker thread.
+    """
+    if not is_event_manager(await request.auser()):
+        raise PermissionDenied
+    if not await Event.objects.filter(pk=event_id).aexists():
+        raise Http404
+    response = StreamingHttpResponse(capacity_stream(event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def metrics_view(request):
+    if not getattr(settings, 'EVENTS_METRICS', False):
+        raise Http404
+    # The series include SQL fingerprints: only staff and the configured scrapers may read them
+    scrapers = getattr(settings, 'EVENTS_METRICS_ALLOWED_IPS', [])
+    if not request.user.is_staff and request.META.get('REMOTE_ADDR') not in scrapers:
+        raise PermissionDenied
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # This is the login view
 User = get_user_model()               # ✅ This will point to Event_App.CustomUser
@@ -0,0 +1,107 @@
+"""
+Event waitlists.
+
+Joining appends a ``WaitlistEntry``. When a cancellation or deletion frees a seat,
+``promote_next`` hands it to the head of the queue inside the transaction that freed
+it; the Attendee signals in signals.py call it, so every path that frees a seat
+promotes. The head is found with one index seek on ``waitlist_queue_idx`` and the
+seat is claimed by the usual conditional UPDATE in ``Attendee.save()``, so promotion
+costs the same whether five people are waiting or five thousand. Because the event
+row stays locked until that transaction commits, no new registration can take the
+seat first.
+
+Someone who registers directly leaves the queue (``withdraw``). A waiter found
+already registered anyway is withdrawn and skipped, leaving their registration as
+it is.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact, In
+from django.utils import timezone
+
+from . import tasks
+from .accounts import normalize_email
+from .models import Attendee, Event, EventFullError, WaitlistEntry
+
+
+class WaitlistError(ValueError):
+    """Raised when someone cannot join an event's waitlist."""
+
+
+def join(event, first_name, last_name, email, category='general', user=None):
+    """Append a waiting entry for ``email`` to ``event``'s queue and return it."""
+    if Attendee.objects.filter(event=event, email=email).exclude(attendance_status='cancelled').exists():
+        raise WaitlistError("This email is already registered for this event.")
+    try:
+        with transaction.atomic():
+            # Someone who was promoted or withdrew before rejoins at the back
+            WaitlistEntry.objects.filter(event=event, email=email).exclude(status=WaitlistEntry.WAITING).delete()
+            return WaitlistEntry.objects.create(
+                event=event, user=user, first_name=first_name, last_name=last_name,
+                email=email, category=category,
+            )
+    except IntegrityError:
+        raise WaitlistError("This email is already on the waitlist for this event.")
+
+
+def withdraw(event_id, emails):
+    """Withdraw the waiting entries of people who have registered for ``event_id`` directly."""
+    emails = [normalize_email(email) for email in emails]
+    return WaitlistEntry.objects.filter(
+        In(Lower('email'), emails), event_id=event_id, status=WaitlistEntry.WAITING,
+    ).update(status=WaitlistEntry.WITHDRAWN)
+
+
+def _next_entry(event_id):
+    return (
+        WaitlistEntry.objects.select_for_update(skip_locked=True)
+        .filter(event_id=event_id, status=WaitlistEntry.WAITING)
+        .order_by('id')
+        .first()
+    )
+
+
+def promote_next(event_id):
+    """
+    Register the head of ``event_id``'s waitlist in a freed seat. Call it in the
+    transaction that freed the seat. Returns the new Attendee, or None if nobody is
+    waiting or the seat has already gone.
+    """
+    while (entry := _next_entry(event_id)) is not None:
+        attendee = Attendee.objects.filter(Exact(Lower('email'), normalize_email(entry.email)), event_id=event_id).first()
+        if attendee is not None and attendee.holds_seat:
+            # Registered directly meanwhile: they no longer need the seat
+            entry.status = WaitlistEntry.WITHDRAWN
+            entry.save(update_fields=['status'])
+            continue
+        if attendee is None:
+            attendee = Attendee(
+                event_id=event_id, user_id=entry.user_id, first_name=entry.first_name,
+                last_name=entry.last_name, email=entry.email, category=entry.category,
+            )
+        # else an earlier, cancelled registration of theirs: reinstate it
+        attendee.attendance_status = 'registered'
+        attendee.check_in_time = None
+        try:
+            with transaction.atomic():
+                attendee.save()
+                entry.status = WaitlistEntry.PROMOTED
+                entry.attendee = attendee
+                entry.promoted_at = timezone.now()
+                entry.save(update_fields=['status', 'attendee', 'promoted_at'])
+        except EventFullError:
+            return None
+        tasks.enqueue(tasks.send_waitlist_promotion, key=f'waitlist-promotion:{entry.pk}', attendee_id=attendee.pk)
+        return attendee
+    return None
+
+
+def depth_by_event():
+    """Active events with people waiting, deepest queue first."""
+    return (
+        Event.objects.filter(is_active=True)
+        .annotate(waiting=Count('waitlist', filter=Q(waitlist__status=WaitlistEntry.WAITING)))
+        .filter(waiting__gt=0)
+        .order_by('-waiting', 'start_date')
+    )